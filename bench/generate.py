@@ -0,0 +1,113 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse, math, os, random
+
+# Synthetic resource directories for the benchmarks.
+#
+# Files are spread over a tree of the given depth, each directory having the same number of
+# subdirectories, with sizes drawn from a distribution. Content is a repeated random block, so it
+# compresses about as well as typical text resources. With the same seed the same tree is generated.
+#
+#   python3 -m bench.generate /tmp/tree --files 100000 --depth 3 --sizes lognormal
+#   python3 -m bench.generate /tmp/tree --churn 0.05
+
+SIZE_DISTRIBUTIONS = ["fixed", "uniform", "lognormal"]
+DEFAULT_MEAN_SIZE = 4096
+MAX_SIZE = 64 * 1024 * 1024
+
+
+def sample_size(rng, distribution, mean_size=DEFAULT_MEAN_SIZE):
+    if distribution == "fixed":
+        return mean_size
+    if distribution == "uniform":
+        return rng.randint(0, 2 * mean_size)
+    if distribution == "lognormal":
+        # heavy tailed: most files are small, a few are large. sigma 1.5 gives the requested mean.
+        sigma = 1.5
+        return min(int(rng.lognormvariate(math.log(mean_size) - sigma ** 2 / 2, sigma)), MAX_SIZE)
+    raise ValueError("Unknown size distribution: %s" % distribution)
+
+
+def __content__(rng, size):
+    block = bytes(rng.getrandbits(8) for _ in range(min(size, 256)))
+    return (block * (size // 256 + 1))[:size] if block else b""
+
+
+def __write__(path, rng, size):
+    with open(path, "wb") as f:
+        f.write(__content__(rng, size))
+
+
+def directories(root, files, depth, files_per_dir):
+    # the leaf directories of the tree, enough to hold files at files_per_dir each
+    leaves = max(1, math.ceil(files / files_per_dir))
+    fanout = max(1, math.ceil(leaves ** (1.0 / depth))) if depth > 0 else 1
+    dirs = []
+    for n in range(leaves):
+        parts = []
+        for level in range(depth):
+            parts.append("d%03d" % (n // fanout ** (depth - 1 - level) % fanout))
+        dirs.append(os.path.join(root, *parts))
+    return dirs
+
+
+def generate_tree(root, files, depth=3, files_per_dir=100, sizes="lognormal", mean_size=DEFAULT_MEAN_SIZE,
+                  seed=0):
+    # write files resources under root. return the list of generated paths
+    rng = random.Random(seed)
+    paths = []
+    dirs = directories(root, files, depth, files_per_dir)
+    for i in range(files):
+        dirname = dirs[i // files_per_dir]
+        if i % files_per_dir == 0:
+            os.makedirs(dirname, exist_ok=True)
+        path = os.path.join(dirname, "r%07d.txt" % i)
+        __write__(path, rng, sample_size(rng, sizes, mean_size))
+        paths.append(path)
+    return paths
+
+
+def apply_churn(root, rate, sizes="lognormal", mean_size=DEFAULT_MEAN_SIZE, seed=1):
+    # modify, delete and create files under root, each for a third of rate times the number of files.
+    # return (created, modified, deleted) counts
+    rng = random.Random(seed)
+    paths = sorted(os.path.join(dirname, filename) for dirname, subdirs, filenames in os.walk(root)
+                   for filename in filenames if not filename.startswith("."))
+    count = int(len(paths) * rate / 3)
+    changed = rng.sample(paths, min(len(paths), 2 * count))
+    modified, deleted = changed[:count], changed[count:]
+    for path in modified:
+        __write__(path, rng, sample_size(rng, sizes, mean_size) + 1)
+    for path in deleted:
+        os.remove(path)
+    for i in range(count):
+        dirname = os.path.dirname(rng.choice(paths))
+        os.makedirs(dirname, exist_ok=True)
+        __write__(os.path.join(dirname, "n%d-%07d.txt" % (seed, i)), rng, sample_size(rng, sizes, mean_size))
+    return count, len(modified), len(deleted)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="bench.generate", description="Generate a synthetic resource tree.")
+    parser.add_argument("root", help="directory to generate in")
+    parser.add_argument("--files", type=int, default=10000, help="number of files")
+    parser.add_argument("--depth", type=int, default=3, help="depth of the directory tree")
+    parser.add_argument("--files-per-dir", type=int, default=100, help="files per leaf directory")
+    parser.add_argument("--sizes", choices=SIZE_DISTRIBUTIONS, default="lognormal", help="size distribution")
+    parser.add_argument("--mean-size", type=int, default=DEFAULT_MEAN_SIZE, help="mean file size in bytes")
+    parser.add_argument("--churn", type=float,
+                        help="instead of generating, change this fraction of the existing files")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if args.churn is not None:
+        print("created %d, modified %d, deleted %d"
+              % apply_churn(args.root, args.churn, args.sizes, args.mean_size, args.seed + 1))
+    else:
+        paths = generate_tree(args.root, args.files, args.depth, args.files_per_dir, args.sizes, args.mean_size,
+                              args.seed)
+        print("generated %d files under %s" % (len(paths), args.root))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,248 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse, datetime, json, os, platform, shutil, sys, tempfile, time
+
+# Benchmarks of the hot paths, run headless on a synthetic resource tree (see bench.generate).
+#
+#   python3 -m bench.run --files 100000 --save-baseline
+#   python3 -m bench.run --files 100000 --compare
+#
+# Results are written as json, see bench/baseline.example.json. Compared to a baseline, a benchmark that is
+# slower than the baseline by more than the tolerance is reported as a regression and the exit status is 1.
+# Baselines only compare well on the machine they were recorded on, so they are saved locally under
+# bench/baselines (not versioned), one per number of files.
+#
+# Benchmarks, in the order they run:
+#   scan            file metadata of the resource dir with parallel scandir (file table)
+#   details         file metadata of the selected files (file table after a selection)
+#   selection       index the tree and list the files of a selection (Explorer)
+#   sort            sort the file metadata on each column
+#   table           fill, sort and paint the file table; needs PyQt5, skipped without it
+#   resourcelist    publish a resourcelist, checksums not cached
+#   resourcelist_cached     publish a resourcelist again, checksums cached
+#   changelist      publish a changelist after churn
+#   zip             package the resync dir (Export zip)
+#   zip_incremental package the resync dir again after the changelist
+
+from bench.generate import SIZE_DISTRIBUTIONS, apply_churn, generate_tree
+
+BENCH_CONFIG = "rsync_bench.cfg"
+FORMAT_VERSION = 1
+DEFAULT_TOLERANCE = 0.25
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+
+class BenchRun(object):
+
+    def __init__(self, root, args):
+        self.root = root
+        self.args = args
+        self.resource_dir = os.path.join(root, "resources")
+        self.resync_dir = os.path.join(root, "resync", "rs")
+        self.results = {}
+
+    def time(self, name, function, files=0):
+        start = time.perf_counter()
+        function()
+        seconds = time.perf_counter() - start
+        self.results[name] = {"seconds": round(seconds, 6), "files": files,
+                              "files_per_second": round(files / seconds, 1) if files and seconds else None}
+        print("%-24s %10.3f s %12s files/s" % (name, seconds, self.results[name]["files_per_second"] or "-"))
+
+    def configure(self):
+        from model.config import Configuration
+
+        if Configuration._instance is None or Configuration._get_configuration_filename() != BENCH_CONFIG:
+            # a configuration of our own, never persisted
+            Configuration._instance = None
+            Configuration._set_configuration_filename(BENCH_CONFIG)
+        config = Configuration()
+        config.set_cfg_resource_dir(self.resource_dir)
+        config.set_cfg_resync_dir(self.resync_dir)
+        config.set_cfg_urlprefix("http://www.example.com/bench/")
+        return config
+
+    def run(self, only=None):
+        from model.dir_index import DirectoryIndex, SelectionRules
+        from model.metadata import COL_PATH, COL_NAME, COL_SIZE, COL_MTIME, collect_record_metadata, \
+            iter_path_records, scan_directories
+        from model.publisher import FilenameFilter, Publisher
+
+        args = self.args
+        print("generating %d files in %s" % (args.files, self.resource_dir))
+        paths = generate_tree(self.resource_dir, args.files, args.depth, args.files_per_dir, args.sizes,
+                              args.mean_size, args.seed)
+        os.makedirs(self.resync_dir)
+        config = self.configure()
+        publisher = Publisher(config)
+        n = len(paths)
+        selected = [os.path.join(self.resource_dir, name) for name in sorted(os.listdir(self.resource_dir))]
+        selected_rules = {path: True for path in selected[::2]}
+        state = {}
+
+        def selection():
+            rules = SelectionRules(DirectoryIndex(self.resource_dir, FilenameFilter()))
+            for path in selected[::2]:
+                rules.include(path)
+            state["selected"] = sum(1 for _ in iter_path_records(rules.rules, FilenameFilter()))
+
+        def sort():
+            metadata = state["metadata"]
+            for column in (COL_PATH, COL_NAME, COL_SIZE, COL_MTIME):
+                metadata.sort_order(column)
+
+        benchmarks = [
+            ("scan", lambda: state.update(metadata=scan_directories([self.resource_dir], FilenameFilter()))),
+            ("details", lambda: collect_record_metadata(iter_path_records(selected_rules, FilenameFilter()))),
+            ("selection", selection),
+            ("sort", sort),
+            ("table", lambda: table_benchmark(self, state["metadata"])),
+            ("resourcelist", lambda: publisher.publish_resource_list()),
+            ("resourcelist_cached", lambda: publisher.publish_resource_list()),
+            ("changelist", None),
+            ("zip", lambda: publisher.create_zip()),
+            ("zip_incremental", None),
+        ]
+        for name, function in benchmarks:
+            if name == "changelist":
+                created, modified, deleted = apply_churn(self.resource_dir, args.churn, args.sizes, args.mean_size,
+                                                         args.seed + 1)
+                function = publisher.publish_change_list
+            elif name == "zip_incremental":
+                function = publisher.create_zip
+            if name == "table" and (only and name not in only or not qt_available()):
+                if not only or name in only:
+                    print("%-24s skipped, PyQt5 is not available" % name)
+                continue
+            if only and name not in only:
+                # the state of later benchmarks depends on the earlier ones
+                function()
+                continue
+            self.time(name, function, n)
+        return self.results
+
+    def release(self):
+        # remove the configuration of the run
+        from model.config import Configuration
+
+        if Configuration._instance is not None and Configuration._get_configuration_filename() == BENCH_CONFIG \
+                and os.path.exists(Configuration._instance.config_file):
+            os.remove(Configuration._instance.config_file)
+        Configuration._instance = None
+        Configuration._set_configuration_filename(None)
+
+
+def qt_available():
+    try:
+        import PyQt5.QtWidgets
+    except ImportError:
+        return False
+    return True
+
+
+def table_benchmark(bench_run, metadata):
+    # FileTableModel in an offscreen QTableView: fill, sort on every column and paint
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QApplication, QTableView, QWidget
+    from view.export_frame import FileTableModel
+
+    app = QApplication.instance() or QApplication([])
+    parent = QWidget()
+    parent.config = bench_run.configure()
+    parent.file_view = QTableView(parent)
+    model = FileTableModel(parent, ["Directory", "Name", "Size", "Modified"], None)
+    parent.file_view.setModel(model)
+    parent.file_view.resize(1200, 800)
+    model.setNewData(metadata)
+    for column in range(4):
+        for order in (Qt.AscendingOrder, Qt.DescendingOrder):
+            model.sort(column, order)
+            parent.file_view.grab()
+    app.processEvents()
+
+
+def compare(results, baseline, tolerance):
+    # return the names of benchmarks that regressed against baseline, printing the comparison
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("results", {}).get(name)
+        if not base or not base["seconds"]:
+            continue
+        ratio = result["seconds"] / base["seconds"]
+        regressed = ratio > 1 + tolerance
+        print("%-24s %10.3f s  baseline %10.3f s  %+6.1f%%%s" % (name, result["seconds"], base["seconds"],
+                                                                  (ratio - 1) * 100,
+                                                                  "  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def baseline_path(files):
+    # the local baseline of runs on a tree of files files
+    return os.path.join(BASELINE_DIR, "%d.json" % files)
+
+
+def write_report(report, path):
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="bench.run", description="Benchmark the hot paths on a synthetic tree.")
+    parser.add_argument("--files", type=int, default=10000, help="number of files in the synthetic tree")
+    parser.add_argument("--depth", type=int, default=3, help="depth of the directory tree")
+    parser.add_argument("--files-per-dir", type=int, default=100, help="files per leaf directory")
+    parser.add_argument("--sizes", choices=SIZE_DISTRIBUTIONS, default="lognormal", help="size distribution")
+    parser.add_argument("--mean-size", type=int, default=4096, help="mean file size in bytes")
+    parser.add_argument("--churn", type=float, default=0.01, help="fraction of files changed for the changelist")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", nargs="+", help="only report these benchmarks")
+    parser.add_argument("--workdir", help="directory for the synthetic tree, default a temporary directory")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--save-baseline", action="store_true", help="save the results as the local baseline")
+    parser.add_argument("--compare", nargs="?", const="",
+                        help="compare with the results in this json file, default the local baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown against the baseline, as a fraction (default %.2f)" % DEFAULT_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    root = tempfile.mkdtemp(prefix="resyto-bench-", dir=args.workdir)
+    bench_run = BenchRun(root, args)
+    try:
+        results = bench_run.run(args.only)
+    finally:
+        bench_run.release()
+        shutil.rmtree(root, ignore_errors=True)
+
+    report = {"version": FORMAT_VERSION,
+              "created": datetime.datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(),
+              "params": {"files": args.files, "depth": args.depth, "files_per_dir": args.files_per_dir,
+                         "sizes": args.sizes, "mean_size": args.mean_size, "churn": args.churn, "seed": args.seed},
+              "results": results}
+    if args.output:
+        write_report(report, args.output)
+    if args.compare is not None:
+        with open(args.compare or baseline_path(args.files)) as f:
+            baseline = json.load(f)
+        if baseline.get("params") != report["params"]:
+            print("warning: baseline was recorded with different parameters %s" % baseline.get("params"))
+        if compare(results, baseline, args.tolerance):
+            return 1
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        write_report(report, baseline_path(args.files))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
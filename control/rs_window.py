@@ -3,12 +3,11 @@
 
 import logging
 
-from PyQt5.QtWidgets import QMainWindow, QAction, QActionGroup, qApp, QTabWidget, QWidget
+from PyQt5.QtWidgets import QMainWindow, QAction, QActionGroup, qApp, QTabWidget, QWidget, QVBoxLayout
 from model.config import Configuration
-from view.config_frame import ConfigFrame
-from view.export_frame import ExportFrame
-
 
+# Tabs are built, and their modules imported, when they are first shown; the window comes up with only
+# the tab that is shown first.
 
 
 class RsMainWindow(QMainWindow):
@@ -98,13 +97,39 @@ class TabbedFrame(QTabWidget):
 
     def __init__(self, parent):
         super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
         self.parent = parent
         self.currentChanged.connect(self.__tabchanged)
         self.previndex = -1
-        self.configframe = ConfigFrame(self)
-        self.exportframe = ExportFrame(self)
+        self.configtab = LazyTab(self, self.__config_frame__)
+        self.exporttab = LazyTab(self, self.__export_frame__)
+        self.statisticstab = LazyTab(self, self.__statistics_frame__)
+        self.manualsetstab = LazyTab(self, self.__manual_sets_frame__)
+        self.rulesetstab = LazyTab(self, self.__rule_sets_frame__)
         self.init_ui()
 
+    def __config_frame__(self, parent):
+        from view.config_frame import ConfigFrame
+        return ConfigFrame(parent)
+
+    def __export_frame__(self, parent):
+        from view.export_frame import ExportFrame
+        return ExportFrame(parent)
+
+    def __statistics_frame__(self, parent):
+        from view.statistics_frame import StatisticsFrame
+        return StatisticsFrame(parent)
+
+    def __manual_sets_frame__(self, parent):
+        from view.manual_sets_frame import ManualSetsFrame
+        return ManualSetsFrame(parent)
+
+    def __rule_sets_frame__(self, parent):
+        from view.rule_sets_frame import RuleSetsFrame
+        frame = RuleSetsFrame(parent)
+        frame.set_counts_changed.connect(lambda counts: self.exporttab.get_frame().set_counts_changed(counts))
+        return frame
+
     def __tabchanged(self, index):
         if self.previndex > -1:
             self.widget(self.previndex).hide()
@@ -114,15 +139,46 @@ class TabbedFrame(QTabWidget):
         self.parent.set_tab_menu_enabled(index)
 
     def init_ui(self):
-        self.addTab(self.configframe, _("&Configuration"))
+        self.addTab(self.configtab, _("&Configuration"))
 
-        self.addTab(self.exportframe, _("&Export"))
+        self.addTab(self.exporttab, _("&Export"))
 
-        self.addTab(QWidget(), _("Statistics"))
-        self.addTab(QWidget(), _("Manual Sets"))
-        self.addTab(QWidget(), _("Rule-based Sets"))
+        self.addTab(self.statisticstab, _("Statistics"))
+        self.addTab(self.manualsetstab, _("Manual Sets"))
+        self.addTab(self.rulesetstab, _("Rule-based Sets"))
 
     def close(self):
         self.logger.debug("tabframe closing")
+        if self.exporttab.frame is not None:
+            self.exporttab.frame.stop_watching()
         self.currentWidget().close()
 
+
+class LazyTab(QWidget):
+    # placeholder of a tab that builds its frame with factory(parent) when it is first shown.
+    # show, hide and close are passed on to the frame, as TabbedFrame calls them on the tab.
+
+    def __init__(self, parent, factory):
+        super().__init__(parent)
+        self.factory = factory
+        self.frame = None
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+    def get_frame(self):
+        if self.frame is None:
+            self.frame = self.factory(self)
+            self.layout().addWidget(self.frame)
+            self.frame.setVisible(True)
+        return self.frame
+
+    def show(self):
+        self.get_frame().show()
+
+    def hide(self):
+        if self.frame is not None:
+            self.frame.hide()
+
+    def close(self):
+        if self.frame is not None:
+            self.frame.close()
@@ -9,14 +9,6 @@ def __get__logger():
     logger = logging.getLogger()
     return logger
 
-def get_languages():
-    found_languages = []
-    for dirname in os.listdir(path=LOCALE_DIR):
-        if os.path.isdir(os.path.join(LOCALE_DIR, dirname)):
-            found_languages.append(dirname)
-    return found_languages
-
-
 def set_language(lang):
     __get__logger().debug("Trying to set language to %s", lang)
     languages.clear()
@@ -48,11 +40,8 @@ __get__logger().debug("APP_DIR = %s" % os.path.abspath(APP_DIR))
 LOCALE_DIR = os.path.join(APP_DIR, 'i18n') # .mo files will then be located in APP_Dir/i18n/LANGUAGECODE/LC_MESSAGES/
 __get__logger().debug("LOCALE_DIR = %s" % LOCALE_DIR)
 
-# Now we need to choose the language. We will provide a list, and gettext
-# will use the first translation available in the list
-# on desktop is usually LANGUAGES
-DEFAULT_LANGUAGES = get_languages()
-__get__logger().debug("DEFAULT_LANGUAGES = %s" % DEFAULT_LANGUAGES)
+# The available languages (get_languages) are only listed when asked for, the language itself is chosen
+# with set_language. Nothing here reads the locale dir at import time.
 
 #lc, encoding = locale.getdefaultlocale()
 #logger.debug("locale = %s, encoding = %s", lc, encoding)
@@ -61,15 +50,14 @@ __get__logger().debug("DEFAULT_LANGUAGES = %s" % DEFAULT_LANGUAGES)
 
 # Concat all languages (env + default locale),
 #  and here we have the languages and location of the translations
-languages = DEFAULT_LANGUAGES
+languages = []
 mo_location = LOCALE_DIR
 # print("translations will be searched in: " + os.path.abspath(mo_location))
 
-# Lets tell those details to gettext
-gettext.translation(APP_NAME, LOCALE_DIR, languages, fallback=True)
-
+# until set_language is called, _ returns the untranslated text
 gettext.install(True, localedir=mo_location)
 
 gettext.textdomain(APP_NAME)
 
-gettext.bind_textdomain_codeset(APP_NAME, "UTF-8")
+if hasattr(gettext, "bind_textdomain_codeset"):     # gone since python 3.10, where it is always utf-8
+    gettext.bind_textdomain_codeset(APP_NAME, "UTF-8")
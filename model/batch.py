@@ -0,0 +1,93 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os, time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from model.hashing import default_workers
+from model.publisher import Publisher
+from model.rule_sets import load_rule_sets
+
+# Publishing of several profiles (see model.config.Profile) at once, each in its own process. The total
+# number of files read at the same time is bounded by io_workers, which is divided over the processes:
+# each profile hashes and zips with its share of it, and walks its resource dir in one thread.
+
+TASKS = ["publish", "resourcelist", "changelist", "resourcedump", "zip"]
+
+# results: (task, model.publisher.PublishResult) per task that completed; error: message of the failure
+# that stopped the profile, None if all tasks completed
+BatchResult = namedtuple("BatchResult", ["profile", "results", "error", "seconds"])
+
+logger = logging.getLogger(__name__)
+
+
+def publish_profile(profile, tasks, io_workers):
+    # run tasks for profile with at most io_workers threads reading files, return a BatchResult
+    started = time.monotonic()
+    # threads only: the pool process does not start processes of its own
+    profile.set_cfg_hash_workers(io_workers)
+    profile.set_cfg_hash_executor("thread")
+    profile.set_cfg_zip_workers(io_workers)
+    results = []
+    try:
+        publisher = Publisher(profile, rule_sets=load_rule_sets(profile.cfg_rule_sets_file()))
+        for task in tasks:
+            if task == "publish":
+                results.append((task, publisher.publish()))
+            elif task == "resourcelist":
+                results.append((task, publisher.publish_resource_list()))
+            elif task == "changelist":
+                results.append((task, publisher.publish_change_list()))
+            elif task == "resourcedump":
+                results.append((task, publisher.publish_resource_dump()))
+            elif task == "zip":
+                results.append((task, publisher.create_zip()))
+            else:
+                raise ValueError("Unknown task: %s" % task)
+    except Exception as err:
+        logger.exception("Publishing profile %s failed", profile.name)
+        return BatchResult(profile.name, results, "%s: %s" % (type(err).__name__, err),
+                           time.monotonic() - started)
+    return BatchResult(profile.name, results, None, time.monotonic() - started)
+
+
+def check_outputs(profiles, tasks):
+    # ValueError if profiles would write to the same resync dir or zip
+    outputs = {}
+    for profile in profiles:
+        publisher = Publisher(profile)
+        paths = [os.path.abspath(profile.cfg_resync_dir())]
+        if "zip" in tasks:
+            paths.append(os.path.abspath(publisher.zip_path()))
+        for path in paths:
+            if path in outputs:
+                raise ValueError("Profiles %s and %s both write %s" % (outputs[path], profile.name, path))
+            outputs[path] = profile.name
+
+
+def publish_batch(profiles, tasks, processes=0, io_workers=0, listener=None):
+    # publish profiles concurrently. processes: size of the process pool, io_workers: total number of
+    # threads reading files; 0 means as many as there are cpu's. listener is called with each BatchResult
+    # as it comes in. Returns the BatchResults in the order of profiles.
+    if not profiles:
+        return []
+    check_outputs(profiles, tasks)
+    io_workers = io_workers if io_workers > 0 else default_workers()
+    # every process reads with at least one thread, so there are no more processes than io workers
+    processes = min(processes if processes > 0 else default_workers(), len(profiles), io_workers)
+    share = max(1, io_workers // processes)
+    logger.info("Publishing %d profiles in %d processes, %d io workers each", len(profiles), processes, share)
+    results = {}
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = {pool.submit(publish_profile, profile, tasks, share): profile.name for profile in profiles}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as err:
+                # the worker process itself failed, e.g. it was killed
+                result = BatchResult(futures[future], [], "%s: %s" % (type(err).__name__, err), 0.0)
+            results[result.profile] = result
+            if listener:
+                listener(result)
+    return [results[profile.name] for profile in profiles]
@@ -0,0 +1,264 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, logging, os, shutil, time
+from xml.sax.saxutils import escape
+
+from model.sitemap_writer import MAX_BYTES, MAX_URLS, XML_DECLARATION, URLSET_OPEN, URLSET_CLOSE, INDEX_OPEN, \
+    INDEX_CLOSE, gzip_file, gzip_name, iter_sitemap_urls, md_element, part_filenames, url_element, w3c_datetime
+
+# Rolling changelists. A publish appends its changes to the open changelist, the changelists of earlier
+# publishes are not rewritten. When the open changelist is full, or older than the time window, it is
+# closed: it is kept as an archive with 'from' and 'until', and a new open changelist starts where it ended.
+# The lastmod of an entry is never before the 'from' of its changelist.
+#
+#   changelist.xml                      the open changelist as long as nothing is archived, after that the
+#                                       changelist index (a sitemapindex) of
+#   changelist-archive-00001.xml ...    closed changelists
+#   changelist-current.xml              the open changelist, which has no 'until'
+#
+# The changelists are described in CHANGELIST_STATE, so that rolling over is decided without reading them.
+# With gzip, every changelist that is written or appended to is gzipped after it is complete, and the index
+# points to the gzipped changelists.
+# New entries are collected in a temporary file and appended to the open changelist on close; an append
+# that did not complete is cut off again by the next publish. A changelist.xml written before changelists
+# rolled is read once and taken over as the first entries.
+
+CHANGELIST_STATE = ".resyto_changelists.json"
+
+logger = logging.getLogger(__name__)
+
+
+def changelist_header(md):
+    return (XML_DECLARATION + URLSET_OPEN + md_element([("capability", "changelist")] + md)).encode("utf-8")
+
+
+class ChangelistWriter(object):
+
+    def __init__(self, filename, base_url, since, window=0, max_urls=MAX_URLS, max_bytes=MAX_BYTES, now=None,
+                 gzip=False):
+        # filename: path of changelist.xml. since: seconds since epoch, start of a new open changelist,
+        # typically the time of the previous publish. window: seconds a changelist stays open, 0 for as
+        # long as it is not full. gzip: also write changelist.xml.gz etc., see SitemapWriter
+        self.filename = filename
+        self.base_url = base_url.rstrip("/") + "/"
+        self.since = since
+        self.window = window
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.now = now if now is not None else time.time()
+        self.gzip = gzip
+        self.state_path = os.path.join(os.path.dirname(filename), CHANGELIST_STATE)
+        self.state = self.__read_state__()
+        self.legacy = self.state is None and os.path.exists(filename)
+        if self.state is None:
+            self.state = {"open": None, "archives": []}
+        self.f = None
+        self.appending = False      # True while entries are collected for the open changelist on disk
+        self.opened = False         # the open changelist on disk was archived or replaced in this run
+        self.rolled = False
+        self.disk_size = 0          # size of the open changelist on disk without its close tag
+        self.tmp_files = []         # (tmp path, path) to move in place on close
+        self.total_urls = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __read_state__(self):
+        if not os.path.exists(self.state_path):
+            return None
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def __sibling__(self, suffix):
+        root, ext = os.path.splitext(self.filename)
+        return root + suffix + ext
+
+    def __tmp_name__(self, filename):
+        dirname, basename = os.path.split(filename)
+        return os.path.join(dirname, "." + basename + ".tmp")
+
+    def open_path(self):
+        # where the open changelist is
+        return self.__sibling__("-current") if self.state["archives"] else self.filename
+
+    def __start__(self):
+        # start collecting entries, for the open changelist on disk or for a new one
+        if self.legacy:
+            self.legacy = False
+            self.__take_over__()
+        if self.f is not None:
+            return
+        if self.state["open"] is not None and not self.opened:
+            self.f = open(self.__tmp_name__(self.open_path()) + ".append", "wb")
+            self.appending = True
+            current = self.state["open"]
+            self.disk_size = current["size"]
+            if self.window and current["urls"] and self.now - current["from"] >= self.window:
+                # the changes of this publish are after the previous one, which ends the window
+                self.__roll__(max(self.since, current["from"]))
+        else:
+            header = changelist_header([("from", w3c_datetime(self.since))])
+            self.f = open(self.__tmp_name__(self.open_path()), "wb")
+            self.f.write(header)
+            self.state["open"] = {"from": self.since, "urls": 0, "size": len(header)}
+            self.opened = True
+
+    def __take_over__(self):
+        # read the changelist written before changelists rolled, as the first entries
+        logger.info("Taking over the entries of %s", self.filename)
+        lastmods = [lastmod for loc, lastmod, md in iter_sitemap_urls(self.filename) if lastmod is not None]
+        self.since = min(lastmods + [self.since])
+        for loc, lastmod, md in iter_sitemap_urls(self.filename):
+            self.write_url(loc, lastmod, md.items())
+
+    def write_url(self, loc, lastmod=None, md=()):
+        entry = url_element(loc, lastmod, md).encode("utf-8")
+        self.__start__()
+        current = self.state["open"]
+        if current["urls"] and (current["urls"] >= self.max_urls or
+                                current["size"] + len(entry) + len(URLSET_CLOSE) > self.max_bytes):
+            self.__roll__(self.now)
+            current = self.state["open"]
+        if lastmod is not None and lastmod < current["from"]:
+            # a change is not listed before the changelist that holds it starts, e.g. after rolling over
+            # in the middle of a publish. The entry keeps its size, datetimes have a fixed length.
+            entry = url_element(loc, current["from"], md).encode("utf-8")
+        self.f.write(entry)
+        current["urls"] += 1
+        current["size"] += len(entry)
+        self.total_urls += 1
+
+    def __roll__(self, until):
+        # close the open changelist as an archive and start a new one where it ends
+        current = self.state["open"]
+        archive = self.__sibling__("-archive-%05d" % (len(self.state["archives"]) + 1))
+        tmp_archive = self.__tmp_name__(archive)
+        self.f.close()
+        with open(tmp_archive, "wb") as out:
+            out.write(changelist_header([("from", w3c_datetime(current["from"])), ("until", w3c_datetime(until))]))
+            header_size = len(changelist_header([("from", w3c_datetime(current["from"]))]))
+            if self.appending:
+                # the open changelist on disk, up to its close tag, followed by the collected entries
+                with open(self.open_path(), "rb") as f:
+                    f.seek(header_size)
+                    shutil.copyfileobj(LimitedReader(f, self.disk_size - header_size), out)
+                with open(self.f.name, "rb") as f:
+                    shutil.copyfileobj(f, out)
+            else:
+                with open(self.f.name, "rb") as f:
+                    f.seek(header_size)
+                    shutil.copyfileobj(f, out)
+            out.write(URLSET_CLOSE.encode("utf-8"))
+        os.remove(self.f.name)
+        self.f = None
+        self.appending = False
+        self.opened = True
+        self.rolled = True
+        self.tmp_files.append((tmp_archive, archive))
+        self.state["archives"].append({"name": os.path.basename(archive), "from": current["from"], "until": until,
+                                       "urls": current["urls"]})
+        self.since = until
+        self.state["open"] = None
+        self.__start__()
+
+    def close(self):
+        self.__start__()
+        self.f.close()
+        written = []
+        if self.appending:
+            # append the collected entries to the open changelist on disk. Without them it is left alone,
+            # unless a failed append left something behind.
+            close_tag = URLSET_CLOSE.encode("utf-8")
+            if os.path.getsize(self.f.name) or os.path.getsize(self.open_path()) != self.disk_size + len(close_tag):
+                with open(self.open_path(), "r+b") as out, open(self.f.name, "rb") as f:
+                    out.seek(self.disk_size)
+                    shutil.copyfileobj(f, out)
+                    out.write(close_tag)
+                    out.truncate()
+                written.append(self.open_path())
+            os.remove(self.f.name)
+        else:
+            with open(self.f.name, "ab") as out:
+                out.write(URLSET_CLOSE.encode("utf-8"))
+            self.tmp_files.append((self.f.name, self.open_path()))
+        self.f = None
+        for tmp_name, name in self.tmp_files:
+            os.replace(tmp_name, name)
+            written.append(name)
+        if self.rolled or (self.state["archives"] and self.state.get("gzip", False) != self.gzip):
+            # the index points to the gzipped changelists or not
+            self.__write_index__()
+            written.append(self.filename)
+        self.state["gzip"] = self.gzip
+        self.__update_gzip__(written)
+        for part in part_filenames(self.filename):
+            # parts of a changelist written before changelists rolled
+            os.remove(part)
+            if os.path.exists(gzip_name(part)):
+                os.remove(gzip_name(part))
+        tmp_state = self.state_path + ".tmp"
+        with open(tmp_state, "w") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(tmp_state, self.state_path)
+
+    def __update_gzip__(self, written):
+        # gzip the changelists that were written, and those that are not gzipped yet. Without gzip, remove
+        # gzipped changelists of earlier runs.
+        names = [os.path.join(os.path.dirname(self.filename), archive["name"]) for archive in self.state["archives"]]
+        names += [self.open_path(), self.filename]
+        for name in dict.fromkeys(names):
+            if self.gzip and (name in written or not os.path.exists(gzip_name(name))):
+                gzip_file(name)
+            elif not self.gzip and os.path.exists(gzip_name(name)):
+                os.remove(gzip_name(name))
+
+    def discard(self):
+        if self.f is not None:
+            self.f.close()
+            os.remove(self.f.name)
+            self.f = None
+        for tmp_name, name in self.tmp_files:
+            if os.path.exists(tmp_name):
+                os.remove(tmp_name)
+
+    def __write_index__(self):
+        entries = [(archive["name"], [("from", w3c_datetime(archive["from"])),
+                                      ("until", w3c_datetime(archive["until"]))])
+                   for archive in self.state["archives"]]
+        entries.append((os.path.basename(self.open_path()), [("from", w3c_datetime(self.state["open"]["from"]))]))
+        if self.gzip:
+            entries = [(gzip_name(name), md) for name, md in entries]
+        tmp_name = self.__tmp_name__(self.filename)
+        with open(tmp_name, "w", encoding="utf-8") as f:
+            first = self.state["archives"][0]["from"]
+            f.write(XML_DECLARATION + INDEX_OPEN + md_element([("capability", "changelist"),
+                                                              ("from", w3c_datetime(first))]))
+            for name, md in entries:
+                f.write("<sitemap><loc>%s</loc>%s</sitemap>" % (escape(self.base_url + name),
+                                                                md_element([("capability", "changelist")] + md)))
+            f.write(INDEX_CLOSE)
+        os.replace(tmp_name, self.filename)
+
+    def sitemap_count(self):
+        return len(self.state["archives"]) + 1
+
+
+class LimitedReader(object):
+    # the first size bytes of the file object f
+
+    def __init__(self, f, size):
+        self.f = f
+        self.remaining = size
+
+    def read(self, n=-1):
+        n = self.remaining if n < 0 else min(n, self.remaining)
+        data = self.f.read(n)
+        self.remaining -= len(data)
+        return data
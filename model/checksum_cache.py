@@ -0,0 +1,107 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os, sqlite3
+from model.hashing import Hasher, format_digests, hash_algorithms, parse_digests, quick_signature
+
+# Persistent store of checksums, kept in the resync directory. A checksum is reused as long as the
+# stat signature (size, mtime, inode) of the file it was computed for has not changed.
+# With precheck, checksums are also reused for files that were touched or copied: same size and the same
+# quick signature (see model.hashing.quick_signature). That trusts that nothing changed in the middle.
+# The leading dot keeps the database out of resourcesync.zip (see FilenameFilter).
+
+CHECKSUM_DB = ".resyto_checksums.db"
+
+
+def stat_signature(stat):
+    # stat: an os.stat_result
+    return stat.st_size, stat.st_mtime_ns, stat.st_ino
+
+
+class ChecksumCache(object):
+
+    def __init__(self, cache_dir, filename=CHECKSUM_DB, algorithms=("md5",), precheck=False):
+        # algorithms: ResourceSync names of the digests to compute, see model.hashing.HASH_ALGORITHMS
+        self.logger = logging.getLogger(__name__)
+        self.db_path = os.path.join(cache_dir, filename)
+        self.algorithms = hash_algorithms(algorithms)
+        self.precheck = precheck
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute("CREATE TABLE IF NOT EXISTS checksums ("
+                                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, inode INTEGER, "
+                                "md5 TEXT, digests TEXT, quick TEXT)")
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(checksums)")]
+        for column in ("digests", "quick"):
+            if column not in columns:
+                # a database of before digests other than md5
+                self.connection.execute("ALTER TABLE checksums ADD COLUMN %s TEXT" % column)
+        self.hits = 0
+        self.misses = 0
+        self.prechecked = 0
+        self.bytes_hashed = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lookup(self, path, stat):
+        # return the cached (md5, digests) of path if its stat signature is unchanged, or with precheck its
+        # quick signature, None otherwise. digests: the other algorithms, e.g. "sha-256:...", "" if none
+        row = self.connection.execute("SELECT size, mtime_ns, inode, md5, digests, quick FROM checksums "
+                                      "WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        cached = parse_digests(row[4])
+        if any(algorithm not in cached for algorithm in self.algorithms[1:]):
+            return None
+        checksums = row[3], format_digests(self.algorithms[1:], [cached[a] for a in self.algorithms[1:]])
+        if tuple(row[:3]) == stat_signature(stat):
+            return checksums
+        if self.precheck and row[5] and row[0] == stat.st_size and quick_signature(path) == row[5]:
+            self.prechecked += 1
+            self.store(path, stat, row[3], row[4], row[5])
+            return checksums
+        return None
+
+    def store(self, path, stat, md5, digests="", quick=None):
+        self.connection.execute("INSERT OR REPLACE INTO checksums VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                (path,) + stat_signature(stat) + (md5, digests, quick))
+
+    def digests_all(self, paths, hasher=None, progress=None, stats=None):
+        # return (md5, digests) of each path as for lookup, in the order of paths. Cache misses are hashed by
+        # hasher in one batch, each file is read once for all algorithms.
+        # progress: an optional model.progress.Progress, checked for cancellation after each file
+        # stats: os.stat_results of paths, if the caller already has them
+        paths = list(paths)
+        if stats is None:
+            stats = [os.stat(path) for path in paths]
+        checksums = [self.lookup(path, stat) for path, stat in zip(paths, stats)]
+        missing = [i for i, checksum in enumerate(checksums) if checksum is None]
+        self.hits += len(paths) - len(missing)
+        if progress:
+            for checksum, stat in zip(checksums, stats):
+                if checksum is not None:
+                    progress.file_scanned(stat.st_size)
+        if missing:
+            hasher = hasher or Hasher(workers=1)
+            computed = hasher.digests_iter((paths[i] for i in missing), self.algorithms, self.precheck)
+            try:
+                for i, (digests, quick) in zip(missing, computed):
+                    checksums[i] = digests[0], format_digests(self.algorithms[1:], digests[1:])
+                    self.store(paths[i], stats[i], checksums[i][0], checksums[i][1], quick)
+                    self.misses += 1
+                    self.bytes_hashed += stats[i].st_size
+                    if progress:
+                        progress.file_scanned(stats[i].st_size, hashed=True)
+                        progress.check_cancelled()
+            finally:
+                computed.close()
+        return checksums
+
+    def close(self):
+        self.connection.commit()
+        self.connection.close()
+        self.logger.debug("Checksum cache %s: %d hits (%d prechecked), %d misses", self.db_path, self.hits,
+                          self.prechecked, self.misses)
@@ -19,6 +19,10 @@ from configparser import ConfigParser
 
 CFG_FILENAME = "rsync.cfg"
 
+# Publishing profiles are sections named 'profile:<name>'. A profile overrides keys of the 'config' section,
+# typically resource_dir, resync_dir, sourcedesc and urlprefix; other keys are taken from 'config'.
+PROFILE_PREFIX = "profile:"
+
 
 class Configuration(object):
 
@@ -136,6 +140,141 @@ class Configuration(object):
     def set_cfg_strategy(self, id):
         self.parser.set("config", "strategy", str(id))
 
+    def cfg_hash_workers(self):
+        # 0 means: as many workers as there are cpu's
+        return int(self.parser.get("config", "hash_workers", fallback="0"))
+
+    def set_cfg_hash_workers(self, workers):
+        self.parser.set("config", "hash_workers", str(workers))
+
+    def cfg_hash_executor(self):
+        # 'thread' or 'process'
+        return self.parser.get("config", "hash_executor", fallback="thread")
+
+    def set_cfg_hash_executor(self, executor):
+        self.parser.set("config", "hash_executor", executor)
+
+    def cfg_hash_algorithms(self):
+        # ResourceSync names of the digests in the hash attribute, e.g. ['md5', 'sha-256']. md5 is always computed.
+        return self.parser.get("config", "hash_algorithms", fallback="md5").split()
+
+    def set_cfg_hash_algorithms(self, algorithms):
+        self.parser.set("config", "hash_algorithms", " ".join(algorithms))
+
+    def cfg_hash_precheck(self):
+        # reuse the digests of a file that was touched, but not changed in size, head or tail
+        return self.parser.get("config", "hash_precheck", fallback="False") == "True"
+
+    def set_cfg_hash_precheck(self, precheck):
+        self.parser.set("config", "hash_precheck", str(bool(precheck)))
+
+    def cfg_zip_workers(self):
+        # 0 means: as many workers as there are cpu's
+        return int(self.parser.get("config", "zip_workers", fallback="0"))
+
+    def set_cfg_zip_workers(self, workers):
+        self.parser.set("config", "zip_workers", str(workers))
+
+    def cfg_gzip_sitemaps(self):
+        # also publish gzipped sitemaps, the sitemap indexes point to them
+        return self.parser.get("config", "gzip_sitemaps", fallback="False") == "True"
+
+    def set_cfg_gzip_sitemaps(self, gzip):
+        self.parser.set("config", "gzip_sitemaps", str(bool(gzip)))
+
+    def cfg_dump_max_size(self):
+        # megabytes of resources in one package of a resource dump
+        return int(self.parser.get("config", "dump_max_size", fallback="1024"))
+
+    def set_cfg_dump_max_size(self, size):
+        self.parser.set("config", "dump_max_size", str(size))
+
+    def cfg_dump_workers(self):
+        # packages of a dump that are built at the same time
+        return int(self.parser.get("config", "dump_workers", fallback="2"))
+
+    def set_cfg_dump_workers(self, workers):
+        self.parser.set("config", "dump_workers", str(workers))
+
+    def cfg_change_dump(self):
+        # publish a change dump with each changelist; package size and workers as for resource dumps
+        return self.parser.get("config", "change_dump", fallback="False") == "True"
+
+    def set_cfg_change_dump(self, change_dump):
+        self.parser.set("config", "change_dump", str(bool(change_dump)))
+
+    def cfg_change_dump_retention(self):
+        # days a change dump stays listed after its end, 0 for as long as there are changelists.
+        # The last change dump is always kept
+        return int(self.parser.get("config", "change_dump_retention", fallback="30"))
+
+    def set_cfg_change_dump_retention(self, days):
+        self.parser.set("config", "change_dump_retention", str(days))
+
+    def cfg_watch_resources(self):
+        return self.parser.get("config", "watch_resources", fallback="False") == "True"
+
+    def set_cfg_watch_resources(self, watch):
+        self.parser.set("config", "watch_resources", str(bool(watch)))
+
+    def cfg_watch_interval(self):
+        # seconds between full rescans of the resource dir by the watcher
+        return int(self.parser.get("config", "watch_interval", fallback="600"))
+
+    def set_cfg_watch_interval(self, interval):
+        self.parser.set("config", "watch_interval", str(interval))
+
+    def cfg_changelist_max_urls(self):
+        # entries after which the open changelist is archived and a new one started
+        return int(self.parser.get("config", "changelist_max_urls", fallback="50000"))
+
+    def set_cfg_changelist_max_urls(self, max_urls):
+        self.parser.set("config", "changelist_max_urls", str(max_urls))
+
+    def cfg_changelist_window(self):
+        # days after which the open changelist is archived, 0 means only when it is full
+        return int(self.parser.get("config", "changelist_window", fallback="0"))
+
+    def set_cfg_changelist_window(self, days):
+        self.parser.set("config", "changelist_window", str(days))
+
+    def cfg_rule_sets_file(self):
+        # text file with the definitions of the rule-based sets, next to the configuration file by default
+        return self.parser.get("config", "rule_sets_file",
+                               fallback=os.path.splitext(self.config_file)[0] + "_rule_sets.txt")
+
+    def set_cfg_rule_sets_file(self, path):
+        self.parser.set("config", "rule_sets_file", path)
+
+    def cfg_manual_sets_file(self):
+        # text file with the manual sets, next to the configuration file by default
+        return self.parser.get("config", "manual_sets_file",
+                               fallback=os.path.splitext(self.config_file)[0] + "_manual_sets.txt")
+
+    def set_cfg_manual_sets_file(self, path):
+        self.parser.set("config", "manual_sets_file", path)
+
+    def profile_names(self):
+        return [section[len(PROFILE_PREFIX):] for section in self.parser.sections()
+                if section.startswith(PROFILE_PREFIX)]
+
+    def profile(self, name):
+        # a Profile with the configuration as it is now, KeyError if there is no such profile
+        if not self.parser.has_section(PROFILE_PREFIX + name):
+            raise KeyError("No profile %s" % name)
+        return Profile(name, self.parser, self.config_file)
+
+    def set_profile(self, name, **values):
+        # values: keys of the config section, e.g. resource_dir="/data/archive"
+        section = PROFILE_PREFIX + name
+        if not self.parser.has_section(section):
+            self.parser.add_section(section)
+        for key, value in values.items():
+            self.parser.set(section, key, str(value))
+
+    def remove_profile(self, name):
+        self.parser.remove_section(PROFILE_PREFIX + name)
+
     def settings_language(self):
         return self.parser.get("settings", "language", fallback="en-US")
 
@@ -174,4 +313,25 @@ class Configuration(object):
     def set_explorer_height(self, height):
         if not self.parser.has_section("explorer"):
             self.parser.add_section("explorer")
-        self.parser.set("explorer", "height", str(height))
\ No newline at end of file
+        self.parser.set("explorer", "height", str(height))
+
+
+class Profile(Configuration):
+    # the configuration with the keys of a named profile on top. Unlike Configuration it is not a singleton,
+    # several profiles can be used side by side, and it can be pickled to another process.
+
+    def __new__(cls, *args, **kwargs):
+        return object.__new__(cls)
+
+    def __init__(self, name, parser, config_file):
+        self.name = name
+        self.config_file = config_file
+        self.config_path = os.path.dirname(config_file)
+        self.parser = ConfigParser()
+        self.parser.read_dict(parser)
+        for key, value in parser.items(PROFILE_PREFIX + name, raw=True):
+            self.parser.set("config", key, value)
+
+    def persist(self):
+        # a profile is a read-only view, changes are made with Configuration.set_profile
+        raise TypeError("Profile %s is read-only and cannot be persisted" % self.name)
@@ -0,0 +1,217 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect, logging, os
+from model.metadata import rule_for
+
+# In-memory index of a directory tree, with per-directory file counts aggregated over subdirectories,
+# and selections on that tree expressed as folder/file include and exclude rules.
+#
+# A rule on a path decides for everything under that path, unless a rule deeper down says otherwise.
+# Setting a rule replaces the rules below it, so the order of selecting and deselecting is respected
+# the same way as adding and removing sets of files would. Counting a selection only visits the rules,
+# changing it only the rules below the changed path. The files are listed by model.metadata.iter_path_records.
+
+
+class DirNode(object):
+
+    __slots__ = ["files", "subdirs", "total"]
+
+    def __init__(self):
+        self.files = []         # accepted filenames in this directory
+        self.subdirs = {}       # name -> DirNode
+        self.total = 0          # number of files in this directory and all subdirectories
+
+
+class DirectoryIndex(object):
+
+    def __init__(self, root, filename_filter):
+        self.logger = logging.getLogger(__name__)
+        self.root = os.path.normpath(root)
+        self.filename_filter = filename_filter
+        self.tree = self.__scan__(self.root)
+        self.logger.debug("Indexed %d files under %s", self.tree.total, self.root)
+
+    def __scan__(self, path):
+        node = DirNode()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        node.subdirs[entry.name] = self.__scan__(entry.path)
+                    elif entry.is_file() and self.filename_filter.accept(entry.name):
+                        node.files.append(entry.name)
+        except OSError as err:
+            self.logger.warning("Cannot index %s: %s", path, err)
+        node.files.sort()
+        node.total = len(node.files) + sum(subdir.total for subdir in node.subdirs.values())
+        return node
+
+    def __parts__(self, path):
+        # components of path relative to root, None if path is not under root
+        path = os.path.normpath(path)
+        if path == self.root:
+            return []
+        rel_path = os.path.relpath(path, self.root)
+        if rel_path.startswith(os.pardir):
+            return None
+        return rel_path.split(os.sep)
+
+    def node(self, path):
+        # the DirNode of directory path, None if path is not an indexed directory
+        parts = self.__parts__(path)
+        if parts is None:
+            return None
+        node = self.tree
+        for part in parts:
+            node = node.subdirs.get(part)
+            if node is None:
+                return None
+        return node
+
+    def count(self, path):
+        # number of indexed files at or under path
+        node = self.node(path)
+        if node is not None:
+            return node.total
+        parent = self.node(os.path.dirname(path))
+        return 1 if parent is not None and os.path.basename(path) in parent.files else 0
+
+    def refresh(self, path):
+        # rescan the entries of directory path, known subdirectories are kept as they are.
+        # Only the aggregates of path and its ancestors are updated.
+        parts = self.__parts__(path)
+        if parts is None or not os.path.isdir(path):
+            return
+        ancestors = [self.tree]
+        for part in parts:
+            node = ancestors[-1].subdirs.get(part)
+            if node is None:
+                # not known yet, scan it as a whole
+                node = self.__scan__(os.path.join(self.root, *parts[:len(ancestors)]))
+                ancestors[-1].subdirs[part] = node
+                self.__update_totals__(ancestors, node.total)
+                return
+            ancestors.append(node)
+
+        node = ancestors.pop()
+        old_total = node.total
+        files = []
+        subdirs = {}
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs[entry.name] = node.subdirs.get(entry.name) or self.__scan__(entry.path)
+                    elif entry.is_file() and self.filename_filter.accept(entry.name):
+                        files.append(entry.name)
+        except OSError as err:
+            self.logger.warning("Cannot index %s: %s", path, err)
+        node.files = sorted(files)
+        node.subdirs = subdirs
+        node.total = len(node.files) + sum(subdir.total for subdir in node.subdirs.values())
+        self.__update_totals__(ancestors, node.total - old_total)
+
+    def __update_totals__(self, ancestors, delta):
+        for node in ancestors:
+            node.total += delta
+
+    def refreshed_path(self, path):
+        # the directory refresh(path) rescans: path or its highest ancestor that is not indexed yet.
+        # None if refresh(path) leaves the index as it is.
+        parts = self.__parts__(path)
+        if parts is None or not os.path.isdir(path):
+            return None
+        node = self.tree
+        for index, part in enumerate(parts):
+            node = node.subdirs.get(part)
+            if node is None:
+                return os.path.join(self.root, *parts[:index + 1])
+        return os.path.normpath(path)
+
+
+class SelectionRules(object):
+
+    def __init__(self, index=None):
+        # without an index only the rules are kept, they are counted once it is set with set_index
+        self.index = index
+        self.rules = {}         # normalized path -> True (include) or False (exclude)
+        self.__paths = []       # the paths of the rules in sorted order, the rules below a path are a slice
+        self.__count = 0
+
+    def __inherited__(self, path):
+        # the state path gets from the rules above it
+        parent = os.path.dirname(path)
+        return parent != path and rule_for(self.rules, parent) is True
+
+    def __subtree__(self, path):
+        # the paths of the rules at or below path
+        prefix = path.rstrip(os.sep) + os.sep
+        start = bisect.bisect_left(self.__paths, prefix)
+        end = bisect.bisect_left(self.__paths, prefix[:-1] + chr(ord(os.sep) + 1))
+        return ([path] if path in self.rules else []) + self.__paths[start:end]
+
+    def __subtree_count__(self, path):
+        # number of selected files at or below path; only the rules in that subtree are visited
+        if self.index is None:
+            return 0
+        count = self.index.count(path) if self.__inherited__(path) else 0
+        for sub_path in self.__subtree__(path):
+            count += self.__rule_count__(sub_path)
+        return count
+
+    def __rule_count__(self, path):
+        # the files the rule on path adds to (or takes from) the selection it inherits
+        return (int(self.rules[path]) - int(self.__inherited__(path))) * self.index.count(path)
+
+    def __set_rule__(self, path, include):
+        path = os.path.normpath(path)
+        before = self.__subtree_count__(path)
+        for sub_path in self.__subtree__(path):
+            del self.rules[sub_path]
+            del self.__paths[bisect.bisect_left(self.__paths, sub_path)]
+        if self.__inherited__(path) != include:
+            self.rules[path] = include
+            bisect.insort(self.__paths, path)
+        self.__count += self.__subtree_count__(path) - before
+
+    def __compute_count__(self):
+        if self.index is None:
+            return 0
+        return sum(self.__rule_count__(path) for path in self.rules)
+
+    def include(self, path):
+        self.__set_rule__(path, True)
+
+    def exclude(self, path):
+        self.__set_rule__(path, False)
+
+    def clear(self):
+        self.rules.clear()
+        self.__paths = []
+        self.__count = 0
+
+    def set_rules(self, rules):
+        # rules: normalized path -> include, e.g. of a model.manual_sets.ManualSet
+        self.rules = dict(rules)
+        self.__paths = sorted(self.rules)
+        self.__count = self.__compute_count__()
+
+    def set_index(self, index):
+        self.index = index
+        self.__count = self.__compute_count__()
+
+    def refresh(self, path):
+        # rescan directory path in the index; only the count of the subtree that changed is updated
+        if self.index is None:
+            return
+        refreshed_path = self.index.refreshed_path(path)
+        if refreshed_path is None:
+            return
+        before = self.__subtree_count__(refreshed_path)
+        self.index.refresh(path)
+        self.__count += self.__subtree_count__(refreshed_path) - before
+
+    def count(self):
+        # number of selected files, None as long as there is no index to count with
+        return None if self.index is None else self.__count
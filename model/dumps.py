@@ -0,0 +1,148 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os, re
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from model.hashing import compute_md5, default_workers
+from model.packaging import ZipPackager
+from model.sitemap_writer import MAX_URLS, XML_DECLARATION, URLSET_OPEN, URLSET_CLOSE, md_element, url_element
+
+# ResourceSync dumps: the resources themselves, in zip packages that each describe their content in a
+# manifest.xml. A resource dump holds all resources, a change dump those created or updated by a publish,
+# and, in its manifest only, the deleted ones. Resources are added as they come in; a package is closed when
+# the next resource would take it over max_bytes, or when its manifest is full, and is built by a pool of
+# threads while the next one fills.
+# Packages are staged next to their target and moved in place together on close, so that the packages and
+# the dump index that lists them agree; finish builds them without moving them, for a caller that has
+# something else to commit first. Entries of the package that is replaced are reused if unchanged.
+#
+#   dumps/resourcedump-00001.zip ...    in a subdirectory of the resync dir, left out of resourcesync.zip
+#   dumps/changedump-00001-00001.zip    packages of the first change dump, and so on
+#       manifest.xml
+#       resources/<path relative to the resource dir>
+
+DUMPS_DIR = "dumps"
+MANIFEST_XML = "manifest.xml"
+RESOURCES_DIR = "resources"
+
+MAX_BYTES = 1024 * 1024 * 1024
+
+# a zip package of a dump. md: (name, value) attributes of its rs:md in the dump index
+DumpPackage = namedtuple("DumpPackage", ["name", "file_count", "bytes", "md"])
+
+logger = logging.getLogger(__name__)
+
+
+class DumpWriter(object):
+
+    def __init__(self, dump_dir, prefix, capability, md=(), max_bytes=MAX_BYTES, workers=2, zip_workers=None):
+        # prefix: packages are named prefix-00001.zip etc. capability: of the manifests,
+        # e.g. 'resourcedump-manifest'. md: further (name, value) attributes of the rs:md of the manifests and
+        # packages, e.g. ("at", ...). workers: packages built at the same time. zip_workers: threads
+        # compressing files, divided over the packages being built; 0 or None for as many as there are cpu's.
+        self.dump_dir = dump_dir
+        self.prefix = prefix
+        self.capability = capability
+        self.md = list(md)
+        self.max_bytes = max_bytes
+        self.workers = max(1, workers)
+        self.zip_workers = max(1, (zip_workers or default_workers()) // self.workers)
+        os.makedirs(dump_dir, exist_ok=True)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.pending = deque()      # futures of the packages being built, in order
+        self.packages = []          # DumpPackages built
+        self.entries = []           # (path or None, arcname, loc, lastmod, md) of the package being filled
+        self.size = 0
+        self.file_count = 0
+        self.bytes = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __staged_name__(self, name):
+        return os.path.join(self.dump_dir, "." + name + ".new")
+
+    def write(self, path, size, rel_path, loc, lastmod=None, md=()):
+        # add the file path as RESOURCES_DIR/rel_path, described in the manifest by loc, lastmod and md
+        if self.entries and (self.size + size > self.max_bytes or len(self.entries) >= MAX_URLS):
+            self.__submit__()
+        self.entries.append((path, RESOURCES_DIR + "/" + rel_path, loc, lastmod, md))
+        self.size += size
+        self.file_count += 1
+        self.bytes += size
+
+    def write_entry(self, loc, lastmod=None, md=()):
+        # an entry of the manifest without content, e.g. of a deleted resource
+        if len(self.entries) >= MAX_URLS:
+            self.__submit__()
+        self.entries.append((None, None, loc, lastmod, md))
+
+    def __submit__(self):
+        name = "%s-%05d.zip" % (self.prefix, len(self.packages) + len(self.pending) + 1)
+        self.pending.append(self.pool.submit(self.__build__, name, self.entries, self.size))
+        self.entries = []
+        self.size = 0
+        # do not run ahead of the pool: only the package being filled is held besides those being built
+        while len(self.pending) > self.workers:
+            self.packages.append(self.pending.popleft().result())
+
+    def __build__(self, name, entries, size):
+        staged = self.__staged_name__(name)
+        manifest = os.path.join(self.dump_dir, "." + name + "." + MANIFEST_XML)
+        try:
+            with open(manifest, "w", encoding="utf-8") as f:
+                f.write(XML_DECLARATION + URLSET_OPEN + md_element([("capability", self.capability)] + self.md))
+                for path, arcname, loc, lastmod, md in entries:
+                    f.write(url_element(loc, lastmod, list(md) + ([("path", "/" + arcname)] if arcname else [])))
+                f.write(URLSET_CLOSE)
+            files = [(path, arcname) for path, arcname, loc, lastmod, md in entries if path is not None]
+            ZipPackager(staged, self.zip_workers, previous_path=os.path.join(self.dump_dir, name)) \
+                .package([(manifest, MANIFEST_XML)] + files, rewrite=[MANIFEST_XML])
+        finally:
+            os.remove(manifest)
+        logger.debug("Built dump package %s with %d resources", name, len(files))
+        md = [("type", "application/zip"), ("hash", "md5:" + compute_md5(staged)),
+              ("length", os.path.getsize(staged))] + self.md
+        return DumpPackage(name, len(files), size, md)
+
+    def finish(self):
+        # build the remaining packages, staged until close
+        if self.entries:
+            self.__submit__()
+        while self.pending:
+            self.packages.append(self.pending.popleft().result())
+        self.pool.shutdown()
+
+    def close(self):
+        self.finish()
+        names = set()
+        for package in self.packages:
+            os.replace(self.__staged_name__(package.name), os.path.join(self.dump_dir, package.name))
+            names.add(package.name)
+        # packages of an earlier, larger dump
+        pattern = re.compile(re.escape(self.prefix) + r"-[0-9]{5}\.zip")
+        for filename in os.listdir(self.dump_dir):
+            if pattern.fullmatch(filename) and filename not in names:
+                os.remove(os.path.join(self.dump_dir, filename))
+        logger.info("Wrote %d resources in %d packages to %s", self.file_count, len(self.packages), self.dump_dir)
+
+    def discard(self):
+        for future in self.pending:
+            future.cancel()
+        self.pool.shutdown(wait=True)
+        for future in self.pending:
+            if not future.cancelled() and future.exception() is None:
+                self.packages.append(future.result())
+        self.pending.clear()
+        for package in self.packages:
+            staged = self.__staged_name__(package.name)
+            if os.path.exists(staged):
+                os.remove(staged)
@@ -0,0 +1,129 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib, logging, mmap, os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+
+# Hashing of resources. hashlib releases the GIL while digesting large buffers, so a thread pool
+# scales over cores as long as blocks are big enough; a process pool is available for hosts where
+# it does not. Each block read is fed to all requested digests, so extra digests cost cpu, not I/O.
+
+BLOCK_SIZE = 1024 * 1024
+MMAP_THRESHOLD = 64 * 1024 * 1024
+
+# bytes at the start and at the end of a file that go into its quick signature
+QUICK_BLOCK_SIZE = 64 * 1024
+
+EXECUTOR_THREAD = "thread"
+EXECUTOR_PROCESS = "process"
+
+# ResourceSync names of the supported algorithms, as in the hash attribute of rs:md, and their hashlib names
+HASH_ALGORITHMS = {"md5": "md5", "sha-1": "sha1", "sha-256": "sha256"}
+
+
+def hash_algorithms(algorithms):
+    # algorithms in the order they are computed: md5 first, it identifies changes
+    for algorithm in algorithms:
+        if algorithm not in HASH_ALGORITHMS:
+            raise ValueError("Unsupported hash algorithm: %s" % algorithm)
+    return ["md5"] + [algorithm for algorithm in dict.fromkeys(algorithms) if algorithm != "md5"]
+
+
+def parse_digests(value):
+    # {algorithm: digest} from a hash attribute value, e.g. "md5:... sha-256:..."
+    return dict(item.partition(":")[::2] for item in (value or "").split())
+
+
+def format_digests(algorithms, digests):
+    return " ".join("%s:%s" % (algorithm, digest) for algorithm, digest in zip(algorithms, digests))
+
+
+def quick_digest(size, head, tail):
+    return "%d:%s" % (size, hashlib.md5(head + tail).hexdigest())
+
+
+def quick_signature(path):
+    # size and md5 of the first and last QUICK_BLOCK_SIZE bytes of path. Reads at most two blocks; it catches
+    # changes in size and at the start or end of a file, not those in between.
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        head = f.read(QUICK_BLOCK_SIZE)
+        if size > QUICK_BLOCK_SIZE:
+            f.seek(size - QUICK_BLOCK_SIZE)
+            tail = f.read(QUICK_BLOCK_SIZE)
+        else:
+            tail = head
+    return quick_digest(size, head, tail)
+
+
+def compute_digests(path, algorithms=("md5",), quick=False, block_size=BLOCK_SIZE, mmap_threshold=MMAP_THRESHOLD):
+    # read path once; return the hex digest for each of algorithms, and its quick signature if quick
+    digests = [hashlib.new(HASH_ALGORITHMS[algorithm]) for algorithm in algorithms]
+    head = tail = b""
+
+    def update(block):
+        nonlocal head, tail
+        for digest in digests:
+            digest.update(block)
+        if quick:
+            if len(head) < QUICK_BLOCK_SIZE:
+                head += bytes(block[:QUICK_BLOCK_SIZE - len(head)])
+            if len(block) >= QUICK_BLOCK_SIZE:
+                tail = bytes(block[-QUICK_BLOCK_SIZE:])
+            else:
+                tail = (tail + bytes(block))[-QUICK_BLOCK_SIZE:]
+
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= mmap_threshold:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                view = memoryview(mm)
+                try:
+                    for offset in range(0, size, block_size):
+                        update(view[offset:offset + block_size])
+                finally:
+                    view.release()
+        else:
+            for block in iter(lambda: f.read(block_size), b""):
+                update(block)
+    return [digest.hexdigest() for digest in digests], quick_digest(size, head, tail) if quick else None
+
+
+def compute_md5(path, block_size=BLOCK_SIZE, mmap_threshold=MMAP_THRESHOLD):
+    return compute_digests(path, block_size=block_size, mmap_threshold=mmap_threshold)[0][0]
+
+
+def default_workers():
+    return os.cpu_count() or 1
+
+
+class Hasher(object):
+
+    def __init__(self, workers=None, executor=EXECUTOR_THREAD):
+        self.logger = logging.getLogger(__name__)
+        self.workers = workers if workers and workers > 0 else default_workers()
+        self.executor = executor
+
+    def digests_iter(self, paths, algorithms=("md5",), quick=False):
+        # yield (digests, quick signature) of each path as for compute_digests, as soon as it is available,
+        # in the order of paths. Closing the generator early cancels the hashing of files that have not
+        # been started yet.
+        paths = list(paths)
+        compute = partial(compute_digests, algorithms=tuple(algorithms), quick=quick)
+        if self.workers == 1 or len(paths) < 2:
+            for path in paths:
+                yield compute(path)
+            return
+
+        self.logger.debug("Hashing %d files with %d %s workers", len(paths), self.workers, self.executor)
+        if self.executor == EXECUTOR_PROCESS:
+            pool = ProcessPoolExecutor(max_workers=self.workers)
+            results = pool.map(compute, paths, chunksize=64)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.workers)
+            results = pool.map(compute, paths)
+        try:
+            yield from results
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
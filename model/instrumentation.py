@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime, json, logging, os, sys, time
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:     # Windows
+    resource = None
+
+# Timing spans and counters of a publish run.
+#
+# A span times a stage of the run; spans with the same name add up, so a stage that is done in batches
+# can be timed per batch. Spans may nest: the time of a span minus the time of the spans inside it is
+# its own time, which is what the report shows per stage. At the end of a run the report is logged and
+# written as json into the resync dir, the last run as RUN_REPORT and all runs, one per line, in
+# RUN_HISTORY. The leading dots keep them out of resourcesync.zip.
+
+RUN_REPORT = ".resyto_run_report.json"
+RUN_HISTORY = ".resyto_run_history.jsonl"
+
+logger = logging.getLogger(__name__)
+
+
+def peak_memory():
+    # peak resident set size of this process in bytes, None where it cannot be determined
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+class RunReport(object):
+
+    def __init__(self, task):
+        self.task = task
+        self.started = time.time()
+        self.__start = time.perf_counter()
+        self.seconds = None
+        self.spans = {}         # name -> [count, seconds, own seconds]
+        self.counters = {}
+        self.__stack = []       # [name, start, seconds of nested spans]
+
+    @contextmanager
+    def span(self, name):
+        frame = [name, time.perf_counter(), 0.0]
+        self.__stack.append(frame)
+        try:
+            yield
+        finally:
+            self.__stack.pop()
+            seconds = time.perf_counter() - frame[1]
+            span = self.spans.setdefault(name, [0, 0.0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+            span[2] += seconds - frame[2]
+            if self.__stack:
+                self.__stack[-1][2] += seconds
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.__start
+        return self
+
+    def as_dict(self):
+        seconds = self.seconds if self.seconds is not None else time.perf_counter() - self.__start
+        counters = self.counters
+        hash_seconds = self.spans.get("hash", [0, 0.0, 0.0])[1]
+        lookups = counters.get("cache_hits", 0) + counters.get("cache_misses", 0)
+        return {"task": self.task,
+                "started": datetime.datetime.fromtimestamp(self.started).isoformat(timespec="seconds"),
+                "seconds": round(seconds, 6),
+                "stages": {name: {"count": count, "seconds": round(total, 6), "own_seconds": round(own, 6)}
+                           for name, (count, total, own) in self.spans.items()},
+                "counters": dict(counters),
+                "files_per_second": round(counters.get("files", 0) / seconds, 1) if seconds else None,
+                "bytes_hashed_per_second": round(counters.get("bytes_hashed", 0) / hash_seconds, 1)
+                if hash_seconds else None,
+                "cache_hit_rate": round(counters.get("cache_hits", 0) / lookups, 4) if lookups else None,
+                "peak_memory": peak_memory()}
+
+    def log(self):
+        report = self.as_dict()
+        logger.info("%s finished in %.3f s: %d files, %s files/s, %s bytes hashed/s, cache hit rate %s, "
+                    "peak memory %s", self.task, report["seconds"], self.counters.get("files", 0),
+                    report["files_per_second"], report["bytes_hashed_per_second"], report["cache_hit_rate"],
+                    report["peak_memory"])
+        for name, stage in report["stages"].items():
+            logger.info("%s stage %-8s %10.3f s (own %.3f s, %d spans)", self.task, name, stage["seconds"],
+                        stage["own_seconds"], stage["count"])
+        return report
+
+    def write(self, directory):
+        # write the report as RUN_REPORT and append it to RUN_HISTORY in directory
+        report = self.as_dict()
+        tmp_path = os.path.join(directory, RUN_REPORT + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+            f.write("\n")
+        os.replace(tmp_path, os.path.join(directory, RUN_REPORT))
+        with open(os.path.join(directory, RUN_HISTORY), "a") as f:
+            f.write(json.dumps(report, sort_keys=True) + "\n")
+        return report
+
+
+def read_history(directory):
+    # the reports of earlier runs in directory, oldest first
+    path = os.path.join(directory, RUN_HISTORY)
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
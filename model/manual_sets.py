@@ -0,0 +1,117 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os
+from collections import namedtuple
+
+from model.metadata import iter_path_records
+
+# Manual sets: selections made in the Explorer, kept as their folder and file include/exclude rules
+# (see model.dir_index.SelectionRules) rather than as the files they select. A set is expanded into files
+# lazily, reading only the directories it includes, so the full list of paths is never held.
+#
+# Sets are stored in a text file. Rule paths are relative to the root of the set and prefix-compressed:
+# each rule gives the number of leading path components it shares with the previous rule, followed by the
+# remaining components.
+#
+#   [letters]
+#   root /data/archive
+#   + 0 letters
+#   - 1 1999
+#   + 2 scan-001.tif
+#   + 1 2000
+
+ManualSet = namedtuple("ManualSet", ["name", "root", "rules"])      # rules: normalized path -> include
+
+
+class ManualSetError(ValueError):
+    pass
+
+
+def __components__(root, path):
+    rel_path = os.path.relpath(path, root)
+    return [] if rel_path == os.curdir else rel_path.split(os.sep)
+
+
+def encode_rules(root, rules):
+    # lines for rules, sorted and prefix-compressed
+    lines = []
+    previous = []
+    for parts, include in sorted((__components__(root, path), include) for path, include in rules.items()):
+        shared = 0
+        while shared < min(len(parts), len(previous)) and parts[shared] == previous[shared]:
+            shared += 1
+        lines.append("%s %d %s" % ("+" if include else "-", shared, "/".join(parts[shared:])))
+        previous = parts
+    return lines
+
+
+def decode_rules(root, lines):
+    # rules from lines written by encode_rules
+    rules = {}
+    previous = []
+    for line in lines:
+        flag, shared, rest = (line.split(" ", 2) + [""])[:3]
+        if flag not in ("+", "-") or not shared.isdigit():
+            raise ManualSetError("Not a rule: %s" % line)
+        parts = previous[:int(shared)] + (rest.split("/") if rest else [])
+        rules[os.path.normpath(os.path.join(root, *parts))] = flag == "+"
+        previous = parts
+    return rules
+
+
+def format_manual_sets(manual_sets):
+    text = ""
+    for manual_set in manual_sets:
+        text += "[%s]\nroot %s\n" % (manual_set.name, manual_set.root)
+        text += "".join(line + "\n" for line in encode_rules(manual_set.root, manual_set.rules)) + "\n"
+    return text
+
+
+def parse_manual_sets(text):
+    manual_sets = []
+    name = root = None
+    lines = []
+
+    def close():
+        if name is not None:
+            if root is None:
+                raise ManualSetError("Set %s has no root" % name)
+            manual_sets.append(ManualSet(name, root, decode_rules(root, lines)))
+
+    for line in text.splitlines():
+        line = line.rstrip("\n")
+        if not line.strip():
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            close()
+            name, root, lines = line[1:-1].strip(), None, []
+        elif name is None:
+            raise ManualSetError("Rule outside of a set: %s" % line)
+        elif line.startswith("root "):
+            root = line[5:]
+        else:
+            lines.append(line)
+    close()
+    return manual_sets
+
+
+def load_manual_sets(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8", errors="surrogateescape") as f:
+        return parse_manual_sets(f.read())
+
+
+def save_manual_sets(path, manual_sets):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", errors="surrogateescape") as f:
+        f.write(format_manual_sets(manual_sets))
+    os.replace(tmp_path, path)
+
+
+def iter_set_files(manual_set, filename_filter):
+    # yield the files selected by manual_set in ascending order, reading only the directories that may
+    # hold selected files
+    for record in iter_path_records(manual_set.rules, filename_filter):
+        yield record.path
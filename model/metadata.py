@@ -0,0 +1,207 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Collection of file metadata (size, mtime) with one stat per file. Directories are read with os.scandir
+# by a pool of threads, which hides the latency of network filesystems where each stat is a round-trip.
+# Results are kept in columns instead of a list per file.
+
+DEFAULT_WORKERS = 16
+
+# columns of a row
+COL_PATH = 0
+COL_NAME = 1
+COL_SIZE = 2
+COL_MTIME = 3
+
+# a file and its os.stat_result, None if it was not stat'ed yet
+PathRecord = namedtuple("PathRecord", ["path", "stat"])
+
+logger = logging.getLogger(__name__)
+
+
+class SortOrder(object):
+    # read-only view on a permutation of row indexes, optionally reversed, that does not copy it
+
+    __slots__ = ["indexes", "descending"]
+
+    def __init__(self, indexes, descending=False):
+        self.indexes = indexes
+        self.descending = descending
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __getitem__(self, row):
+        if self.descending:
+            return self.indexes[len(self.indexes) - 1 - row]
+        return self.indexes[row]
+
+    def __iter__(self):
+        return iter(reversed(self.indexes) if self.descending else self.indexes)
+
+
+class FileMetadata(object):
+
+    def __init__(self):
+        self.paths = []
+        self.sizes = array("q")
+        self.mtimes = array("d")
+        self.__sort_orders = {}     # column -> ascending permutation of row indexes
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, row):
+        # row as [path, name, size, mtime]
+        path = self.paths[row]
+        return [path, os.path.basename(path), self.sizes[row], self.mtimes[row]]
+
+    def __iter__(self):
+        for row in range(len(self.paths)):
+            yield self[row]
+
+    def append(self, path, size, mtime):
+        self.paths.append(path)
+        self.sizes.append(size)
+        self.mtimes.append(mtime)
+        self.__sort_orders.clear()
+
+    def extend(self, other):
+        self.paths.extend(other.paths)
+        self.sizes.extend(other.sizes)
+        self.mtimes.extend(other.mtimes)
+        self.__sort_orders.clear()
+
+    def sort_order(self, column, descending=False):
+        # SortOrder of the rows on column. Orders are computed once per column; descending is the
+        # ascending order read backwards.
+        indexes = self.__sort_orders.get(column)
+        if indexes is None:
+            indexes = self.__argsort__(column)
+            self.__sort_orders[column] = indexes
+        return SortOrder(indexes, descending)
+
+    def __argsort__(self, column):
+        if column in (COL_SIZE, COL_MTIME):
+            values = self.sizes if column == COL_SIZE else self.mtimes
+            if numpy is not None:
+                return numpy.argsort(numpy.frombuffer(values, dtype=values.typecode), kind="stable")
+            return array("q", sorted(range(len(values)), key=values.__getitem__))
+        if column == COL_NAME:
+            names = [os.path.basename(path) for path in self.paths]
+            return array("q", sorted(range(len(names)), key=names.__getitem__))
+        return array("q", sorted(range(len(self.paths)), key=self.paths.__getitem__))
+
+    def total_size(self):
+        return sum(self.sizes)
+
+
+def __scan_directory__(dirname, filename_filter):
+    # metadata of the accepted files in dirname and the list of its subdirectories
+    metadata = FileMetadata()
+    subdirs = []
+    try:
+        with os.scandir(dirname) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file() and filename_filter.accept(entry.name):
+                    stat = entry.stat()
+                    metadata.append(entry.path, stat.st_size, stat.st_mtime)
+    except OSError as err:
+        logger.warning("Cannot read %s: %s", dirname, err)
+    return metadata, subdirs
+
+
+def iter_scan_directories(roots, filename_filter, workers=DEFAULT_WORKERS):
+    # yield a FileMetadata per directory under the directories roots, traversed in parallel, as they are read
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {pool.submit(__scan_directory__, root, filename_filter) for root in roots}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result, subdirs = future.result()
+                pending.update(pool.submit(__scan_directory__, subdir, filename_filter) for subdir in subdirs)
+                yield result
+
+
+def scan_directories(roots, filename_filter, workers=DEFAULT_WORKERS):
+    # FileMetadata of the accepted files under the directories roots, traversed in parallel
+    metadata = FileMetadata()
+    for result in iter_scan_directories(roots, filename_filter, workers):
+        metadata.extend(result)
+    return metadata
+
+
+def iter_path_records(rules, filename_filter):
+    # yield a PathRecord for each accepted file selected by rules, in ascending order of path.
+    # rules: normalized path -> True (include) or False (exclude), see model.dir_index.SelectionRules.
+    # Directories are read one at a time and only if they may hold selected files, so memory is bounded by
+    # the depth and width of the tree instead of the number of selected files.
+    ancestors = set()       # directories with rules below them
+    for path in rules:
+        parent = os.path.dirname(path)
+        while parent != path and parent not in ancestors:
+            ancestors.add(parent)
+            path, parent = parent, os.path.dirname(parent)
+
+    # rules not below another rule; each one covers a block of paths that starts with its path
+    tops = [path for path in rules if os.path.dirname(path) == path or rule_for(rules, os.path.dirname(path)) is None]
+    for path in sorted(tops, key=lambda p: p + os.sep if os.path.isdir(p) else p):
+        if os.path.isdir(path):
+            yield from __iter_directory__(path, rules, rules[path], ancestors, filename_filter)
+        elif rules[path] and filename_filter.accept(os.path.basename(path)):
+            try:
+                yield PathRecord(path, os.stat(path))
+            except OSError:
+                pass
+
+
+def rule_for(rules, path):
+    # the rule that decides for path: the rule on path or on its nearest ancestor, None if there is none
+    while True:
+        if path in rules:
+            return rules[path]
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+
+
+def __iter_directory__(path, rules, state, ancestors, filename_filter):
+    try:
+        with os.scandir(path) as it:
+            # a directory sorts as its name plus separator, the order of the paths below it
+            entries = sorted(((entry.name + os.sep, entry) if entry.is_dir(follow_symlinks=False)
+                              else (entry.name, entry) for entry in it), key=lambda item: item[0])
+    except OSError as err:
+        logger.warning("Cannot read %s: %s", path, err)
+        return
+    for key, entry in entries:
+        if key.endswith(os.sep):
+            sub_state = rules.get(entry.path, state)
+            if sub_state or entry.path in ancestors:
+                yield from __iter_directory__(entry.path, rules, sub_state, ancestors, filename_filter)
+        elif entry.is_file() and filename_filter.accept(entry.name) and rules.get(entry.path, state):
+            try:
+                yield PathRecord(entry.path, entry.stat())
+            except OSError:
+                pass
+
+
+def collect_record_metadata(records):
+    # FileMetadata of PathRecords that were stat'ed
+    metadata = FileMetadata()
+    for record in records:
+        metadata.append(record.path, record.stat.st_size, record.stat.st_mtime)
+    return metadata
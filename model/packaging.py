@@ -0,0 +1,238 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import io, logging, os, struct, tempfile, time, zipfile, zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from model.hashing import default_workers
+
+# Incremental, parallel packaging of files into a zip archive.
+#
+# Entries whose source did not change since the previous archive (same size and modification time) are
+# copied from it as they are, without recompressing. The others are compressed in parallel by a pool of
+# threads (zlib releases the GIL), and files that are compressed already are stored. A single worker
+# compresses straight into the archive; a pool compresses small files in memory and larger ones into
+# temporary files, which the writer copies into the archive in order. The archive is written to a temporary
+# file next to the target and renamed when complete, so readers never see a partial archive.
+#
+# The zipfile module has no public api for adding precompressed data; __start_entry__ and __end_entry__ do
+# what zipfile.ZipFile.open(name, "w") does for the local header and bookkeeping.
+
+BLOCK_SIZE = 1024 * 1024
+COMPRESS_LEVEL = 6
+
+# files of at least this size are compressed by the pool into a temporary file instead of into memory
+SPILL_SIZE = 4 * 1024 * 1024
+
+STORED_EXTENSIONS = {".7z", ".bz2", ".docx", ".gif", ".gz", ".jp2", ".jpeg", ".jpg", ".mp3", ".mp4", ".png",
+                     ".tgz", ".xlsx", ".xz", ".zip"}
+
+LOCAL_HEADER = struct.Struct("<4s5HL2L2H")
+
+
+def compress_type_for(filename):
+    return zipfile.ZIP_STORED if os.path.splitext(filename)[1].lower() in STORED_EXTENSIONS \
+        else zipfile.ZIP_DEFLATED
+
+
+def __compress__(path, compress_type, level, out):
+    # compress path into the binary file out; return crc, size and compressed size
+    crc = 0
+    size = 0
+    compress_size = 0
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15) if compress_type == zipfile.ZIP_DEFLATED else None
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            crc = zlib.crc32(block, crc)
+            size += len(block)
+            data = compressor.compress(block) if compressor else block
+            out.write(data)
+            compress_size += len(data)
+    if compressor:
+        data = compressor.flush()
+        out.write(data)
+        compress_size += len(data)
+    return crc, size, compress_size
+
+
+def __compress_buffered__(path, compress_type, level, size, spill_dir):
+    # compress path into memory, or into a temporary file in spill_dir if it has at least SPILL_SIZE bytes;
+    # return crc, size, compressed size and the buffer, positioned at its start
+    out = io.BytesIO() if size < SPILL_SIZE else tempfile.TemporaryFile(prefix=".", dir=spill_dir)
+    try:
+        crc, size, compress_size = __compress__(path, compress_type, level, out)
+        out.seek(0)
+    except BaseException:
+        out.close()
+        raise
+    return crc, size, compress_size, out
+
+
+def __start_entry__(zf, zinfo, zip64=None):
+    # write the local header of zinfo at the end of the entries of zf
+    zf.fp.seek(zf.start_dir)
+    zinfo.header_offset = zf.fp.tell()
+    zf._writecheck(zinfo)
+    zf._didModify = True
+    zf.fp.write(zinfo.FileHeader(zip64))
+
+
+def __end_entry__(zf, zinfo):
+    zf.filelist.append(zinfo)
+    zf.NameToInfo[zinfo.filename] = zinfo
+    zf.start_dir = zf.fp.tell()
+
+
+def __write_raw__(zf, zinfo, chunks):
+    # write an entry of which zinfo holds CRC, file_size and compress_size, followed by its data
+    __start_entry__(zf, zinfo)
+    for chunk in chunks:
+        zf.fp.write(chunk)
+    __end_entry__(zf, zinfo)
+
+
+def __write_compressed__(zf, zinfo, path, level):
+    # compress path straight into zf; the local header is written again once CRC and sizes are known
+    zip64 = zinfo.file_size * 1.05 > zipfile.ZIP64_LIMIT
+    zinfo.CRC = zinfo.compress_size = 0
+    __start_entry__(zf, zinfo, zip64)
+    zinfo.CRC, zinfo.file_size, zinfo.compress_size = __compress__(path, zinfo.compress_type, level, zf.fp)
+    if not zip64 and max(zinfo.file_size, zinfo.compress_size) > zipfile.ZIP64_LIMIT:
+        raise zipfile.LargeZipFile("%s grew beyond the zip64 limit while it was packaged" % path)
+    end = zf.fp.tell()
+    zf.fp.seek(zinfo.header_offset)
+    zf.fp.write(zinfo.FileHeader(zip64))
+    zf.fp.seek(end)
+    __end_entry__(zf, zinfo)
+
+
+def __read_raw__(f, info):
+    # yield the compressed data of the entry info from the open archive file f
+    f.seek(info.header_offset)
+    header = LOCAL_HEADER.unpack(f.read(LOCAL_HEADER.size))
+    f.seek(header[9] + header[10], os.SEEK_CUR)     # filename length, extra field length
+    remaining = info.compress_size
+    while remaining > 0:
+        chunk = f.read(min(BLOCK_SIZE, remaining))
+        if not chunk:
+            raise zipfile.BadZipFile("Truncated entry %s" % info.filename)
+        remaining -= len(chunk)
+        yield chunk
+
+
+class ZipPackager(object):
+
+    def __init__(self, zip_path, workers=None, progress=None, level=COMPRESS_LEVEL, previous_path=None):
+        # progress: an optional model.progress.Progress
+        # previous_path: archive to reuse entries from, if not the one at zip_path
+        self.logger = logging.getLogger(__name__)
+        self.zip_path = zip_path
+        self.previous_path = previous_path or zip_path
+        self.workers = workers if workers and workers > 0 else default_workers()
+        self.progress = progress
+        self.level = level
+        self.reused = 0
+        self.compressed = 0
+
+    def __previous_entries__(self):
+        if not os.path.exists(self.previous_path):
+            return {}
+        try:
+            with zipfile.ZipFile(self.previous_path) as zf:
+                return {info.filename: info for info in zf.infolist()}
+        except zipfile.BadZipFile as err:
+            self.logger.warning("Not reusing %s: %s", self.previous_path, err)
+            return {}
+
+    def __zipinfo__(self, arcname, stat):
+        # zip stores modification times with a resolution of two seconds
+        date_time = time.localtime(stat.st_mtime)[0:6]
+        zinfo = zipfile.ZipInfo(arcname, date_time[0:5] + (date_time[5] // 2 * 2,))
+        zinfo.external_attr = (stat.st_mode & 0xFFFF) << 16
+        zinfo.compress_type = compress_type_for(arcname)
+        return zinfo
+
+    def package(self, entries, rewrite=()):
+        # entries: sequence of (path, arcname). rewrite: arcnames that are never reused, e.g. of files
+        # generated for this archive. return the number of entries written
+        previous = self.__previous_entries__()
+        plan = []       # (path, zinfo, previous ZipInfo or None)
+        for path, arcname in sorted(entries, key=lambda entry: entry[1]):
+            stat = os.stat(path)
+            zinfo = self.__zipinfo__(arcname, stat)
+            old = previous.get(arcname) if arcname not in rewrite else None
+            if old is not None and (old.file_size, old.date_time, old.compress_type) != \
+                    (stat.st_size, zinfo.date_time, zinfo.compress_type):
+                old = None
+            zinfo.file_size = stat.st_size
+            plan.append((path, zinfo, old))
+
+        dirname, basename = os.path.split(self.zip_path)
+        tmp_path = os.path.join(dirname, "." + basename + ".tmp")
+        try:
+            self.__write__(tmp_path, plan)
+            os.replace(tmp_path, self.zip_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self.logger.debug("Packaged %d entries in %s: %d reused, %d compressed", len(plan), self.zip_path,
+                          self.reused, self.compressed)
+        return len(plan)
+
+    def __write__(self, tmp_path, plan):
+        pending = deque()
+        window = self.workers * 2
+        old_file = open(self.previous_path, "rb") if any(old for path, zinfo, old in plan) else None
+        try:
+            with zipfile.ZipFile(tmp_path, "w", allowZip64=True) as zf:
+                if self.workers == 1:
+                    for item in plan:
+                        self.__write_entry__(zf, old_file, item, None)
+                    return
+                with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    try:
+                        for item in plan:
+                            # keep a bounded number of compressions running ahead of the writer
+                            pending.append((item, self.__submit__(pool, item, os.path.dirname(tmp_path))))
+                            if len(pending) >= window:
+                                self.__write_entry__(zf, old_file, *pending.popleft())
+                        while pending:
+                            self.__write_entry__(zf, old_file, *pending.popleft())
+                    finally:
+                        self.__discard__(pending)
+        finally:
+            if old_file:
+                old_file.close()
+
+    def __submit__(self, pool, item, spill_dir):
+        path, zinfo, old = item
+        if old is not None:
+            return None
+        return pool.submit(__compress_buffered__, path, zinfo.compress_type, self.level, zinfo.file_size, spill_dir)
+
+    def __discard__(self, pending):
+        # close the buffers of compressions that were not written, after an error or a cancel
+        for item, future in pending:
+            if future is not None and not future.cancel() and future.exception() is None:
+                future.result()[3].close()
+
+    def __write_entry__(self, zf, old_file, item, future):
+        # future: of __compress_buffered__, None for an entry that is reused or compressed here
+        path, zinfo, old = item
+        if old is not None:
+            zinfo.CRC, zinfo.file_size, zinfo.compress_size = old.CRC, old.file_size, old.compress_size
+            __write_raw__(zf, zinfo, __read_raw__(old_file, old))
+            self.reused += 1
+        elif future is None:
+            __write_compressed__(zf, zinfo, path, self.level)
+            self.compressed += 1
+        else:
+            zinfo.CRC, zinfo.file_size, zinfo.compress_size, buffer = future.result()
+            with buffer:
+                __write_raw__(zf, zinfo, iter(lambda: buffer.read(BLOCK_SIZE), b""))
+            self.compressed += 1
+        if self.progress:
+            self.progress.file_scanned(zinfo.file_size)
+            self.progress.check_cancelled()
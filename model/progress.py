@@ -0,0 +1,82 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import threading, time
+
+# Progress of a long running job, shared between the thread doing the work and whoever is watching it.
+# The worker updates counters and calls check_cancelled() at safe points; the watcher may call cancel()
+# from any thread. A listener is notified at most once per interval.
+
+NOTIFY_INTERVAL = 0.2
+
+
+class PublishCancelled(Exception):
+    pass
+
+
+class Progress(object):
+
+    def __init__(self, listener=None, interval=NOTIFY_INTERVAL):
+        self.listener = listener
+        self.interval = interval
+        self.__cancel_event = threading.Event()
+        self.__last_notify = 0.0
+        self.start("")
+
+    def start(self, stage, total_files=0, total_bytes=0):
+        self.stage = stage
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.files_scanned = 0
+        self.bytes_hashed = 0
+        self.started = time.monotonic()
+        self.notify(force=True)
+
+    def set_totals(self, total_files, total_bytes=0):
+        self.total_files = total_files
+        self.total_bytes = total_bytes
+        self.notify(force=True)
+
+    def file_scanned(self, size=0, hashed=False):
+        self.files_scanned += 1
+        if hashed:
+            self.bytes_hashed += size
+        self.notify()
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def throughput(self):
+        # bytes hashed per second
+        elapsed = self.elapsed()
+        return self.bytes_hashed / elapsed if elapsed > 0 else 0.0
+
+    def eta(self):
+        # estimated seconds remaining, None if unknown
+        if self.total_files <= 0 or self.files_scanned == 0:
+            return None
+        rate = self.files_scanned / max(self.elapsed(), 1e-6)
+        return max(self.total_files - self.files_scanned, 0) / rate
+
+    def percentage(self):
+        if self.total_files <= 0:
+            return 0
+        return min(100, int(100 * self.files_scanned / self.total_files))
+
+    def notify(self, force=False):
+        if self.listener is None:
+            return
+        now = time.monotonic()
+        if force or now - self.__last_notify >= self.interval:
+            self.__last_notify = now
+            self.listener(self)
+
+    def cancel(self):
+        self.__cancel_event.set()
+
+    def is_cancelled(self):
+        return self.__cancel_event.is_set()
+
+    def check_cancelled(self):
+        if self.is_cancelled():
+            raise PublishCancelled(self.stage)
@@ -0,0 +1,470 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import base64, binascii, logging, os, re, time
+from collections import namedtuple
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from pathlib import PurePath
+
+from model.changelists import ChangelistWriter
+from model.checksum_cache import ChecksumCache
+from model.config import Configuration
+from model.dumps import DUMPS_DIR, DumpWriter
+from model.hashing import Hasher, parse_digests
+from model.instrumentation import RunReport
+from model.metadata import PathRecord, iter_path_records
+from model.packaging import ZipPackager
+from model.progress import Progress
+from model.rule_sets import RuleEngine, SetTally
+from model.watcher import DirtyJournal, snapshot_token
+from model.snapshot import SnapshotRecord, SnapshotWriter, SNAPSHOT_FILE, read_snapshot, changes, \
+    CREATED, UPDATED, DELETED, UNCHANGED
+from model.statistics import ResourceStatistics, load_statistics
+from model.sitemap_writer import GZIP_SUFFIX, SitemapWriter, iter_sitemap_urls, parse_w3c_datetime, w3c_datetime
+
+# Publishing of resourcelists, changelists and the resourcesync zip, independent of the user interface.
+
+CHANGELIST_XML = "changelist.xml"
+RESOURCELIST_XML = "resourcelist.xml"
+RESOURCESYNC_ZIP = "resourcesync.zip"
+RESOURCEDUMP_XML = "resourcedump.xml"
+CHANGEDUMP_XML = "changedump.xml"
+
+# stages reported to Progress
+STAGE_SCANNING = "scanning"
+STAGE_HASHING = "hashing"
+STAGE_COMPARING = "comparing"
+STAGE_WRITING = "writing"
+STAGE_ZIPPING = "zipping"
+
+# number of files stat'ed and hashed in one go
+BATCH_SIZE = 10000
+
+# set_changes: a model.rule_sets.SetChanges per rule set the publisher was given
+PublishResult = namedtuple("PublishResult", ["file_count", "created_count", "updated_count", "unchanged_count",
+                                             "deleted_count", "path", "sitemap_count", "set_changes"],
+                           defaults=[()])
+
+
+# so much for duck typing..
+class FilenameFilter(object):
+
+    def accept(self, filename):
+        return not filename.startswith('.')
+
+
+def iter_walk_records(paths, filename_filter=None):
+    # paths: files and/or folders. yield a model.metadata.PathRecord per file, including files in underlying
+    # folders, in ascending order of path and without listing them all first
+    rules = {os.path.normpath(path): True for path in paths}
+    return iter_path_records(rules, filename_filter or FilenameFilter())
+
+
+class Publisher(object):
+
+    def __init__(self, config=None, progress=None, rule_sets=()):
+        # rule_sets: model.rule_sets.RuleSets to count the published resources and changes of
+        self.logger = logging.getLogger(__name__)
+        self.config = config or Configuration()
+        self.progress = progress or Progress()
+        self.rule_sets = rule_sets
+        self.report = RunReport("")     # model.instrumentation.RunReport of the current or last task
+
+    def relative_path(self, path):
+        # path relative to the resource dir, with '/' as separator
+        return "/".join(PurePath(os.path.relpath(path, self.config.cfg_resource_dir())).parts)
+
+    def path_to_uri(self, path):
+        return self.config.cfg_urlprefix().rstrip("/") + "/" + self.relative_path(path)
+
+    def uri_to_path(self, uri):
+        rel_uri = uri[len(self.config.cfg_urlprefix().rstrip("/")) + 1:]
+        return os.path.join(self.config.cfg_resource_dir(), *rel_uri.split("/"))
+
+    def sitemap_base_url(self):
+        # sitemaps are published in the same location as the source description
+        return self.config.cfg_sourcedesc().rsplit("/", 1)[0]
+
+    def snapshot_path(self):
+        return os.path.join(self.config.cfg_resync_dir(), SNAPSHOT_FILE)
+
+    def checksum_cache(self):
+        return ChecksumCache(self.config.cfg_resync_dir(), algorithms=self.config.cfg_hash_algorithms(),
+                             precheck=self.config.cfg_hash_precheck())
+
+    def scan_records(self, paths, cache, known=(), dirty=None, total=None):
+        # yield a SnapshotRecord for each of paths, in ascending order of path.
+        # paths: a list of paths, which is sorted here, or an iterable of paths or model.metadata.PathRecords
+        # in ascending order of path, which is consumed batch by batch as it streams in.
+        # Files are stat'ed and hashed in batches; checksums come from cache where possible.
+        # known: SnapshotRecords in ascending order of path, reused for files that are not in dirty and that
+        # have all digests of cache. Only used if dirty is a set.
+        # total: the number of paths if the caller knows it, e.g. of a selection that is streamed; the
+        # progress has no total if it is None and paths is not a collection.
+        if isinstance(paths, (list, tuple, set, frozenset)):
+            paths, total = sorted(paths), len(paths)
+        paths = iter(paths)
+        known = iter(known if dirty is not None else ())
+        k = next(known, None)
+        last = None
+        extra = cache.algorithms[1:]
+        self.progress.start(STAGE_HASHING, total or 0)
+        hasher = Hasher(self.config.cfg_hash_workers(), self.config.cfg_hash_executor())
+        while True:
+            # a stream of paths is walked as the batches are taken from it
+            with self.report.span("walk"):
+                batch = [item if isinstance(item, PathRecord) else PathRecord(item, None)
+                         for item in islice(paths, BATCH_SIZE)]
+            if not batch:
+                break
+            records = [None] * len(batch)
+            for i, (path, stat) in enumerate(batch):
+                if last is not None and path <= last:
+                    # the merge with the snapshot depends on the order
+                    raise ValueError("Paths not in ascending order: %s after %s" % (path, last))
+                last = path
+                while k is not None and k.path < path:
+                    k = next(known, None)
+                if k is not None and k.path == path and path not in dirty and \
+                        (not extra or all(algorithm in parse_digests(k.digests) for algorithm in extra)):
+                    records[i] = k
+                    self.progress.file_scanned(k.size)
+            to_scan = [item for item, record in zip(batch, records) if record is None]
+            with self.report.span("stat"):
+                stats = [stat or os.stat(path) for path, stat in to_scan]
+            with self.report.span("hash"):
+                checksums = cache.digests_all([path for path, stat in to_scan], hasher, self.progress, stats)
+            self.report.count("files_stat", len(to_scan))
+            scanned = iter(zip(to_scan, stats, checksums))
+            for record in records:
+                if record is None:
+                    (path, _), stat, (md5, digests) = next(scanned)
+                    record = SnapshotRecord(path, stat.st_size, stat.st_mtime, md5, digests)
+                yield record
+            self.progress.check_cancelled()
+
+    def dirty_filenames(self, dirty):
+        # the published files plus the changed ones, without walking the resource dir
+        filename_filter = FilenameFilter()
+        s = set(record.path for record in read_snapshot(self.snapshot_path()))
+        for path in dirty:
+            if os.path.isfile(path) and filename_filter.accept(os.path.basename(path)):
+                s.add(path)
+            else:
+                s.discard(path)
+        return sorted(s)
+
+    def records_from_sitemap(self, resync_file):
+        # previous state from a published resourcelist, for resync dirs published before snapshots existed
+        path = os.path.join(self.config.cfg_resync_dir(), resync_file)
+        if not os.path.exists(path):
+            return []
+        self.logger.info("No snapshot found, reading previous state from %s", path)
+        records = [SnapshotRecord(self.uri_to_path(loc), int(md.get("length", -1)), lastmod or 0.0,
+                                  normalize_md5(md_hash(md, "md5")))
+                   for loc, lastmod, md in iter_sitemap_urls(path)]
+        return sorted(records, key=lambda record: record.path)
+
+    def resource_md(self, record, change=None):
+        # (name, value) attributes of the rs:md element of record
+        hashes = (["md5:" + record.md5] if record.md5 else []) + ([record.digests] if record.digests else [])
+        return [("change", change), ("hash", " ".join(hashes) or None), ("length", record.size)]
+
+    @contextmanager
+    def __reporting__(self, task):
+        # time task; on success the report is logged and written into the resync dir
+        self.report = RunReport(task)
+        yield self.report
+        self.report.finish()
+        self.report.log()
+        self.report.write(self.config.cfg_resync_dir())
+
+    def __count_cache__(self, cache):
+        self.report.count("cache_hits", cache.hits)
+        self.report.count("cache_misses", cache.misses)
+        self.report.count("cache_prechecked", cache.prechecked)
+        self.report.count("bytes_hashed", cache.bytes_hashed)
+
+    def __set_tally__(self):
+        # a model.rule_sets.SetTally if there are rule sets to count
+        if not self.rule_sets:
+            return None
+        return SetTally(RuleEngine(self.rule_sets), self.config.cfg_resource_dir())
+
+    def __save_statistics__(self, statistics, token):
+        with self.report.span("statistics"):
+            statistics.token = token
+            statistics.save(self.config.cfg_resync_dir())
+
+    def __count_result__(self, result, total_bytes):
+        self.report.count("files", result.file_count)
+        self.report.count("bytes", total_bytes)
+        for name in ("created", "updated", "unchanged", "deleted"):
+            self.report.count(name, getattr(result, name + "_count"))
+        self.report.count("sitemaps", result.sitemap_count)
+
+    def publish(self, paths=None, total=None, scanned_since=None):
+        if self.config.cfg_strategy() == 0:
+            return self.publish_resource_list(paths, total)
+        else:
+            return self.publish_change_list(paths, total, scanned_since)
+
+    def publish_resource_list(self, paths=None, total=None):
+        # checksums are taken from the persistent cache, only files with a changed stat signature are hashed
+        # paths, total: the files to publish as for scan_records, None for everything in the resource dir
+        with self.__reporting__("resourcelist") as report:
+            if paths is None:
+                paths = iter_walk_records([self.config.cfg_resource_dir()])
+            journal = DirtyJournal(self.config.cfg_resync_dir())
+            mark = journal.mark()
+            rl_path = os.path.join(self.config.cfg_resync_dir(), RESOURCELIST_XML)
+            statistics = ResourceStatistics(self.config.cfg_resource_dir())
+            tally = self.__set_tally__()
+            # the write span includes comparing and writing the snapshot, stat and hash are spans inside it
+            with report.span("write"), \
+                    self.checksum_cache() as cache, \
+                    SnapshotWriter(self.snapshot_path()) as snapshot, \
+                    SitemapWriter(rl_path, "resourcelist", self.sitemap_base_url(),
+                                  md=[("at", w3c_datetime(time.time()))],
+                                  gzip=self.config.cfg_gzip_sitemaps()) as writer:
+                for record in self.scan_records(paths, cache, total=total):
+                    writer.write_url(self.path_to_uri(record.path), record.mtime, self.resource_md(record))
+                    snapshot.write(record)
+                    statistics.add(record)
+                    if tally:
+                        tally.add(CREATED, record)
+                self.progress.start(STAGE_WRITING)
+            token = snapshot_token(self.snapshot_path())
+            journal.reset(token, mark)
+            self.__save_statistics__(statistics, token)
+            result = PublishResult(writer.total_urls, writer.total_urls, 0, 0, 0, rl_path, writer.sitemap_count(),
+                                   tally.results() if tally else ())
+            report.count("sitemaps_unchanged", writer.unchanged)
+            self.__count_cache__(cache)
+            self.__count_result__(result, statistics.bytes)
+        return result
+
+    def publish_change_list(self, paths=None, total=None, scanned_since=None):
+        # changes are found by a merge-join of the snapshot of the last published state and the current scan.
+        # If a watcher kept the dirty journal since the last publish, only the files in it are stat'ed and
+        # hashed. paths, total: the files to publish as for scan_records, None for everything in the resource dir.
+        # The journal is only used after a full scan of the watcher that started after scanned_since, seconds
+        # since epoch, e.g. when the caller had its own watcher rescan; by default a scan is requested from the
+        # watcher, and waited for, now.
+        with self.__reporting__("changelist") as report:
+            journal = DirtyJournal(self.config.cfg_resync_dir())
+            mark = journal.mark()
+            started = time.time()
+            dirty = None
+            since = time.time()     # start of the changes, the time of the previous publish if known
+            with report.span("read"):
+                if os.path.exists(self.snapshot_path()):
+                    since = os.path.getmtime(self.snapshot_path())
+                    token = snapshot_token(self.snapshot_path())
+                    previous = read_snapshot(self.snapshot_path())
+                    if scanned_since is None and journal.is_active():
+                        with report.span("rescan"):
+                            journal.wait_for_scan(started)
+                    dirty = journal.dirty_paths(token, scanned_since if scanned_since is not None else started)
+                    statistics = load_statistics(self.config.cfg_resync_dir(), self.config.cfg_resource_dir(),
+                                                 self.snapshot_path(), token)
+                else:
+                    previous = self.records_from_sitemap(RESOURCELIST_XML)
+                    statistics = ResourceStatistics.from_records(self.config.cfg_resource_dir(), previous)
+            if dirty is not None:
+                self.logger.info("Using dirty journal with %d changed paths", len(dirty))
+                report.count("dirty_paths", len(dirty))
+            if paths is None:
+                if dirty is not None:
+                    with report.span("walk"):
+                        paths = self.dirty_filenames(dirty)
+                else:
+                    paths = iter_walk_records([self.config.cfg_resource_dir()])
+
+            cl_path = os.path.join(self.config.cfg_resync_dir(), CHANGELIST_XML)
+            counts = {CREATED: 0, UPDATED: 0, DELETED: 0, UNCHANGED: 0}
+            tally = self.__set_tally__()
+            now = time.time()
+            dump_md = [("from", w3c_datetime(since)), ("until", w3c_datetime(now))]
+            cd_path = os.path.join(self.config.cfg_resync_dir(), CHANGEDUMP_XML)
+            earlier_dumps = list(iter_sitemap_urls(cd_path)) if self.config.cfg_change_dump() else []
+            retention = self.config.cfg_change_dump_retention() * 86400
+            expired = expired_change_dumps(earlier_dumps, now - retention) if retention > 0 else []
+
+            # the write span includes comparing and writing the snapshot, stat and hash are spans inside it.
+            # Changes are appended to the open changelist, which rolls over into archives. Created and updated
+            # resources go into the change dump as they come out of the comparison. Its packages are built
+            # before, and moved in place after, the changelist and the snapshot are committed.
+            with report.span("write"), \
+                    (self.dump_writer("changedump-%05d" % change_dump_number(earlier_dumps), "changedump-manifest",
+                                      dump_md) if self.config.cfg_change_dump() else nullcontext()) as dump, \
+                    self.checksum_cache() as cache, \
+                    SnapshotWriter(self.snapshot_path()) as snapshot, \
+                    ChangelistWriter(cl_path, self.sitemap_base_url(), since,
+                                     self.config.cfg_changelist_window() * 86400,
+                                     self.config.cfg_changelist_max_urls(), now=now,
+                                     gzip=self.config.cfg_gzip_sitemaps()) as writer:
+                current = self.scan_records(paths, cache, read_snapshot(self.snapshot_path()), dirty, total)
+                for change, prev, record in changes(previous, current):
+                    counts[change] += 1
+                    if tally:
+                        tally.add(change, record or prev)
+                    if change == UNCHANGED:
+                        snapshot.write(record)
+                        continue
+                    statistics.apply(change, prev, record)
+                    if change == DELETED:
+                        writer.write_url(self.path_to_uri(prev.path), now, [("change", DELETED)])
+                        if dump:
+                            dump.write_entry(self.path_to_uri(prev.path), now, [("change", DELETED)])
+                        continue
+                    snapshot.write(record)
+                    writer.write_url(self.path_to_uri(record.path), record.mtime, self.resource_md(record, change))
+                    if dump:
+                        dump.write(record.path, record.size, self.relative_path(record.path),
+                                   self.path_to_uri(record.path), record.mtime, self.resource_md(record, change))
+                if dump:
+                    dump.finish()
+                self.progress.start(STAGE_WRITING)
+            if dump and (dump.packages or expired):
+                with report.span("index"):
+                    kept = [entry for entry in earlier_dumps if entry not in expired]
+                    self.__write_change_dump_index__(cd_path, kept, dump.packages)
+                    # the packages of expired change dumps, once the index no longer lists them
+                    for loc, lastmod, md in expired:
+                        path = os.path.join(self.dump_dir(), loc.rsplit("/", 1)[1])
+                        if os.path.exists(path):
+                            os.remove(path)
+                report.count("packages", len(dump.packages))
+                report.count("packages_expired", len(expired))
+            token = snapshot_token(self.snapshot_path())
+            journal.reset(token, mark)
+            self.__save_statistics__(statistics, token)
+            file_count = counts[CREATED] + counts[UPDATED] + counts[UNCHANGED]
+            result = PublishResult(file_count, counts[CREATED], counts[UPDATED], counts[UNCHANGED], counts[DELETED],
+                                   cl_path, writer.sitemap_count(), tally.results() if tally else ())
+            self.__count_cache__(cache)
+            self.__count_result__(result, statistics.bytes)
+        return result
+
+    def dump_dir(self):
+        return os.path.join(self.config.cfg_resync_dir(), DUMPS_DIR)
+
+    def dump_writer(self, prefix, capability, md):
+        # a model.dumps.DumpWriter for packages prefix-00001.zip etc. in the dump dir
+        return DumpWriter(self.dump_dir(), prefix, capability, md, self.config.cfg_dump_max_size() * 1024 * 1024,
+                          self.config.cfg_dump_workers(), self.config.cfg_zip_workers())
+
+    def dump_url(self, name):
+        return self.sitemap_base_url() + "/" + DUMPS_DIR + "/" + name
+
+    def publish_resource_dump(self, paths=None, total=None):
+        # the resources themselves, in zip packages listed in resourcedump.xml, for harvesters that start from
+        # scratch. paths, total: the files to dump as for scan_records, None for everything in the resource dir
+        with self.__reporting__("resourcedump") as report:
+            if paths is None:
+                paths = iter_walk_records([self.config.cfg_resource_dir()])
+            rd_path = os.path.join(self.config.cfg_resync_dir(), RESOURCEDUMP_XML)
+            at = [("at", w3c_datetime(time.time()))]
+            # packages are built while the next one fills; the write span ends when the last one is built
+            with report.span("write"), \
+                    self.checksum_cache() as cache, \
+                    self.dump_writer("resourcedump", "resourcedump-manifest", at) as dump:
+                for record in self.scan_records(paths, cache, total=total):
+                    dump.write(record.path, record.size, self.relative_path(record.path),
+                               self.path_to_uri(record.path), record.mtime, self.resource_md(record))
+                self.progress.start(STAGE_ZIPPING)
+            with report.span("index"), \
+                    SitemapWriter(rd_path, "resourcedump", self.sitemap_base_url(), md=at,
+                                  gzip=self.config.cfg_gzip_sitemaps()) as writer:
+                for package in dump.packages:
+                    writer.write_url(self.dump_url(package.name), md=package.md)
+            result = PublishResult(dump.file_count, dump.file_count, 0, 0, 0, rd_path, writer.sitemap_count())
+            report.count("packages", len(dump.packages))
+            self.__count_cache__(cache)
+            self.__count_result__(result, dump.bytes)
+        return result
+
+    def __write_change_dump_index__(self, cd_path, earlier_dumps, packages):
+        # changedump.xml lists the packages of all change dumps, the new ones last
+        entries = [(loc, list(md.items())) for loc, lastmod, md in earlier_dumps] + \
+                  [(self.dump_url(package.name), package.md) for package in packages]
+        first = entries[0][1]
+        with SitemapWriter(cd_path, "changedump", self.sitemap_base_url(),
+                           md=[(name, value) for name, value in first if name == "from"],
+                           gzip=self.config.cfg_gzip_sitemaps()) as writer:
+            for loc, md in entries:
+                writer.write_url(loc, md=md)
+
+    def zip_path(self):
+        # the zip is written next to the resync dir
+        return os.path.join(os.path.dirname(self.config.cfg_resync_dir()), RESOURCESYNC_ZIP)
+
+    def create_zip(self):
+        path = self.zip_path()
+        self.logger.debug("Creating zip file at %s", path)
+        with self.__reporting__("zip") as report:
+            filename_filter = FilenameFilter()
+            src = self.config.cfg_resync_dir()
+            abs_src = os.path.abspath(src)
+            entries = []
+            with report.span("walk"):
+                for dirname, subdirs, files in os.walk(src):
+                    if dirname == src:
+                        # dumps are published next to the zip, not in it
+                        subdirs[:] = [subdir for subdir in subdirs if subdir != DUMPS_DIR]
+                    for filename in files:
+                        # the zip has the sitemaps, not their gzipped variants
+                        if filename_filter.accept(filename) and not filename.endswith(".xml" + GZIP_SUFFIX):
+                            absname = os.path.abspath(os.path.join(dirname, filename))
+                            entries.append((absname, absname[len(abs_src) + 1:]))
+
+            self.progress.start(STAGE_ZIPPING, len(entries))
+            packager = ZipPackager(path, self.config.cfg_zip_workers(), self.progress)
+            with report.span("zip"):
+                packager.package(entries)
+            result = PublishResult(len(entries), 0, 0, 0, 0, path, 0)
+            report.count("zip_reused", packager.reused)
+            report.count("zip_compressed", packager.compressed)
+            self.__count_result__(result, os.path.getsize(path))
+        self.logger.debug("Ready creating zip file at %s", path)
+        return result
+
+
+def __change_dump_of__(loc):
+    # number of the change dump of the package at loc, 0 if it is not a change dump package
+    match = re.search(r"changedump-([0-9]{5})-[0-9]{5}\.zip$", loc)
+    return int(match.group(1)) if match else 0
+
+
+def change_dump_number(earlier_dumps):
+    # number of the next change dump, after those of the packages in earlier_dumps
+    return max((__change_dump_of__(loc) for loc, lastmod, md in earlier_dumps), default=0) + 1
+
+
+def expired_change_dumps(earlier_dumps, cutoff):
+    # the entries of earlier_dumps of change dumps that ended before cutoff, seconds since epoch. The packages
+    # of the last change dump are kept, its number is the one the next change dump continues from.
+    last = change_dump_number(earlier_dumps) - 1
+    return [(loc, lastmod, md) for loc, lastmod, md in earlier_dumps
+            if "until" in md and parse_w3c_datetime(md["until"]) < cutoff and __change_dump_of__(loc) != last]
+
+
+def md_hash(md, algorithm):
+    # the value for algorithm from the hash attribute of an rs:md element, e.g. "md5:... sha-256:..."
+    for value in md.get("hash", "").split():
+        name, sep, digest = value.partition(":")
+        if name == algorithm:
+            return digest
+    return None
+
+
+def normalize_md5(md5):
+    # md5 as hex digest; resync writes base64 encoded digests
+    if not md5 or len(md5) == 32:
+        return md5
+    try:
+        return base64.b64decode(md5).hex()
+    except binascii.Error:
+        return None
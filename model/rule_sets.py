@@ -0,0 +1,222 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import fnmatch, logging, os, re, time
+from collections import namedtuple
+
+from model.metadata import DEFAULT_WORKERS, iter_scan_directories
+from model.snapshot import CREATED, UPDATED, UNCHANGED, DELETED
+
+# Resource sets defined by rules. A set holds the files that match all of its rules; a rule can be negated
+# with 'not'. Rules are written one per line, paths are relative to the resource dir with '/' as separator:
+#
+#   glob *.pdf              name (or, if the pattern has a '/', relative path) matches the pattern
+#   regex ^letters/\d{4}    regular expression found in the relative path
+#   prefix letters/1900     file is in this directory, or under it
+#   size > 1M               size compared with a number of bytes, suffixes K, M and G
+#   modified < 30d          age of the last modification, suffixes s, m, h and d (default)
+#   not glob *.tmp
+#
+# A RuleEngine compiles the glob and prefix rules of all sets into one regular expression with a lookahead
+# per distinct rule, so one match per file tells which of them hold. Regex rules are compiled on their own,
+# so that their groups and backreferences keep their numbers. The sets are then decided from the path rules
+# and the size and modification time, and all sets are counted in a single traversal.
+#
+# Sets are stored in a text file, each set starting with its name in brackets followed by its rules.
+
+KIND_GLOB = "glob"
+KIND_REGEX = "regex"
+KIND_PREFIX = "prefix"
+KIND_SIZE = "size"
+KIND_MODIFIED = "modified"
+KINDS = [KIND_GLOB, KIND_REGEX, KIND_PREFIX, KIND_SIZE, KIND_MODIFIED]
+PATH_KINDS = [KIND_GLOB, KIND_REGEX, KIND_PREFIX]
+
+OPERATORS = {"<": lambda a, b: a < b, "<=": lambda a, b: a <= b, ">": lambda a, b: a > b,
+             ">=": lambda a, b: a >= b, "=": lambda a, b: a == b}
+SIZE_UNITS = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+TIME_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "": 86400}
+
+Rule = namedtuple("Rule", ["kind", "argument", "negate"])
+RuleSet = namedtuple("RuleSet", ["name", "rules"])
+SetCount = namedtuple("SetCount", ["name", "files", "bytes"])
+SetChanges = namedtuple("SetChanges", ["name", "files", "created", "updated", "unchanged", "deleted"])
+
+
+class RuleError(ValueError):
+    pass
+
+
+def parse_rule(line):
+    # a Rule from its text, RuleError if it is not valid
+    words = line.split(None, 1)
+    negate = bool(words) and words[0] == "not"
+    if negate:
+        words = words[1].split(None, 1) if len(words) > 1 else []
+    if len(words) != 2 or words[0] not in KINDS:
+        raise RuleError("Not a rule: %s" % line)
+    kind, argument = words[0], words[1].strip()
+    if kind == KIND_REGEX:
+        try:
+            re.compile(argument)
+        except re.error as err:
+            raise RuleError("Not a regular expression: %s (%s)" % (argument, err))
+    elif kind in (KIND_SIZE, KIND_MODIFIED):
+        __comparison__(kind, argument)
+    return Rule(kind, argument, negate)
+
+
+def __comparison__(kind, argument):
+    # (operator, value) of a size or modified argument like '> 1M'
+    match = re.match(r"^(<=|>=|<|>|=)\s*(\d+(?:\.\d+)?)\s*([A-Za-z]?)$", argument)
+    units = SIZE_UNITS if kind == KIND_SIZE else TIME_UNITS
+    unit = match.group(3) if match else ""
+    unit = unit.upper() if kind == KIND_SIZE else unit.lower()
+    if match is None or unit not in units:
+        raise RuleError("Not a comparison: %s %s" % (kind, argument))
+    return match.group(1), float(match.group(2)) * units[unit]
+
+
+def format_rule(rule):
+    return ("not " if rule.negate else "") + rule.kind + " " + rule.argument
+
+
+def parse_rule_sets(text):
+    # list of RuleSets from the text of a rule sets file
+    rule_sets = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            rule_sets.append(RuleSet(line[1:-1].strip(), []))
+        elif not rule_sets:
+            raise RuleError("Line %d: rule outside of a set" % number)
+        else:
+            try:
+                rule_sets[-1].rules.append(parse_rule(line))
+            except RuleError as err:
+                raise RuleError("Line %d: %s" % (number, err))
+    return rule_sets
+
+
+def format_rule_sets(rule_sets):
+    return "".join("[%s]\n%s\n" % (rule_set.name, "".join(format_rule(rule) + "\n" for rule in rule_set.rules))
+                   for rule_set in rule_sets)
+
+
+def load_rule_sets(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding="utf-8") as f:
+        return parse_rule_sets(f.read())
+
+
+def save_rule_sets(path, rule_sets):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(format_rule_sets(rule_sets))
+    os.replace(tmp_path, path)
+
+
+def __path_pattern__(rule):
+    # regular expression for a glob or prefix rule, matched at the start of the relative path
+    if rule.kind == KIND_GLOB:
+        pattern = fnmatch.translate(rule.argument)
+        # without a '/' the pattern is matched against the name only
+        return pattern if "/" in rule.argument else "(?:.*/)?(?=[^/]*\\Z)" + pattern
+    return re.escape(rule.argument.strip("/")) + "(?:/|\\Z)"
+
+
+class RuleEngine(object):
+
+    def __init__(self, rule_sets, now=None):
+        self.logger = logging.getLogger(__name__)
+        self.names = [rule_set.name for rule_set in rule_sets]
+        self.now = now if now is not None else time.time()
+        patterns = []           # distinct glob and prefix patterns, in order of first use
+        regexes = []            # distinct regex arguments, in order of first use
+        self.sets = []          # per set: list of (negate, path rule index) and list of (negate, kind, op, value)
+        for rule_set in rule_sets:
+            path_rules = []
+            stat_rules = []
+            for rule in rule_set.rules:
+                if rule.kind == KIND_REGEX:
+                    if rule.argument not in regexes:
+                        regexes.append(rule.argument)
+                    path_rules.append((rule.negate, True, regexes.index(rule.argument)))
+                elif rule.kind in PATH_KINDS:
+                    pattern = __path_pattern__(rule)
+                    if pattern not in patterns:
+                        patterns.append(pattern)
+                    path_rules.append((rule.negate, False, patterns.index(pattern)))
+                else:
+                    op, value = __comparison__(rule.kind, rule.argument)
+                    stat_rules.append((rule.negate, rule.kind, OPERATORS[op], value))
+            self.sets.append((path_rules, stat_rules))
+        # path rule index: the patterns first, then the regexes
+        for path_rules, stat_rules in self.sets:
+            path_rules[:] = [(negate, len(patterns) + i if is_regex else i) for negate, is_regex, i in path_rules]
+        self.group_names = ["r%d" % i for i in range(len(patterns))]
+        self.matcher = re.compile("".join("(?:(?=(?P<r%d>%s)))?" % (i, pattern) for i, pattern in enumerate(patterns)),
+                                  re.DOTALL) if patterns else None
+        try:
+            self.regexes = [re.compile(regex, re.DOTALL) for regex in regexes]
+        except re.error as err:
+            raise RuleError("Not a regular expression: %s" % err)
+
+    def __path_matches__(self, rel_path):
+        # per distinct path rule whether it matches rel_path
+        matches = []
+        if self.matcher is not None:
+            groups = self.matcher.match(rel_path).groupdict()
+            matches = [groups[name] is not None for name in self.group_names]
+        return matches + [regex.search(rel_path) is not None for regex in self.regexes]
+
+    def match(self, rel_path, size=0, mtime=0.0):
+        # indexes of the sets that hold the file; rel_path uses '/' as separator
+        path_matches = self.__path_matches__(rel_path)
+        age = self.now - mtime
+        matches = []
+        for index, (path_rules, stat_rules) in enumerate(self.sets):
+            if all(path_matches[i] != negate for negate, i in path_rules) and \
+                    all(op(size if kind == KIND_SIZE else age, value) != negate
+                        for negate, kind, op, value in stat_rules):
+                matches.append(index)
+        return matches
+
+    def count(self, root, filename_filter, workers=DEFAULT_WORKERS):
+        # SetCount per set of the files under root, in one traversal
+        files = [0] * len(self.sets)
+        sizes = [0] * len(self.sets)
+        for chunk in iter_scan_directories([root], filename_filter, workers):
+            for path, size, mtime in zip(chunk.paths, chunk.sizes, chunk.mtimes):
+                for index in self.match(relative_path(root, path), size, mtime):
+                    files[index] += 1
+                    sizes[index] += size
+        return [SetCount(name, files[i], sizes[i]) for i, name in enumerate(self.names)]
+
+
+def relative_path(root, path):
+    # path relative to root with '/' as separator
+    rel_path = path[len(root.rstrip(os.sep)) + 1:]
+    return rel_path.replace(os.sep, "/") if os.sep != "/" else rel_path
+
+
+class SetTally(object):
+    # changes per set of the records of a publish, as they stream by
+
+    def __init__(self, engine, root):
+        self.engine = engine
+        self.root = root
+        self.counts = [{CREATED: 0, UPDATED: 0, UNCHANGED: 0, DELETED: 0} for _ in engine.names]
+
+    def add(self, change, record):
+        # record: the current model.snapshot.SnapshotRecord, the previous one for deletions
+        for index in self.engine.match(relative_path(self.root, record.path), record.size, record.mtime):
+            self.counts[index][change] += 1
+
+    def results(self):
+        return [SetChanges(name, counts[CREATED] + counts[UPDATED] + counts[UNCHANGED], counts[CREATED],
+                           counts[UPDATED], counts[UNCHANGED], counts[DELETED])
+                for name, counts in zip(self.engine.names, self.counts)]
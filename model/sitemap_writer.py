@@ -0,0 +1,304 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import datetime, glob, gzip, os, shutil
+import xml.etree.ElementTree as ET
+from xml.sax.saxutils import escape, quoteattr
+
+# Streaming reading and writing of ResourceSync sitemaps. Urls are written to disk as they come in, so memory
+# use does not depend on the number of resources. When a sitemap reaches the limits of the sitemap protocol
+# the writer rolls over into numbered part files and writes a sitemapindex under the requested name.
+#
+#   resourcelist.xml                single sitemap, or sitemapindex pointing to
+#   resourcelist-00001.xml ...      part sitemaps
+#
+# With gzip, every sitemap is also written gzipped while it is written (resourcelist.xml.gz ...) and the
+# sitemapindex points to the gzipped parts. A sitemap that has the same urls as the one it would replace, and
+# so only differs in the rs:md of its urlset, e.g. in 'at', is not replaced: its mtime and ETag stay the same.
+
+SITEMAP_NS = "http://www.sitemaps.org/schemas/sitemap/0.9"
+RS_NS = "http://www.openarchives.org/rs/terms/"
+
+MAX_URLS = 50000
+MAX_BYTES = 50 * 1024 * 1024
+
+XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8'?>\n"
+URLSET_OPEN = '<urlset xmlns="%s" xmlns:rs="%s">' % (SITEMAP_NS, RS_NS)
+URLSET_CLOSE = "</urlset>\n"
+INDEX_OPEN = '<sitemapindex xmlns="%s" xmlns:rs="%s">' % (SITEMAP_NS, RS_NS)
+INDEX_CLOSE = "</sitemapindex>\n"
+
+GZIP_SUFFIX = ".gz"
+GZIP_LEVEL = 6
+BLOCK_SIZE = 1024 * 1024
+
+
+def w3c_datetime(timestamp):
+    # seconds since epoch as W3C datetime in UTC
+    dt = datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+    return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+def parse_w3c_datetime(value):
+    # W3C datetime as seconds since epoch
+    dt = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def md_element(attributes, tag="rs:md"):
+    # attributes: sequence of (name, value); attributes with value None are left out
+    attrs = "".join(" %s=%s" % (name, quoteattr(str(value))) for name, value in attributes if value is not None)
+    return "<%s%s />" % (tag, attrs)
+
+
+def url_element(loc, lastmod=None, md=()):
+    # loc: url of the resource, lastmod: seconds since epoch, md: (name, value) attributes of rs:md
+    entry = "<url><loc>%s</loc>" % escape(loc)
+    if lastmod is not None:
+        entry += "<lastmod>%s</lastmod>" % w3c_datetime(lastmod)
+    if md:
+        entry += md_element(md)
+    return entry + "</url>"
+
+
+def part_filenames(filename):
+    # existing part files of the sitemap filename
+    root, ext = os.path.splitext(filename)
+    return sorted(glob.glob(glob.escape(root) + "-[0-9][0-9][0-9][0-9][0-9]" + ext))
+
+
+def gzip_name(filename):
+    return filename + GZIP_SUFFIX
+
+
+class GzipWriter(gzip.GzipFile):
+    # gzip file for writing filename. No name or time in the header: equal content gives equal bytes.
+
+    def __init__(self, filename):
+        self.raw = open(filename, "wb")
+        super().__init__(filename="", mode="wb", compresslevel=GZIP_LEVEL, fileobj=self.raw, mtime=0)
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            self.raw.close()
+
+
+def gzip_file(filename):
+    # write filename.gz next to filename, in a streaming fashion
+    dirname, basename = os.path.split(gzip_name(filename))
+    tmp_name = os.path.join(dirname, "." + basename + ".tmp")
+    with open(filename, "rb") as f, GzipWriter(tmp_name) as gz:
+        shutil.copyfileobj(f, gz, BLOCK_SIZE)
+    os.replace(tmp_name, gzip_name(filename))
+
+
+def open_sitemap(filename):
+    # binary file object for reading the sitemap filename, decompressed if it is gzipped
+    return gzip.open(filename, "rb") if filename.endswith(GZIP_SUFFIX) else open(filename, "rb")
+
+
+def __body_offset__(f):
+    # offset just after the rs:md element of the urlset or sitemapindex in the sitemap file f, 0 if it has none
+    head = f.read(4096)
+    start = head.find(b"<rs:md")
+    end = head.find(b"/>", start)
+    return end + 2 if start >= 0 and end >= 0 else 0
+
+
+def same_urls(filename, other):
+    # True if the sitemaps filename and other only differ in the rs:md element of their urlset or sitemapindex
+    if not os.path.exists(other):
+        return False
+    with open(filename, "rb") as f, open(other, "rb") as g:
+        f_offset, g_offset = __body_offset__(f), __body_offset__(g)
+        if os.fstat(f.fileno()).st_size - f_offset != os.fstat(g.fileno()).st_size - g_offset:
+            return False
+        f.seek(f_offset)
+        g.seek(g_offset)
+        while True:
+            block = f.read(BLOCK_SIZE)
+            if block != g.read(BLOCK_SIZE):
+                return False
+            if not block:
+                return True
+
+
+def sitemap_filenames(filename):
+    # all files that make up the sitemap filename: the sitemap or index itself and its parts
+    files = [filename] if os.path.exists(filename) else []
+    return files + part_filenames(filename)
+
+
+class SitemapWriter(object):
+
+    def __init__(self, filename, capability, base_url, md=(), max_urls=MAX_URLS, max_bytes=MAX_BYTES, gzip=False):
+        # filename: path of the sitemap (or sitemapindex) to write
+        # base_url: url of the directory the sitemaps are published in, used in the sitemapindex
+        # md: additional (name, value) attributes of the rs:md element, e.g. ("at", ...)
+        # gzip: also write filename.gz etc., without it gzipped sitemaps of earlier runs are removed
+        self.filename = filename
+        self.capability = capability
+        self.base_url = base_url.rstrip("/") + "/"
+        self.md = [("capability", capability)] + list(md)
+        self.max_urls = max_urls
+        self.max_bytes = max_bytes
+        self.gzip = gzip
+        self.parts = []
+        self.f = None
+        self.gz = None
+        self.unchanged = 0      # sitemaps not replaced, because they have the same urls
+        self.url_count = 0
+        self.total_urls = 0
+        self.byte_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def __tmp_name__(self, filename):
+        dirname, basename = os.path.split(filename)
+        return os.path.join(dirname, "." + basename + ".tmp")
+
+    def __part_name__(self, number):
+        root, ext = os.path.splitext(self.filename)
+        return "%s-%05d%s" % (root, number, ext)
+
+    def __open__(self, filename):
+        self.f = open(self.__tmp_name__(filename), "wb")
+        if self.gzip:
+            self.gz = GzipWriter(self.__tmp_name__(gzip_name(filename)))
+
+    def __write__(self, data):
+        self.f.write(data)
+        if self.gz is not None:
+            self.gz.write(data)
+
+    def __close__(self):
+        self.f.close()
+        self.f = None
+        if self.gz is not None:
+            self.gz.close()
+            self.gz = None
+
+    def __open_part__(self):
+        self.parts.append(self.__part_name__(len(self.parts) + 1))
+        self.__open__(self.parts[-1])
+        header = (XML_DECLARATION + URLSET_OPEN + md_element(self.md)).encode("utf-8")
+        self.__write__(header)
+        self.url_count = 0
+        self.byte_count = len(header) + len(URLSET_CLOSE)
+
+    def __close_part__(self):
+        self.__write__(URLSET_CLOSE.encode("utf-8"))
+        self.__close__()
+
+    def write_url(self, loc, lastmod=None, md=()):
+        # loc: url of the resource, lastmod: seconds since epoch, md: (name, value) attributes of rs:md
+        entry = url_element(loc, lastmod, md).encode("utf-8")
+        size = len(entry)
+        if self.f is None:
+            self.__open_part__()
+        elif self.url_count >= self.max_urls or self.byte_count + size > self.max_bytes:
+            self.__close_part__()
+            self.__open_part__()
+        self.__write__(entry)
+        self.url_count += 1
+        self.total_urls += 1
+        self.byte_count += size
+
+    def close(self):
+        # move the written sitemaps in place and remove parts left over from a previous, larger sitemap
+        if self.f is None and not self.parts:
+            self.__open_part__()
+        if self.f is not None:
+            self.__close_part__()
+
+        stale = set(part_filenames(self.filename))
+        if len(self.parts) == 1:
+            self.__replace__(self.parts[0], self.filename)
+            self.parts = [self.filename]
+        else:
+            for part in self.parts:
+                self.__replace__(part, part)
+                stale.discard(part)
+            self.__write_index__()
+        for part in stale:
+            os.remove(part)
+            if os.path.exists(gzip_name(part)):
+                os.remove(gzip_name(part))
+
+    def __replace__(self, written, filename):
+        # move the sitemap written for written in place as filename, unless filename has the same urls
+        tmp_name = self.__tmp_name__(written)
+        tmp_gzip = self.__tmp_name__(gzip_name(written))
+        if same_urls(tmp_name, filename) and (not self.gzip or os.path.exists(gzip_name(filename))):
+            os.remove(tmp_name)
+            if self.gzip:
+                os.remove(tmp_gzip)
+            self.unchanged += 1
+        else:
+            os.replace(tmp_name, filename)
+            if self.gzip:
+                os.replace(tmp_gzip, gzip_name(filename))
+        if not self.gzip and os.path.exists(gzip_name(filename)):
+            os.remove(gzip_name(filename))
+
+    def discard(self):
+        if self.f is not None:
+            self.__close__()
+        for part in self.parts + [self.filename]:
+            for tmp_name in (self.__tmp_name__(part), self.__tmp_name__(gzip_name(part))):
+                if os.path.exists(tmp_name):
+                    os.remove(tmp_name)
+
+    def __write_index__(self):
+        self.__open__(self.filename)
+        self.__write__((XML_DECLARATION + INDEX_OPEN + md_element(self.md)).encode("utf-8"))
+        for part in self.parts:
+            name = gzip_name(os.path.basename(part)) if self.gzip else os.path.basename(part)
+            self.__write__(("<sitemap><loc>%s</loc></sitemap>" % escape(self.base_url + name)).encode("utf-8"))
+        self.__write__(INDEX_CLOSE.encode("utf-8"))
+        self.__close__()
+        self.__replace__(self.filename, self.filename)
+
+    def sitemap_count(self):
+        return len(self.parts)
+
+
+def iter_sitemap_urls(filename):
+    # yield (loc, lastmod, md) for each url in the sitemap filename, following a sitemapindex to its parts.
+    # lastmod is in seconds since epoch or None, md is a dict of the rs:md attributes.
+    if not os.path.exists(filename):
+        return
+    url_tag = "{%s}url" % SITEMAP_NS
+    sitemap_tag = "{%s}sitemap" % SITEMAP_NS
+    loc_tag = "{%s}loc" % SITEMAP_NS
+    lastmod_tag = "{%s}lastmod" % SITEMAP_NS
+    md_tag = "{%s}md" % RS_NS
+    dirname = os.path.dirname(filename)
+    root = None
+    with open_sitemap(filename) as f:
+        for event, elem in ET.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end":
+                continue
+            if elem.tag == url_tag:
+                lastmod = elem.findtext(lastmod_tag)
+                md = elem.find(md_tag)
+                yield (elem.findtext(loc_tag), parse_w3c_datetime(lastmod) if lastmod else None,
+                       dict(md.attrib) if md is not None else {})
+                root.clear()
+            elif elem.tag == sitemap_tag:
+                part = os.path.join(dirname, elem.findtext(loc_tag).rsplit("/", 1)[-1])
+                root.clear()
+                yield from iter_sitemap_urls(part)
@@ -0,0 +1,119 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, struct
+from collections import namedtuple
+
+# Compact binary snapshot of the last published state: records of (path, size, mtime, md5, digests), sorted
+# by path. digests holds the other published digests as in the hash attribute of rs:md, e.g. "sha-256:...".
+# Snapshots are written and read as streams, so comparing the current state with the previous one is
+# a merge-join that holds only one record of each side in memory.
+
+SNAPSHOT_FILE = ".resyto_snapshot.bin"
+
+MAGIC = b"RSSNAP2\n"
+HEADER = struct.Struct("<IH")           # length of the encoded path, length of the digests
+MAGIC_V1 = b"RSSNAP1\n"                 # snapshots without digests
+HEADER_V1 = struct.Struct("<I")
+BODY = struct.Struct("<qd16s")          # size, mtime, raw md5 (zeros if unknown)
+NO_MD5 = bytes(16)
+
+CREATED = "created"
+UPDATED = "updated"
+DELETED = "deleted"
+UNCHANGED = "unchanged"
+
+SnapshotRecord = namedtuple("SnapshotRecord", ["path", "size", "mtime", "md5", "digests"], defaults=[""])
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class SnapshotWriter(object):
+    # records must be written in ascending order of path. The snapshot replaces an existing one on close.
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.tmp_filename = filename + ".tmp"
+        self.f = open(self.tmp_filename, "wb")
+        self.f.write(MAGIC)
+        self.last_path = None
+        self.count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
+
+    def write(self, record):
+        if self.last_path is not None and record.path <= self.last_path:
+            raise SnapshotError("Records not in ascending order: %s after %s" % (record.path, self.last_path))
+        self.last_path = record.path
+        path = record.path.encode("utf-8", "surrogateescape")
+        md5 = bytes.fromhex(record.md5) if record.md5 else NO_MD5
+        digests = (record.digests or "").encode("ascii")
+        self.f.write(HEADER.pack(len(path), len(digests)))
+        self.f.write(path)
+        self.f.write(BODY.pack(record.size, record.mtime, md5))
+        self.f.write(digests)
+        self.count += 1
+
+    def close(self):
+        self.f.close()
+        os.replace(self.tmp_filename, self.filename)
+
+    def discard(self):
+        self.f.close()
+        os.remove(self.tmp_filename)
+
+
+def read_snapshot(filename):
+    # yield the SnapshotRecords in filename. A missing snapshot is empty.
+    if not os.path.exists(filename):
+        return
+    with open(filename, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic not in (MAGIC, MAGIC_V1):
+            raise SnapshotError("Not a snapshot file: %s" % filename)
+        header_struct = HEADER if magic == MAGIC else HEADER_V1
+        while True:
+            header = f.read(header_struct.size)
+            if not header:
+                break
+            lengths = header_struct.unpack(header)
+            path = f.read(lengths[0]).decode("utf-8", "surrogateescape")
+            size, mtime, md5 = BODY.unpack(f.read(BODY.size))
+            digests = f.read(lengths[1]).decode("ascii") if len(lengths) > 1 else ""
+            yield SnapshotRecord(path, size, mtime, md5.hex() if md5 != NO_MD5 else None, digests)
+
+
+def is_changed(previous, current):
+    if previous.md5 and current.md5:
+        return previous.md5 != current.md5
+    return previous.size != current.size or previous.mtime != current.mtime
+
+
+def changes(previous, current):
+    # previous, current: iterables of SnapshotRecords in ascending order of path.
+    # yield (change, previous record, current record) for every path in either; a record is None where
+    # the path is not in that iterable.
+    previous = iter(previous)
+    current = iter(current)
+    prev = next(previous, None)
+    curr = next(current, None)
+    while prev is not None or curr is not None:
+        if curr is None or (prev is not None and prev.path < curr.path):
+            yield DELETED, prev, None
+            prev = next(previous, None)
+        elif prev is None or curr.path < prev.path:
+            yield CREATED, None, curr
+            curr = next(current, None)
+        else:
+            yield (UPDATED if is_changed(prev, curr) else UNCHANGED), prev, curr
+            prev = next(previous, None)
+            curr = next(current, None)
@@ -0,0 +1,177 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bisect, datetime, json, logging, os
+
+from model.snapshot import read_snapshot, CREATED, UPDATED, DELETED
+
+# Aggregates of the published resources: files and bytes per directory, a size histogram and the number
+# of files per month of last modification. The aggregates are kept in the resync dir and updated by the
+# publisher with the changes of each publish, so showing them never walks the resource dir. They belong
+# to the snapshot they were computed for; if the snapshot changed in any other way they are rebuilt from
+# the snapshot.
+
+STATISTICS_FILE = ".resyto_statistics.json"
+FORMAT_VERSION = 1
+
+# upper bounds of the size buckets, the last bucket has no bound
+SIZE_BOUNDS = [1024 * 4 ** n for n in range(11)]        # 1 KB .. 1 GB
+# upper bounds in days of the age buckets
+AGE_BOUNDS = [30, 182, 365, 730, 1826]
+
+logger = logging.getLogger(__name__)
+
+
+def size_bucket(size):
+    return bisect.bisect_left(SIZE_BOUNDS, size)
+
+
+def month_key(mtime):
+    return datetime.datetime.fromtimestamp(mtime, datetime.timezone.utc).strftime("%Y-%m")
+
+
+class ResourceStatistics(object):
+
+    def __init__(self, resource_dir):
+        self.resource_dir = os.path.normpath(resource_dir)
+        self.token = None               # model.watcher.snapshot_token of the snapshot these belong to
+        self.files = 0
+        self.bytes = 0
+        self.directories = {}           # relative directory -> [files, bytes], including subdirectories
+        self.sizes = [[0, 0] for _ in range(len(SIZE_BOUNDS) + 1)]      # bucket -> [files, bytes]
+        self.months = {}                # "YYYY-MM" of mtime -> files
+        self.__prefix = len(self.resource_dir) + 1
+        # records come in order of path, so consecutive records mostly share directory and day
+        self.__last_dir = (None, [])
+        self.__days = {}
+
+    def __directories__(self, path):
+        # the directory of path relative to the resource dir, and all its parents up to ""
+        dirname = os.path.dirname(path)
+        if dirname == self.__last_dir[0]:
+            return self.__last_dir[1]
+        rel_dir = dirname[self.__prefix:] if dirname.startswith(self.resource_dir + os.sep) else ""
+        rel_dirs = [""]
+        start = 0
+        while rel_dir:
+            end = rel_dir.find(os.sep, start)
+            if end < 0:
+                rel_dirs.append(rel_dir)
+                break
+            rel_dirs.append(rel_dir[:end])
+            start = end + 1
+        self.__last_dir = (dirname, rel_dirs)
+        return rel_dirs
+
+    def __month__(self, mtime):
+        day = int(mtime // 86400)
+        month = self.__days.get(day)
+        if month is None:
+            month = self.__days[day] = month_key(day * 86400)
+        return month
+
+    def __update__(self, record, sign):
+        size = max(record.size, 0)
+        self.files += sign
+        self.bytes += sign * size
+        for rel_dir in self.__directories__(record.path):
+            counts = self.directories.setdefault(rel_dir, [0, 0])
+            counts[0] += sign
+            counts[1] += sign * size
+            if counts[0] == 0:
+                del self.directories[rel_dir]
+        bucket = self.sizes[size_bucket(size)]
+        bucket[0] += sign
+        bucket[1] += sign * size
+        month = self.__month__(record.mtime)
+        self.months[month] = self.months.get(month, 0) + sign
+        if self.months[month] == 0:
+            del self.months[month]
+
+    def add(self, record):
+        # record: a model.snapshot.SnapshotRecord
+        self.__update__(record, 1)
+
+    def remove(self, record):
+        self.__update__(record, -1)
+
+    def apply(self, change, previous, current):
+        # a change as yielded by model.snapshot.changes
+        if change in (UPDATED, DELETED):
+            self.remove(previous)
+        if change in (CREATED, UPDATED):
+            self.add(current)
+
+    def directory_rows(self, max_depth=2):
+        # (relative directory, files, bytes) of directories up to max_depth levels below the resource dir
+        return sorted((rel_dir, files, size) for rel_dir, (files, size) in self.directories.items()
+                      if rel_dir.count(os.sep) < max_depth)
+
+    def size_rows(self):
+        # (upper bound or None, files, bytes) per size bucket
+        bounds = SIZE_BOUNDS + [None]
+        return [(bounds[i], files, size) for i, (files, size) in enumerate(self.sizes)]
+
+    def age_rows(self, now=None):
+        # (upper bound in days or None, files) per age bucket, ages are counted in whole months
+        today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc) if now else \
+            datetime.datetime.now(datetime.timezone.utc)
+        counts = [0] * (len(AGE_BOUNDS) + 1)
+        for month, files in self.months.items():
+            year, mon = int(month[:4]), int(month[5:])
+            days = ((today.year - year) * 12 + today.month - mon) * 365 / 12
+            counts[bisect.bisect_left(AGE_BOUNDS, days)] += files
+        bounds = AGE_BOUNDS + [None]
+        return list(zip(bounds, counts))
+
+    def as_dict(self):
+        return {"version": FORMAT_VERSION, "resource_dir": self.resource_dir, "token": self.token,
+                "files": self.files, "bytes": self.bytes, "directories": self.directories, "sizes": self.sizes,
+                "months": self.months}
+
+    def save(self, directory):
+        tmp_path = os.path.join(directory, STATISTICS_FILE + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.as_dict(), f, separators=(",", ":"))
+        os.replace(tmp_path, os.path.join(directory, STATISTICS_FILE))
+
+    @staticmethod
+    def load(directory, resource_dir):
+        # the statistics saved in directory for resource_dir, None if there are none
+        path = os.path.join(directory, STATISTICS_FILE)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except ValueError as err:
+            logger.warning("Ignoring %s: %s", path, err)
+            return None
+        statistics = ResourceStatistics(resource_dir)
+        if data.get("version") != FORMAT_VERSION or data.get("resource_dir") != statistics.resource_dir:
+            return None
+        statistics.token = data["token"]
+        statistics.files = data["files"]
+        statistics.bytes = data["bytes"]
+        statistics.directories = data["directories"]
+        statistics.sizes = data["sizes"]
+        statistics.months = data["months"]
+        return statistics
+
+    @staticmethod
+    def from_records(resource_dir, records, token=None):
+        statistics = ResourceStatistics(resource_dir)
+        for record in records:
+            statistics.add(record)
+        statistics.token = token
+        return statistics
+
+
+def load_statistics(directory, resource_dir, snapshot_path, token):
+    # the statistics of the snapshot identified by token; rebuilt from the snapshot if the saved ones are
+    # missing or belong to another snapshot
+    statistics = ResourceStatistics.load(directory, resource_dir)
+    if statistics is None or statistics.token != token:
+        logger.info("Rebuilding resource statistics from %s", snapshot_path)
+        statistics = ResourceStatistics.from_records(resource_dir, read_snapshot(snapshot_path), token)
+    return statistics
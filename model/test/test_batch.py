@@ -0,0 +1,87 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, pickle, tempfile, unittest
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from unittest import mock
+
+from model import batch
+from model.batch import publish_batch, publish_profile
+from model.config import PROFILE_PREFIX, Profile
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.parser = ConfigParser()
+        self.parser.read_dict({"config": {"urlprefix": "http://example.com/",
+                                          "sourcedesc": "http://example.com/rs/sourcedescription.xml",
+                                          "rule_sets_file": os.path.join(self.tmp.name, "rule_sets.txt")}})
+        self.config_file = os.path.join(self.tmp.name, "rsync.cfg")
+        for name, count in (("one", 1), ("two", 3)):
+            resource_dir = os.path.join(self.tmp.name, name, "resources")
+            resync_dir = os.path.join(self.tmp.name, name, "rs")
+            os.makedirs(resource_dir)
+            os.makedirs(resync_dir)
+            for i in range(count):
+                with open(os.path.join(resource_dir, "%d.txt" % i), "w") as f:
+                    f.write(name)
+            self.parser.read_dict({PROFILE_PREFIX + name: {"resource_dir": resource_dir, "resync_dir": resync_dir,
+                                                           "urlprefix": "http://example.com/%s/" % name}})
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test01_profile(self):
+        profile = Profile("two", self.parser, self.config_file)
+        assert profile.cfg_resource_dir() == os.path.join(self.tmp.name, "two", "resources")
+        assert profile.cfg_urlprefix() == "http://example.com/two/"
+        assert profile.cfg_sourcedesc() == "http://example.com/rs/sourcedescription.xml"
+        copy = pickle.loads(pickle.dumps(profile))
+        assert copy.cfg_resync_dir() == profile.cfg_resync_dir()
+        self.assertRaises(TypeError, profile.persist)
+
+    def test02_publish_batch(self):
+        profiles = [Profile(name, self.parser, self.config_file) for name in ("two", "one")]
+        self.parser.set(PROFILE_PREFIX + "one", "resync_dir", os.path.join(self.tmp.name, "missing", "rs"))
+        profiles.append(Profile("one", self.parser, self.config_file))
+        seen = []
+        results = publish_batch(profiles[:2], ["resourcelist", "zip"], processes=2, io_workers=2,
+                                listener=lambda result: seen.append(result.profile))
+        assert [result.profile for result in results] == ["two", "one"]
+        assert sorted(seen) == ["one", "two"]
+        assert [result.error for result in results] == [None, None]
+        assert [(task, result.file_count) for task, result in results[0].results][0] == ("resourcelist", 3)
+        assert os.path.exists(os.path.join(self.tmp.name, "one", "resourcesync.zip"))
+
+        # a failing profile does not stop the others
+        results = publish_batch(profiles[::2], ["changelist"], processes=1)
+        assert results[0].error is None and results[0].results[0][1].unchanged_count == 3
+        assert results[1].error is not None and results[1].results == []
+
+    def test03_shared_outputs(self):
+        os.makedirs(os.path.join(self.tmp.name, "two", "other"))
+        self.parser.set(PROFILE_PREFIX + "one", "resync_dir", os.path.join(self.tmp.name, "two", "other"))
+        profiles = [Profile(name, self.parser, self.config_file) for name in ("one", "two")]
+        assert [result.error for result in publish_batch(profiles, ["resourcelist"], processes=1)] == [None, None]
+        # both zips would be written into the directory 'two'
+        self.assertRaises(ValueError, publish_batch, profiles, ["resourcelist", "zip"])
+
+    def test04_io_workers(self):
+        profile = Profile("two", self.parser, self.config_file)
+        assert publish_profile(profile, ["resourcelist"], 3).error is None
+        assert (profile.cfg_hash_workers(), profile.cfg_zip_workers()) == (3, 3)
+        # no more processes than io workers
+        pools = []
+
+        def pool(max_workers):
+            pools.append(max_workers)
+            return ThreadPoolExecutor(max_workers)
+
+        profiles = [Profile(name, self.parser, self.config_file) for name in ("one", "two")]
+        with mock.patch.object(batch, "ProcessPoolExecutor", pool):
+            results = publish_batch(profiles, ["resourcelist"], processes=2, io_workers=1)
+        assert pools == [1]
+        assert [result.error for result in results] == [None, None]
@@ -0,0 +1,138 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip, os, tempfile, unittest
+import xml.etree.ElementTree as ET
+
+from model.changelists import ChangelistWriter
+from model.sitemap_writer import SitemapWriter, iter_sitemap_urls, RS_NS, SITEMAP_NS
+
+BASE_URL = "http://example.com/rs/"
+T0 = 1500000000
+
+
+class TestChangelists(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "changelist.xml")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def publish(self, names, since, now, **kwargs):
+        with ChangelistWriter(self.filename, BASE_URL, since, now=now, **kwargs) as writer:
+            for name in names:
+                writer.write_url("http://example.com/" + name, now, [("change", "created")])
+        return writer
+
+    def locs(self):
+        return [loc.rsplit("/", 1)[1] for loc, lastmod, md in iter_sitemap_urls(self.filename)]
+
+    def test01_append(self):
+        self.publish(["a", "b"], T0, T0 + 10)
+        with open(self.filename, "rb") as f:
+            first = f.read()
+        writer = self.publish(["c"], T0 + 10, T0 + 20)
+        with open(self.filename, "rb") as f:
+            second = f.read()
+        # the entries of the first publish are not rewritten
+        assert second.startswith(first[:-len(b"</urlset>\n")])
+        assert self.locs() == ["a", "b", "c"]
+        assert writer.sitemap_count() == 1
+        md = ET.parse(self.filename).getroot().find("{%s}md" % RS_NS).attrib
+        assert md == {"capability": "changelist", "from": "2017-07-14T02:40:00Z"}
+
+        # nothing new leaves the file alone
+        self.publish([], T0 + 20, T0 + 30)
+        with open(self.filename, "rb") as f:
+            assert f.read() == second
+
+    def test02_roll_by_count(self):
+        self.publish(["a", "b", "c"], T0, T0 + 10, max_urls=2)
+        writer = self.publish(["d", "e"], T0 + 10, T0 + 20, max_urls=2)
+        assert writer.sitemap_count() == 3
+        assert self.locs() == ["a", "b", "c", "d", "e"]
+        root = ET.parse(self.filename).getroot()
+        assert root.tag == "{%s}sitemapindex" % SITEMAP_NS
+        locs = [sitemap.findtext("{%s}loc" % SITEMAP_NS) for sitemap in root.iter("{%s}sitemap" % SITEMAP_NS)]
+        assert locs == [BASE_URL + name for name in ["changelist-archive-00001.xml", "changelist-archive-00002.xml",
+                                                     "changelist-current.xml"]]
+        archive = ET.parse(os.path.join(self.tmpdir.name, "changelist-archive-00002.xml")).getroot()
+        assert archive.find("{%s}md" % RS_NS).get("until") == "2017-07-14T02:40:20Z"
+
+    def test03_roll_by_time(self):
+        self.publish(["a"], T0, T0 + 10, window=100)
+        self.publish(["b"], T0 + 10, T0 + 50, window=100)
+        assert not os.path.exists(os.path.join(self.tmpdir.name, "changelist-archive-00001.xml"))
+        writer = self.publish(["c"], T0 + 150, T0 + 200, window=100)
+        assert writer.sitemap_count() == 2
+        # the archive ends at the previous publish, where the changes of this one start
+        archive = ET.parse(os.path.join(self.tmpdir.name, "changelist-archive-00001.xml")).getroot()
+        assert archive.find("{%s}md" % RS_NS).attrib["until"] == "2017-07-14T02:42:30Z"
+        assert self.locs() == ["a", "b", "c"]
+
+    def test04_discard(self):
+        self.publish(["a"], T0, T0 + 10)
+        with open(self.filename, "rb") as f:
+            first = f.read()
+        try:
+            with ChangelistWriter(self.filename, BASE_URL, T0 + 10, max_urls=1, now=T0 + 20) as writer:
+                writer.write_url("http://example.com/b")
+                raise RuntimeError()
+        except RuntimeError:
+            pass
+        assert sorted(os.listdir(self.tmpdir.name)) == [".resyto_changelists.json", "changelist.xml"]
+        assert self.locs() == ["a"]
+        with open(self.filename, "rb") as f:
+            assert f.read() == first
+
+        # an append that did not complete is cut off
+        with open(self.filename, "ab") as f:
+            f.write(b"<url><loc>http://exa")
+        self.publish(["c"], T0 + 20, T0 + 30)
+        assert self.locs() == ["a", "c"]
+
+    def test05_take_over(self):
+        with SitemapWriter(self.filename, "changelist", BASE_URL, max_urls=2) as writer:
+            for name in ["a", "b", "c"]:
+                writer.write_url("http://example.com/" + name, T0 - 100)
+        self.publish(["d"], T0, T0 + 10)
+        assert self.locs() == ["a", "b", "c", "d"]
+        assert sorted(os.listdir(self.tmpdir.name)) == [".resyto_changelists.json", "changelist.xml"]
+        md = ET.parse(self.filename).getroot().find("{%s}md" % RS_NS).attrib
+        assert md["from"] == "2017-07-14T02:38:20Z"
+
+    def test06_gzip(self):
+        self.publish(["a", "b"], T0, T0 + 10, max_urls=2)
+        self.publish(["c"], T0 + 10, T0 + 20, max_urls=2, gzip=True)
+        names = sorted(os.listdir(self.tmpdir.name))
+        assert names == [".resyto_changelists.json", "changelist-archive-00001.xml", "changelist-archive-00001.xml.gz",
+                         "changelist-current.xml", "changelist-current.xml.gz", "changelist.xml", "changelist.xml.gz"]
+        with open(self.filename) as f:
+            assert BASE_URL + "changelist-current.xml.gz" in f.read()
+        assert self.locs() == ["a", "b", "c"]
+
+        # appended entries are in the gzipped changelist as well
+        self.publish(["d"], T0 + 20, T0 + 30, max_urls=2, gzip=True)
+        current = os.path.join(self.tmpdir.name, "changelist-current.xml")
+        with gzip.open(current + ".gz", "rb") as f, open(current, "rb") as g:
+            assert f.read() == g.read()
+
+        self.publish([], T0 + 30, T0 + 40, max_urls=2)
+        assert not any(name.endswith(".gz") for name in os.listdir(self.tmpdir.name))
+        with open(self.filename) as f:
+            assert BASE_URL + "changelist-current.xml<" in f.read()
+
+    def test07_lastmod_after_roll(self):
+        with ChangelistWriter(self.filename, BASE_URL, T0, max_urls=2, now=T0 + 10) as writer:
+            for name in ["a", "b", "c"]:
+                writer.write_url("http://example.com/" + name, T0 + 5, [("change", "updated")])
+            writer.write_url("http://example.com/d", T0 - 5, [("change", "created")])
+        archive = os.path.join(self.tmpdir.name, "changelist-archive-00001.xml")
+        assert [lastmod for loc, lastmod, md in iter_sitemap_urls(archive)] == [T0 + 5, T0 + 5]
+        # the changelist started by the roll over is from T0 + 10
+        current = os.path.join(self.tmpdir.name, "changelist-current.xml")
+        md = ET.parse(current).getroot().find("{%s}md" % RS_NS).attrib
+        assert md["from"] == "2017-07-14T02:40:10Z"
+        assert [lastmod for loc, lastmod, md in iter_sitemap_urls(current)] == [T0 + 10, T0 + 10]
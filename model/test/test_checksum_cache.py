@@ -0,0 +1,88 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib, os, tempfile, unittest
+from model.checksum_cache import ChecksumCache, CHECKSUM_DB
+from model.hashing import Hasher
+
+
+def md5(cache, path):
+    return cache.digests_all([path])[0][0]
+
+
+class TestChecksumCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "resource.txt")
+        with open(self.path, "wb") as f:
+            f.write(b"first version")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test01_md5(self):
+        with ChecksumCache(self.tmpdir.name) as cache:
+            assert md5(cache, self.path) == hashlib.md5(b"first version").hexdigest()
+            assert cache.misses == 1
+            md5(cache, self.path)
+            assert cache.hits == 1
+        assert os.path.exists(os.path.join(self.tmpdir.name, CHECKSUM_DB))
+
+    def test02_persistent(self):
+        with ChecksumCache(self.tmpdir.name) as cache:
+            md5(cache, self.path)
+
+        with ChecksumCache(self.tmpdir.name) as cache:
+            md5(cache, self.path)
+            assert cache.hits == 1
+            assert cache.misses == 0
+
+    def test03_changed_file(self):
+        with ChecksumCache(self.tmpdir.name) as cache:
+            md5(cache, self.path)
+
+        with open(self.path, "wb") as f:
+            f.write(b"second, longer version")
+
+        with ChecksumCache(self.tmpdir.name) as cache:
+            assert md5(cache, self.path) == hashlib.md5(b"second, longer version").hexdigest()
+            assert cache.misses == 1
+
+    def test04_digests_all(self):
+        other = os.path.join(self.tmpdir.name, "other.txt")
+        with open(other, "wb") as f:
+            f.write(b"other")
+
+        with ChecksumCache(self.tmpdir.name) as cache:
+            md5(cache, self.path)
+            checksums = [md5 for md5, digests in cache.digests_all([other, self.path], Hasher(workers=2))]
+            assert checksums == [hashlib.md5(b"other").hexdigest(), hashlib.md5(b"first version").hexdigest()]
+            assert cache.hits == 1
+            assert cache.misses == 2
+
+    def test05_digests(self):
+        with ChecksumCache(self.tmpdir.name) as cache:
+            md5(cache, self.path)
+        # an extra algorithm is a miss for files hashed without it
+        with ChecksumCache(self.tmpdir.name, algorithms=["sha-256", "md5"]) as cache:
+            checksums = cache.digests_all([self.path])
+            assert checksums == [(hashlib.md5(b"first version").hexdigest(),
+                                  "sha-256:" + hashlib.sha256(b"first version").hexdigest())]
+            assert cache.misses == 1
+            assert cache.digests_all([self.path]) == checksums and cache.hits == 1
+        self.assertRaises(ValueError, ChecksumCache, self.tmpdir.name, algorithms=["crc32"])
+
+    def test06_precheck(self):
+        with ChecksumCache(self.tmpdir.name, precheck=True) as cache:
+            md5(cache, self.path)
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        with ChecksumCache(self.tmpdir.name, precheck=True) as cache:
+            assert md5(cache, self.path) == hashlib.md5(b"first version").hexdigest()
+            assert (cache.hits, cache.prechecked, cache.misses) == (1, 1, 0)
+        with open(self.path, "wb") as f:
+            f.write(b"first versioN")
+        with ChecksumCache(self.tmpdir.name, precheck=True) as cache:
+            assert md5(cache, self.path) == hashlib.md5(b"first versioN").hexdigest()
+            assert cache.misses == 1
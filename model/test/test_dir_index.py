@@ -0,0 +1,94 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, unittest
+from model.dir_index import DirectoryIndex, SelectionRules
+from model.metadata import iter_path_records
+from model.publisher import FilenameFilter
+
+
+class TestDirectoryIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.root = self.tmpdir.name
+        for rel_path in ["a/1.txt", "a/2.txt", "a/b/3.txt", "a/b/c/4.txt", "d/5.txt", "6.txt", "a/.hidden"]:
+            self.touch(rel_path)
+        self.index = DirectoryIndex(self.root, FilenameFilter())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def path(self, rel_path):
+        return os.path.join(self.root, *rel_path.split("/"))
+
+    def touch(self, rel_path):
+        path = self.path(rel_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(rel_path)
+
+    def test01_counts(self):
+        assert self.index.count(self.root) == 6
+        assert self.index.count(self.path("a")) == 4
+        assert self.index.count(self.path("a/b/3.txt")) == 1
+        assert self.index.count(self.path("a/.hidden")) == 0
+        assert self.index.count(self.path("x")) == 0
+
+    def test02_refresh(self):
+        self.touch("a/b/7.txt")
+        self.touch("a/e/f/8.txt")
+        self.index.refresh(self.path("a/b"))
+        assert self.index.count(self.root) == 7
+        self.index.refresh(self.path("a/e/f"))
+        assert self.index.count(self.path("a")) == 6
+        assert self.index.count(self.root) == 8
+
+    def test03_selection(self):
+        rules = SelectionRules(self.index)
+        rules.include(self.path("a"))
+        assert rules.count() == 4
+        rules.exclude(self.path("a/b"))
+        assert rules.count() == 2
+        rules.include(self.path("a/b/c"))
+        rules.include(self.path("6.txt"))
+        assert rules.count() == 4
+        files = [record.path for record in iter_path_records(rules.rules, FilenameFilter())]
+        assert sorted(files) == sorted([self.path("a/1.txt"), self.path("a/2.txt"),
+                                        self.path("a/b/c/4.txt"), self.path("6.txt")])
+        # deselecting a folder overrides earlier choices below it
+        rules.exclude(self.path("a"))
+        assert rules.count() == 1
+        rules.include(self.root)
+        assert rules.count() == 6
+        assert len(rules.rules) == 1
+        rules.clear()
+        assert rules.count() == 0
+        assert list(iter_path_records(rules.rules, FilenameFilter())) == []
+
+    def test04_refresh_removed(self):
+        os.remove(self.path("a/1.txt"))
+        os.remove(self.path("a/b/c/4.txt"))
+        os.rmdir(self.path("a/b/c"))
+        self.index.refresh(self.path("a/b"))
+        self.index.refresh(self.path("a"))
+        assert self.index.count(self.path("a")) == 2
+        assert self.index.count(self.root) == 4
+
+    def test05_selection_refresh(self):
+        rules = SelectionRules()
+        rules.include(self.path("a"))
+        rules.exclude(self.path("a/b/c"))
+        assert rules.count() is None
+        rules.set_index(self.index)
+        assert rules.count() == 3
+        self.touch("a/b/7.txt")
+        self.touch("a/b/c/8.txt")
+        self.touch("a/e/f/9.txt")
+        self.touch("d/10.txt")
+        for rel_path in ["a/b", "a/b/c", "a/e/f", "d"]:
+            rules.refresh(self.path(rel_path))
+        assert rules.count() == 5
+        assert rules.count() == len(list(iter_path_records(rules.rules, FilenameFilter())))
+        rules.include(self.root)
+        assert rules.count() == 10
@@ -0,0 +1,49 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib, os, tempfile, unittest
+from model.hashing import compute_md5, compute_digests, quick_signature, Hasher, EXECUTOR_PROCESS
+
+
+def md5s(hasher, paths):
+    return [digests[0] for digests, quick in hasher.digests_iter(paths)]
+
+
+class TestHashing(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.paths = []
+        self.expected = []
+        for i in range(10):
+            content = ("resource %d " % i).encode() * (i * 1000 + 1)
+            path = os.path.join(self.tmpdir.name, "file%d.txt" % i)
+            with open(path, "wb") as f:
+                f.write(content)
+            self.paths.append(path)
+            self.expected.append(hashlib.md5(content).hexdigest())
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test01_compute_md5(self):
+        assert compute_md5(self.paths[3]) == self.expected[3]
+        # small block size and mmap threshold
+        assert compute_md5(self.paths[9], block_size=1000, mmap_threshold=100) == self.expected[9]
+
+    def test02_threads_keep_order(self):
+        assert md5s(Hasher(workers=4), self.paths) == self.expected
+
+    def test03_processes_keep_order(self):
+        assert md5s(Hasher(workers=2, executor=EXECUTOR_PROCESS), self.paths) == self.expected
+
+    def test04_digests_in_one_read(self):
+        content = open(self.paths[9], "rb").read()
+        digests, quick = compute_digests(self.paths[9], ["md5", "sha-256"], quick=True, block_size=1000,
+                                         mmap_threshold=100)
+        assert digests == [hashlib.md5(content).hexdigest(), hashlib.sha256(content).hexdigest()]
+        # the signature of the stream is that of the head and tail read separately
+        assert quick == quick_signature(self.paths[9])
+        assert compute_digests(self.paths[0], quick=True)[1] == quick_signature(self.paths[0])
+        results = list(Hasher(workers=2, executor=EXECUTOR_PROCESS).digests_iter(self.paths, ["md5", "sha-1"]))
+        assert [digests[0] for digests, quick in results] == self.expected
@@ -0,0 +1,40 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, tempfile, time, unittest
+
+from model.instrumentation import RunReport, RUN_REPORT, read_history
+
+
+class TestRunReport(unittest.TestCase):
+
+    def test01_spans(self):
+        report = RunReport("test")
+        with report.span("write"):
+            for _ in range(2):
+                with report.span("hash"):
+                    time.sleep(0.01)
+        count, seconds, own = report.spans["hash"]
+        assert count == 2 and seconds >= 0.02 and own == seconds
+        count, seconds, own = report.spans["write"]
+        assert count == 1
+        self.assertAlmostEqual(own, seconds - report.spans["hash"][1], places=6)
+
+    def test02_counters(self):
+        report = RunReport("test")
+        report.count("files", 3)
+        report.count("files")
+        report.count("cache_hits", 3)
+        report.count("cache_misses", 1)
+        result = report.finish().as_dict()
+        assert result["counters"]["files"] == 4
+        assert result["cache_hit_rate"] == 0.75
+        assert result["bytes_hashed_per_second"] is None
+
+    def test03_write(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            RunReport("one").finish().write(tmp)
+            RunReport("two").finish().write(tmp)
+            with open(os.path.join(tmp, RUN_REPORT)) as f:
+                assert json.load(f)["task"] == "two"
+            assert [report["task"] for report in read_history(tmp)] == ["one", "two"]
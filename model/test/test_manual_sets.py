@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, unittest
+
+from model.dir_index import DirectoryIndex, SelectionRules
+from model.manual_sets import ManualSet, ManualSetError, encode_rules, decode_rules, iter_set_files, \
+    load_manual_sets, save_manual_sets, parse_manual_sets
+from model.publisher import FilenameFilter
+
+
+class TestManualSets(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.tmp.name, "res")
+        for rel_path in ["a.txt", "d/b.txt", "d/e/c.txt", "d/e/f.txt", "d/g/h.txt", "x/y.txt", "x/.hidden"]:
+            path = os.path.join(self.root, *rel_path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(rel_path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def path(self, rel_path):
+        return os.path.join(self.root, *rel_path.split("/")) if rel_path else self.root
+
+    def rules(self, **kwargs):
+        return {self.path(rel_path): include for rel_path, include in kwargs.items()}
+
+    def test01_encode_decode(self):
+        rules = {self.path("d"): True, self.path("d/e"): False, self.path("d/e/c.txt"): True,
+                 self.path("x"): True, self.root: False}
+        lines = encode_rules(self.root, rules)
+        assert lines == ["- 0 ", "+ 0 d", "- 1 e", "+ 2 c.txt", "+ 0 x"]
+        assert decode_rules(self.root, lines) == rules
+        self.assertRaises(ManualSetError, decode_rules, self.root, ["* 0 d"])
+
+    def test02_save_load(self):
+        manual_sets = [ManualSet("one", self.root, {self.path("d"): True, self.path("d/e"): False}),
+                       ManualSet("two", self.root, {})]
+        path = os.path.join(self.tmp.name, "sets.txt")
+        assert load_manual_sets(path) == []
+        save_manual_sets(path, manual_sets)
+        assert load_manual_sets(path) == manual_sets
+        self.assertRaises(ManualSetError, parse_manual_sets, "[a]\n+ 0 d\n")
+
+    def test03_iter_set_files(self):
+        rules = {self.path("d"): True, self.path("d/e"): False, self.path("d/e/c.txt"): True,
+                 self.path("x"): True}
+        files = list(iter_set_files(ManualSet("s", self.root, rules), FilenameFilter()))
+        assert files == [self.path(p) for p in ["d/b.txt", "d/e/c.txt", "d/g/h.txt", "x/y.txt"]]
+
+        # the same number of files as a selection on the index
+        selection = SelectionRules(DirectoryIndex(self.root, FilenameFilter()))
+        selection.set_rules(rules)
+        assert selection.count() == len(files)
+
+    def test04_excluded_root(self):
+        rules = {self.root: True, self.path("d"): False, self.path("d/g/h.txt"): True}
+        files = list(iter_set_files(ManualSet("s", self.root, rules), FilenameFilter()))
+        assert files == [self.path(p) for p in ["a.txt", "d/g/h.txt", "x/y.txt"]]
@@ -0,0 +1,69 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, unittest
+from model.metadata import FileMetadata, collect_record_metadata, iter_path_records, scan_directories, \
+    COL_PATH, COL_NAME, COL_SIZE, COL_MTIME
+from model.publisher import FilenameFilter
+
+
+class TestMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.files = []
+        for rel_path in ["a/1.txt", "a/b/22.txt", "c/333.txt", "c/.hidden"]:
+            path = os.path.join(self.tmpdir.name, *rel_path.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(os.path.basename(path))
+            self.files.append(path)
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test01_collect_record_metadata(self):
+        metadata = collect_record_metadata(iter_path_records({self.tmpdir.name: True}, FilenameFilter()))
+        assert len(metadata) == 3
+        rows = sorted(metadata)
+        assert rows[0][0] == self.files[0]
+        assert rows[0][1] == "1.txt"
+        assert rows[0][2] == 5
+        assert rows[0][3] == os.path.getmtime(self.files[0])
+        assert metadata.total_size() == 5 + 6 + 7
+
+    def test02_scan_directories(self):
+        metadata = scan_directories([self.tmpdir.name], FilenameFilter(), workers=3)
+        assert sorted(metadata.paths) == sorted(self.files[:3])
+
+    def test03_sort_order(self):
+        metadata = FileMetadata()
+        metadata.append("/b/x", 30, 2.0)
+        metadata.append("/a/z", 10, 3.0)
+        metadata.append("/c/y", 20, 1.0)
+
+        assert list(metadata.sort_order(COL_PATH)) == [1, 0, 2]
+        assert list(metadata.sort_order(COL_NAME)) == [0, 2, 1]
+        assert list(metadata.sort_order(COL_SIZE)) == [1, 2, 0]
+        descending = metadata.sort_order(COL_MTIME, descending=True)
+        assert [descending[row] for row in range(len(descending))] == [1, 0, 2]
+        # orders are cached per column, descending reads the same order backwards
+        assert metadata.sort_order(COL_MTIME).indexes is descending.indexes
+
+        metadata.append("/a/a", 0, 0.0)
+        assert list(metadata.sort_order(COL_SIZE)) == [3, 1, 2, 0]
+
+    def test04_iter_path_records(self):
+        # 'a-z' sorts before the files under 'a/'
+        extra = os.path.join(self.tmpdir.name, "a-z.txt")
+        with open(extra, "w") as f:
+            f.write("a-z")
+        records = list(iter_path_records({self.tmpdir.name: True}, FilenameFilter()))
+        paths = [record.path for record in records]
+        assert paths == sorted(self.files[:3] + [extra])
+        assert collect_record_metadata(records).sizes[paths.index(extra)] == 3
+
+        # excluded folder with an included file below it
+        rules = {os.path.join(self.tmpdir.name, "a"): True, os.path.join(self.tmpdir.name, "a", "b"): False,
+                 self.files[1]: True, self.files[2]: True}
+        assert [record.path for record in iter_path_records(rules, FilenameFilter())] == self.files[:3]
@@ -0,0 +1,83 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, time, unittest, zipfile
+from unittest import mock
+from model import packaging
+from model.packaging import ZipPackager
+from model.progress import Progress, PublishCancelled
+
+
+class TestPackaging(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.zip_path = os.path.join(self.tmpdir.name, "resourcesync.zip")
+        self.entries = []
+        for name, content in [("resourcelist.xml", b"<urlset>" * 1000), ("sub/changelist.xml", b"<url/>" * 10),
+                              ("data.gz", os.urandom(2000)), ("empty.xml", b"")]:
+            path = os.path.join(self.tmpdir.name, "src", *name.split("/"))
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(content)
+            self.entries.append((path, name))
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def verify(self):
+        with zipfile.ZipFile(self.zip_path) as zf:
+            assert zf.testzip() is None
+            for path, arcname in self.entries:
+                with open(path, "rb") as f:
+                    assert zf.read(arcname) == f.read()
+            return {info.filename: info for info in zf.infolist()}
+
+    def test01_package(self):
+        packager = ZipPackager(self.zip_path, workers=2)
+        assert packager.package(self.entries) == 4
+        infos = self.verify()
+        assert infos["resourcelist.xml"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["resourcelist.xml"].compress_size < infos["resourcelist.xml"].file_size
+        assert infos["data.gz"].compress_type == zipfile.ZIP_STORED
+        assert packager.compressed == 4
+        assert sorted(os.listdir(self.tmpdir.name)) == ["resourcesync.zip", "src"]
+
+    def test02_incremental(self):
+        ZipPackager(self.zip_path, workers=2).package(self.entries)
+
+        path = self.entries[1][0]
+        with open(path, "wb") as f:
+            f.write(b"<url/>" * 20)
+        later = time.time() + 10
+        os.utime(path, (later, later))
+        self.entries.append((self.entries[0][0], "copy/resourcelist.xml"))
+
+        packager = ZipPackager(self.zip_path, workers=2)
+        packager.package(self.entries)
+        assert packager.reused == 3
+        assert packager.compressed == 2
+        self.verify()
+
+    def test03_cancel_keeps_previous(self):
+        ZipPackager(self.zip_path).package(self.entries)
+        progress = Progress()
+        progress.cancel()
+        with self.assertRaises(PublishCancelled):
+            ZipPackager(self.zip_path, progress=progress).package(self.entries[:1])
+        assert len(self.verify()) == 4
+        assert not os.path.exists(os.path.join(self.tmpdir.name, ".resourcesync.zip.tmp"))
+
+    def test04_streamed_and_spilled(self):
+        # a single worker compresses into the archive, a pool spills files of SPILL_SIZE and more
+        packager = ZipPackager(self.zip_path, workers=1)
+        packager.package(self.entries)
+        assert packager.compressed == 4
+        streamed = self.verify()
+        os.remove(self.zip_path)
+        with mock.patch.object(packaging, "SPILL_SIZE", 100):
+            ZipPackager(self.zip_path, workers=2).package(self.entries)
+        spilled = self.verify()
+        assert [(info.CRC, info.compress_size) for info in streamed.values()] == \
+               [(info.CRC, info.compress_size) for info in spilled.values()]
+        assert sorted(os.listdir(self.tmpdir.name)) == ["resourcesync.zip", "src"]
@@ -0,0 +1,28 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import unittest
+from model.progress import Progress, PublishCancelled
+
+
+class TestProgress(unittest.TestCase):
+
+    def test01_counters(self):
+        notified = []
+        progress = Progress(listener=notified.append, interval=0)
+        progress.start("hashing", total_files=4)
+        progress.file_scanned(100, hashed=True)
+        progress.file_scanned(50)
+
+        assert progress.files_scanned == 2
+        assert progress.bytes_hashed == 100
+        assert progress.percentage() == 50
+        assert progress.eta() is not None
+        assert len(notified) == 4
+
+    def test02_cancel(self):
+        progress = Progress()
+        progress.check_cancelled()
+        progress.cancel()
+        assert progress.is_cancelled()
+        self.assertRaises(PublishCancelled, progress.check_cancelled)
@@ -0,0 +1,244 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib, os, tempfile, unittest, zipfile
+from unittest import mock
+
+from model.changelists import ChangelistWriter
+from model.instrumentation import read_history
+from model.progress import Progress
+from model.publisher import Publisher, iter_walk_records
+from model.rule_sets import parse_rule_sets
+from model.sitemap_writer import iter_sitemap_urls
+from model.snapshot import read_snapshot
+from model.statistics import ResourceStatistics
+
+
+class StubConfig(object):
+
+    def __init__(self, resource_dir, resync_dir, strategy=0):
+        self.resource_dir = resource_dir
+        self.resync_dir = resync_dir
+        self.strategy = strategy
+        self.hash_algorithms = ["md5"]
+        self.change_dump = False
+        self.change_dump_retention = 30
+        self.gzip_sitemaps = False
+
+    def cfg_resource_dir(self):
+        return self.resource_dir
+
+    def cfg_resync_dir(self):
+        return self.resync_dir
+
+    def cfg_urlprefix(self):
+        return "http://example.com/rs/"
+
+    def cfg_sourcedesc(self):
+        return "http://example.com/rs/sourcedescription.xml"
+
+    def cfg_strategy(self):
+        return self.strategy
+
+    def cfg_hash_workers(self):
+        return 1
+
+    def cfg_hash_executor(self):
+        return "thread"
+
+    def cfg_hash_algorithms(self):
+        return self.hash_algorithms
+
+    def cfg_hash_precheck(self):
+        return False
+
+    def cfg_zip_workers(self):
+        return 1
+
+    def cfg_gzip_sitemaps(self):
+        return self.gzip_sitemaps
+
+    def cfg_dump_max_size(self):
+        return 1
+
+    def cfg_dump_workers(self):
+        return 2
+
+    def cfg_change_dump(self):
+        return self.change_dump
+
+    def cfg_change_dump_retention(self):
+        return self.change_dump_retention
+
+    def cfg_changelist_max_urls(self):
+        return 50000
+
+    def cfg_changelist_window(self):
+        return 0
+
+
+class TestPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.resource_dir = os.path.join(self.tmp.name, "resources")
+        self.resync_dir = os.path.join(self.tmp.name, "resync", "rs")
+        os.makedirs(os.path.join(self.resource_dir, "sub"))
+        os.makedirs(self.resync_dir)
+        for name in ("a.txt", os.path.join("sub", "b.txt")):
+            self.write(name, name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, content):
+        with open(os.path.join(self.resource_dir, name), "w") as f:
+            f.write(content)
+
+    def test01_publish(self):
+        config = StubConfig(self.resource_dir, self.resync_dir)
+        result = Publisher(config).publish()
+        assert result.file_count == 2 and result.created_count == 2
+
+        self.write("c.txt", "c")
+        os.remove(os.path.join(self.resource_dir, "a.txt"))
+        config.strategy = 1
+        result = Publisher(config).publish()
+        assert (result.created_count, result.updated_count, result.unchanged_count, result.deleted_count) == \
+               (1, 0, 1, 1)
+
+    def test02_run_reports(self):
+        publisher = Publisher(StubConfig(self.resource_dir, self.resync_dir))
+        publisher.publish_resource_list()
+        publisher.publish_resource_list()
+        publisher.create_zip()
+        history = read_history(self.resync_dir)
+        assert [report["task"] for report in history] == ["resourcelist", "resourcelist", "zip"]
+        first, second = history[0], history[1]
+        assert first["counters"]["cache_misses"] == 2 and first["cache_hit_rate"] == 0.0
+        assert second["counters"]["cache_hits"] == 2 and second["counters"]["bytes_hashed"] == 0
+        assert set(first["stages"]) == {"walk", "stat", "hash", "write", "statistics"}
+        assert history[2]["counters"]["files"] == 1
+
+    def test03_statistics(self):
+        config = StubConfig(self.resource_dir, self.resync_dir, strategy=1)
+        publisher = Publisher(config)
+        publisher.publish_resource_list()
+        self.write("c.txt", "c")
+        self.write(os.path.join("sub", "b.txt"), "longer content")
+        os.remove(os.path.join(self.resource_dir, "a.txt"))
+        publisher.publish_change_list()
+
+        statistics = ResourceStatistics.load(self.resync_dir, self.resource_dir)
+        rebuilt = ResourceStatistics.from_records(self.resource_dir, read_snapshot(publisher.snapshot_path()),
+                                                  statistics.token)
+        assert statistics.as_dict() == rebuilt.as_dict()
+        assert statistics.directory_rows() == [("", 2, 15), ("sub", 1, 14)]
+
+    def test04_set_changes(self):
+        config = StubConfig(self.resource_dir, self.resync_dir)
+        publisher = Publisher(config, rule_sets=parse_rule_sets("[sub]\nprefix sub\n[all]"))
+        result = publisher.publish_resource_list()
+        assert [(changes.name, changes.files, changes.created) for changes in result.set_changes] == \
+               [("sub", 1, 1), ("all", 2, 2)]
+        self.write(os.path.join("sub", "c.txt"), "c")
+        os.remove(os.path.join(self.resource_dir, "a.txt"))
+        result = publisher.publish_change_list()
+        assert [tuple(changes) for changes in result.set_changes] == [("sub", 2, 1, 0, 1, 0), ("all", 2, 1, 0, 1, 1)]
+        assert Publisher(config).publish_change_list().set_changes == ()
+
+    def test05_streamed_paths(self):
+        config = StubConfig(self.resource_dir, self.resync_dir)
+        publisher = Publisher(config)
+        result = publisher.publish_resource_list(iter_walk_records([self.resource_dir]))
+        assert result.file_count == 2
+        self.write("c.txt", "c")
+        result = publisher.publish_change_list(iter(sorted(os.path.join(self.resource_dir, name)
+                                                           for name in ("a.txt", "c.txt"))))
+        assert (result.file_count, result.created_count, result.unchanged_count, result.deleted_count) == \
+               (2, 1, 1, 1)
+        # streams are not sorted, the order is checked
+        paths = iter([os.path.join(self.resource_dir, name) for name in ("c.txt", "a.txt")])
+        self.assertRaises(ValueError, publisher.publish_resource_list, paths)
+        # the total of a stream is the one of the caller
+        totals = []
+        progress = Progress(listener=lambda state: totals.append(state.total_files), interval=0)
+        Publisher(config, progress).publish_resource_list(iter_walk_records([self.resource_dir]), 3)
+        assert 3 in totals
+
+    def test06_extra_digests(self):
+        config = StubConfig(self.resource_dir, self.resync_dir, strategy=1)
+        publisher = Publisher(config)
+        publisher.publish_resource_list()
+        config.hash_algorithms = ["md5", "sha-256"]
+        self.write("c.txt", "c")
+        result = publisher.publish_change_list()
+        assert (result.created_count, result.unchanged_count) == (1, 2)
+        changelist = os.path.join(self.resync_dir, "changelist.xml")
+        hashes = [md["hash"] for loc, lastmod, md in iter_sitemap_urls(changelist)]
+        assert hashes == ["md5:%s sha-256:%s" % (hashlib.md5(b"c").hexdigest(), hashlib.sha256(b"c").hexdigest())]
+        # unchanged files got their sha-256 in the snapshot as well
+        assert all(record.digests.startswith("sha-256:") for record in read_snapshot(publisher.snapshot_path()))
+
+    def test07_resource_dump(self):
+        # a package holds at most 1 MB of resources: the big one gets a package of its own
+        with open(os.path.join(self.resource_dir, "z.bin"), "wb") as f:
+            f.write(os.urandom(1024 * 1024))
+        publisher = Publisher(StubConfig(self.resource_dir, self.resync_dir))
+        result = publisher.publish_resource_dump()
+        assert result.file_count == 3
+        packages = list(iter_sitemap_urls(os.path.join(self.resync_dir, "resourcedump.xml")))
+        assert [loc for loc, lastmod, md in packages] == ["http://example.com/rs/dumps/resourcedump-00001.zip",
+                                                           "http://example.com/rs/dumps/resourcedump-00002.zip"]
+        dump_dir = os.path.join(self.resync_dir, "dumps")
+        with zipfile.ZipFile(os.path.join(dump_dir, "resourcedump-00001.zip")) as zf:
+            assert zf.namelist() == ["manifest.xml", "resources/a.txt", "resources/sub/b.txt"]
+            manifest = zf.read("manifest.xml").decode("utf-8")
+            assert 'capability="resourcedump-manifest"' in manifest and 'path="/resources/sub/b.txt"' in manifest
+        assert packages[0][2]["length"] == str(os.path.getsize(os.path.join(dump_dir, "resourcedump-00001.zip")))
+
+        # a smaller dump removes the packages it no longer has; dumps stay out of the zip
+        os.remove(os.path.join(self.resource_dir, "z.bin"))
+        publisher.publish_resource_dump()
+        assert sorted(os.listdir(dump_dir)) == ["resourcedump-00001.zip"]
+        publisher.create_zip()
+        with zipfile.ZipFile(publisher.zip_path()) as zf:
+            assert not any(name.startswith("dumps/") for name in zf.namelist())
+
+    def test08_change_dump(self):
+        config = StubConfig(self.resource_dir, self.resync_dir, strategy=1)
+        config.change_dump = True
+        publisher = Publisher(config)
+        publisher.publish_resource_list()
+        self.write("c.txt", "c")
+        self.write(os.path.join("sub", "b.txt"), "longer content")
+        os.remove(os.path.join(self.resource_dir, "a.txt"))
+        publisher.publish_change_list()
+        self.write("d.txt", "d")
+        publisher.publish_change_list()
+
+        cd_path = os.path.join(self.resync_dir, "changedump.xml")
+        packages = [loc.rsplit("/", 1)[1] for loc, lastmod, md in iter_sitemap_urls(cd_path)]
+        assert packages == ["changedump-00001-00001.zip", "changedump-00002-00001.zip"]
+        with zipfile.ZipFile(os.path.join(self.resync_dir, "dumps", packages[0])) as zf:
+            # only what changed, deletions only in the manifest
+            assert zf.namelist() == ["manifest.xml", "resources/c.txt", "resources/sub/b.txt"]
+            manifest = zf.read("manifest.xml").decode("utf-8")
+            assert 'capability="changedump-manifest"' in manifest
+            assert '<loc>http://example.com/rs/a.txt</loc><lastmod>' in manifest and 'change="deleted" />' in manifest
+        # a publish without changes adds no change dump
+        publisher.publish_change_list()
+        assert len(list(iter_sitemap_urls(cd_path))) == 2
+
+        # packages are only moved in place once the changelist is committed
+        self.write("e.txt", "e")
+        with mock.patch.object(ChangelistWriter, "close", side_effect=OSError("disk full")):
+            self.assertRaises(OSError, publisher.publish_change_list)
+        assert sorted(os.listdir(os.path.join(self.resync_dir, "dumps"))) == packages
+
+        # expired change dumps are dropped, except the last one
+        config.change_dump_retention = 1e-9
+        publisher.publish_change_list()
+        packages = [loc.rsplit("/", 1)[1] for loc, lastmod, md in iter_sitemap_urls(cd_path)]
+        assert packages == ["changedump-00002-00001.zip", "changedump-00003-00001.zip"]
+        assert sorted(os.listdir(os.path.join(self.resync_dir, "dumps"))) == packages
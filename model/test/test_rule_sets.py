@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, unittest
+
+from model.publisher import FilenameFilter
+from model.rule_sets import RuleEngine, RuleError, SetTally, parse_rule, parse_rule_sets, format_rule_sets, \
+    load_rule_sets, save_rule_sets
+from model.snapshot import SnapshotRecord, CREATED, DELETED
+
+DAY = 86400
+RULES = """
+# test sets
+[pdf]
+glob *.pdf
+
+[letters]
+prefix letters
+not glob r*.txt
+
+[big recent]
+size > 1K
+modified < 30d
+
+[years]
+regex /\\d{4}/
+"""
+
+
+class TestRuleSets(unittest.TestCase):
+
+    def test01_parse(self):
+        rule_sets = parse_rule_sets(RULES)
+        assert [rule_set.name for rule_set in rule_sets] == ["pdf", "letters", "big recent", "years"]
+        assert rule_sets[1].rules[1] == parse_rule("not glob r*.txt")
+        assert rule_sets[1].rules[1].negate
+        assert parse_rule_sets(format_rule_sets(rule_sets)) == rule_sets
+
+    def test02_errors(self):
+        for line in ["glob", "foo *.pdf", "size 10", "size > 10X", "modified < 3y", "regex ("]:
+            self.assertRaises(RuleError, parse_rule, line)
+        self.assertRaises(RuleError, parse_rule_sets, "glob *.pdf")
+        with self.assertRaisesRegex(RuleError, "Line 3"):
+            parse_rule_sets("[a]\nglob *\nnot foo")
+
+    def test03_match(self):
+        engine = RuleEngine(parse_rule_sets(RULES), now=100 * DAY)
+
+        def sets(rel_path, size=0, mtime=0.0):
+            return [engine.names[i] for i in engine.match(rel_path, size, mtime)]
+
+        assert sets("a/b.pdf") == ["pdf"]
+        assert sets("letters/r/x.txt") == ["letters"]
+        assert sets("letters/x/r1.txt", 2000, 99 * DAY) == ["big recent"]
+        assert sets("letters2/a.txt") == []
+        assert sets("a/1999/b.pdf", 2000, 50 * DAY) == ["pdf", "years"]
+        # a set without rules holds everything
+        assert RuleEngine(parse_rule_sets("[all]")).match("x") == [0]
+        # regex rules keep their own groups: backreferences and names used in more than one rule
+        engine = RuleEngine(parse_rule_sets("[a]\nglob *.txt\nregex ^(\\w)\\1\n[b]\nregex (?P<y>\\d{4})/\n"
+                                            "[c]\nnot regex (?P<y>\\d{4})\\.txt"))
+        assert engine.match("aa.txt") == [0, 2]
+        assert engine.match("ab.txt") == [2]
+        assert engine.match("1999/1999.txt") == [1]
+
+    def test04_count(self):
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "letters", "1999"))
+            for name, size in [("a.pdf", 10), (os.path.join("letters", "1999", "b.txt"), 2000),
+                               (os.path.join("letters", "r.txt"), 5), (".hidden.pdf", 1)]:
+                with open(os.path.join(root, name), "wb") as f:
+                    f.write(b"x" * size)
+            counts = RuleEngine(parse_rule_sets(RULES)).count(root, FilenameFilter())
+            assert [(count.name, count.files, count.bytes) for count in counts] == \
+                   [("pdf", 1, 10), ("letters", 1, 2000), ("big recent", 1, 2000), ("years", 1, 2000)]
+
+    def test05_tally(self):
+        tally = SetTally(RuleEngine(parse_rule_sets(RULES)), "/res")
+        tally.add(CREATED, SnapshotRecord("/res/a.pdf", 1, 0.0, None))
+        tally.add(DELETED, SnapshotRecord("/res/b.pdf", 1, 0.0, None))
+        pdf = tally.results()[0]
+        assert (pdf.name, pdf.files, pdf.created, pdf.deleted) == ("pdf", 1, 1, 1)
+
+    def test06_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rule_sets.txt")
+            assert load_rule_sets(path) == []
+            save_rule_sets(path, parse_rule_sets(RULES))
+            assert load_rule_sets(path) == parse_rule_sets(RULES)
@@ -0,0 +1,97 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import gzip, os, tempfile, unittest
+from model.sitemap_writer import SitemapWriter, iter_sitemap_urls, sitemap_filenames, part_filenames, \
+    w3c_datetime, parse_w3c_datetime
+
+BASE_URL = "http://example.com/rs/"
+
+
+class TestSitemapWriter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "resourcelist.xml")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def write(self, count, max_urls, **kwargs):
+        with SitemapWriter(self.filename, "resourcelist", BASE_URL, max_urls=max_urls, **kwargs) as writer:
+            for i in range(count):
+                writer.write_url("http://example.com/r%03d?a&b" % i, 1500000000 + i,
+                                 [("hash", "md5:abc"), ("length", i)])
+        return writer
+
+    def test01_single_sitemap(self):
+        writer = self.write(5, max_urls=10)
+        assert writer.sitemap_count() == 1
+        assert sitemap_filenames(self.filename) == [self.filename]
+        urls = list(iter_sitemap_urls(self.filename))
+        assert len(urls) == 5
+        assert urls[1] == ("http://example.com/r001?a&b", 1500000001, {"hash": "md5:abc", "length": "1"})
+
+    def test02_split_with_index(self):
+        writer = self.write(25, max_urls=10)
+        assert writer.sitemap_count() == 3
+        assert len(part_filenames(self.filename)) == 3
+        with open(self.filename) as f:
+            index = f.read()
+        assert "<sitemapindex" in index
+        assert BASE_URL + "resourcelist-00003.xml" in index
+        assert [url[0] for url in iter_sitemap_urls(self.filename)] == \
+            ["http://example.com/r%03d?a&b" % i for i in range(25)]
+
+    def test03_stale_parts_removed(self):
+        self.write(25, max_urls=10)
+        self.write(15, max_urls=10)
+        assert len(part_filenames(self.filename)) == 2
+        self.write(5, max_urls=10)
+        assert sitemap_filenames(self.filename) == [self.filename]
+        assert len(os.listdir(self.tmpdir.name)) == 1
+
+    def test04_discard_on_error(self):
+        with self.assertRaises(ValueError):
+            with SitemapWriter(self.filename, "resourcelist", BASE_URL) as writer:
+                writer.write_url("http://example.com/r")
+                raise ValueError()
+        assert os.listdir(self.tmpdir.name) == []
+
+    def test05_w3c_datetime(self):
+        assert w3c_datetime(0) == "1970-01-01T00:00:00Z"
+        assert parse_w3c_datetime("1970-01-01T00:00:10Z") == 10
+        assert parse_w3c_datetime("1970-01-01T01:00:10+01:00") == 10
+
+    def test06_gzip(self):
+        self.write(25, max_urls=10, gzip=True)
+        assert sorted(os.listdir(self.tmpdir.name)) == sorted(name + suffix for name in
+                                                              ["resourcelist.xml"] + ["resourcelist-%05d.xml" % i
+                                                                                      for i in (1, 2, 3)]
+                                                              for suffix in ("", ".gz"))
+        with open(self.filename) as f:
+            assert BASE_URL + "resourcelist-00003.xml.gz" in f.read()
+        with open(self.filename + ".gz", "rb") as f, open(self.filename, "rb") as g:
+            assert gzip.decompress(f.read()) == g.read()
+        # the index is followed to the gzipped parts
+        assert len(list(iter_sitemap_urls(self.filename))) == 25
+
+        self.write(5, max_urls=10)
+        assert sorted(os.listdir(self.tmpdir.name)) == ["resourcelist.xml"]
+
+    def test07_unchanged_not_replaced(self):
+        with SitemapWriter(self.filename, "resourcelist", BASE_URL, md=[("at", w3c_datetime(0))], gzip=True) as writer:
+            writer.write_url("http://example.com/r", 10)
+        with open(self.filename, "rb") as f:
+            first = f.read()
+        with SitemapWriter(self.filename, "resourcelist", BASE_URL, md=[("at", w3c_datetime(10))], gzip=True) as writer:
+            writer.write_url("http://example.com/r", 10)
+        assert writer.unchanged == 1
+        with open(self.filename, "rb") as f:
+            assert f.read() == first
+        with SitemapWriter(self.filename, "resourcelist", BASE_URL, md=[("at", w3c_datetime(20))], gzip=True) as writer:
+            writer.write_url("http://example.com/r", 20)
+        assert writer.unchanged == 0
+        with gzip.open(self.filename + ".gz", "rb") as f:
+            assert b'at="1970-01-01T00:00:20Z"' in f.read()
+        assert sorted(os.listdir(self.tmpdir.name)) == ["resourcelist.xml", "resourcelist.xml.gz"]
@@ -0,0 +1,50 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, unittest
+from model.snapshot import SnapshotRecord, SnapshotWriter, SnapshotError, read_snapshot, changes, \
+    CREATED, UPDATED, DELETED, UNCHANGED
+
+MD5_A = "0cc175b9c0f1b6a831c399e269772661"
+MD5_B = "92eb5ffee6ae2fec3ad71c777531578f"
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.tmpdir.name, "snapshot.bin")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test01_write_read(self):
+        records = [SnapshotRecord("/a/b", 1, 1.5, MD5_A), SnapshotRecord("/a/cé", 2, 2.5, None)]
+        with SnapshotWriter(self.filename) as writer:
+            for record in records:
+                writer.write(record)
+        assert writer.count == 2
+        assert list(read_snapshot(self.filename)) == records
+        assert not os.path.exists(self.filename + ".tmp")
+
+    def test02_missing_snapshot_is_empty(self):
+        assert list(read_snapshot(self.filename)) == []
+
+    def test03_order_enforced(self):
+        with self.assertRaises(SnapshotError):
+            with SnapshotWriter(self.filename) as writer:
+                writer.write(SnapshotRecord("/b", 1, 1.0, None))
+                writer.write(SnapshotRecord("/a", 1, 1.0, None))
+        assert not os.path.exists(self.filename)
+
+    def test04_changes(self):
+        previous = [SnapshotRecord("/a", 1, 1.0, MD5_A),
+                    SnapshotRecord("/b", 1, 1.0, MD5_A),
+                    SnapshotRecord("/c", 1, 1.0, MD5_A),
+                    SnapshotRecord("/e", 1, 1.0, None)]
+        current = [SnapshotRecord("/b", 1, 2.0, MD5_A),
+                   SnapshotRecord("/c", 1, 1.0, MD5_B),
+                   SnapshotRecord("/d", 1, 1.0, MD5_A),
+                   SnapshotRecord("/e", 2, 1.0, MD5_A)]
+        found = [(change, (curr or prev).path) for change, prev, curr in changes(previous, current)]
+        assert found == [(DELETED, "/a"), (UNCHANGED, "/b"), (UPDATED, "/c"), (CREATED, "/d"), (UPDATED, "/e")]
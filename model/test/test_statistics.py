@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, tempfile, unittest
+
+from model.snapshot import SnapshotRecord, SnapshotWriter, changes
+from model.statistics import ResourceStatistics, load_statistics, size_bucket
+
+DAY = 24 * 3600
+NOW = 1700000000.0
+
+
+def record(path, size, age=0):
+    return SnapshotRecord(os.path.join("/res", *path.split("/")), size, NOW - age * DAY, None)
+
+
+class TestStatistics(unittest.TestCase):
+
+    def test01_size_bucket(self):
+        assert size_bucket(0) == 0
+        assert size_bucket(1024) == 0
+        assert size_bucket(1025) == 1
+        assert size_bucket(2 ** 40) == 11
+
+    def test02_add_remove(self):
+        statistics = ResourceStatistics("/res")
+        statistics.add(record("a.txt", 10))
+        statistics.add(record("d/b.txt", 2000, 400))
+        statistics.add(record("d/e/c.txt", 3000, 400))
+        assert (statistics.files, statistics.bytes) == (3, 5010)
+        assert statistics.directory_rows() == [("", 3, 5010), ("d", 2, 5000), (os.path.join("d", "e"), 1, 3000)]
+        assert statistics.directory_rows(max_depth=1) == [("", 3, 5010), ("d", 2, 5000)]
+        assert [files for bound, files, size in statistics.size_rows()][:3] == [1, 2, 0]
+        assert statistics.age_rows(NOW)[0] == (30, 1)
+        assert statistics.age_rows(NOW)[3] == (730, 2)
+
+        statistics.remove(record("d/e/c.txt", 3000, 400))
+        assert statistics.directory_rows() == [("", 2, 2010), ("d", 1, 2000)]
+        assert sum(statistics.months.values()) == 2
+
+    def test03_incremental(self):
+        previous = [record("a.txt", 10), record("b.txt", 20), record("d/c.txt", 30)]
+        current = [record("a.txt", 11), record("d/c.txt", 30), record("d/d.txt", 40)]
+        statistics = ResourceStatistics.from_records("/res", previous)
+        for change, prev, curr in changes(previous, current):
+            statistics.apply(change, prev, curr)
+        assert statistics.as_dict() == ResourceStatistics.from_records("/res", current).as_dict()
+
+    def test04_save_load(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            snapshot_path = os.path.join(tmp, "snapshot")
+            records = [record("a.txt", 10), record("d/c.txt", 30)]
+            with SnapshotWriter(snapshot_path) as writer:
+                for item in records:
+                    writer.write(item)
+            statistics = ResourceStatistics.from_records("/res", records[:1], token="1")
+            statistics.save(tmp)
+
+            assert ResourceStatistics.load(tmp, "/other") is None
+            assert load_statistics(tmp, "/res", snapshot_path, "1").files == 1
+            # saved for another snapshot, rebuilt
+            rebuilt = load_statistics(tmp, "/res", snapshot_path, "2")
+            assert (rebuilt.files, rebuilt.token) == (2, "2")
@@ -0,0 +1,114 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import multiprocessing, os, tempfile, time, unittest
+
+from model.publisher import FilenameFilter
+from model.watcher import DirtyJournal, PollingWatcher, CREATED, MODIFIED, DELETED
+
+
+def hold_journal(journal_dir, locked, seconds):
+    with DirtyJournal(journal_dir).__locked__():
+        locked.set()
+        time.sleep(seconds)
+
+
+class TestDirtyJournal(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = DirtyJournal(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test01_invalid_without_since(self):
+        assert self.journal.dirty_paths("1") is None
+        self.journal.start()
+        self.journal.record(MODIFIED, "/a")
+        assert self.journal.dirty_paths("1") is None
+        assert self.journal.is_active()
+
+    def test02_reset(self):
+        self.journal.start()
+        self.journal.record(MODIFIED, "/a")
+        mark = self.journal.mark()
+        self.journal.record(CREATED, "/b")
+        self.journal.reset("1", mark)
+        assert self.journal.dirty_paths("1") == {"/b"}
+        assert self.journal.dirty_paths("2") is None
+        self.journal.record(DELETED, "/c")
+        assert self.journal.dirty_paths("1") == {"/b", "/c"}
+
+    def test03_stopped(self):
+        self.journal.start()
+        self.journal.reset("1")
+        self.journal.stop()
+        assert self.journal.dirty_paths("1") is None
+        assert not self.journal.is_active()
+        # a journal without a watcher is not kept
+        self.journal.reset("2")
+        assert self.journal.dirty_paths("2") is None
+
+    def test04_locked_across_processes(self):
+        self.journal.start()
+        locked = multiprocessing.Event()
+        process = multiprocessing.Process(target=hold_journal, args=(self.tmp.name, locked, 0.5))
+        process.start()
+        assert locked.wait(10)
+        start = time.monotonic()
+        self.journal.record(CREATED, "/a")
+        assert time.monotonic() - start > 0.2
+        process.join()
+        self.journal.reset("1", self.journal.mark())
+        assert self.journal.dirty_paths("1") == set()
+
+
+class TestPollingWatcher(unittest.TestCase):
+
+    def test01_poll(self):
+        with tempfile.TemporaryDirectory() as resource_dir, tempfile.TemporaryDirectory() as journal_dir:
+            a = os.path.join(resource_dir, "a.txt")
+            b = os.path.join(resource_dir, "b.txt")
+            c = os.path.join(resource_dir, "c.txt")
+            for path in (a, b):
+                with open(path, "w") as f:
+                    f.write("x")
+            journal = DirtyJournal(journal_dir)
+            journal.start()
+            journal.reset("1")
+            watcher = PollingWatcher(resource_dir, journal, FilenameFilter())
+            watcher.poll()
+            assert journal.dirty_paths("1") == set()
+
+            os.remove(a)
+            with open(b, "w") as f:
+                f.write("xyz")
+            with open(c, "w") as f:
+                f.write("x")
+            watcher.poll()
+            assert journal.dirty_paths("1") == {a, b, c}
+
+    def test02_requested_scan(self):
+        # a file modified in place is only seen by a full scan, the journal is only used after one
+        with tempfile.TemporaryDirectory() as resource_dir, tempfile.TemporaryDirectory() as journal_dir:
+            a = os.path.join(resource_dir, "a.txt")
+            with open(a, "w") as f:
+                f.write("x")
+            journal = DirtyJournal(journal_dir)
+            watcher = PollingWatcher(resource_dir, journal, FilenameFilter(), interval=3600)
+            watcher.start()
+            try:
+                while watcher.state is None:
+                    time.sleep(0.01)
+                journal.reset("1")
+                with open(a, "w") as f:
+                    f.write("xyz")
+                started = time.time()
+                assert journal.dirty_paths("1", started) is None
+                assert journal.wait_for_scan(started, timeout=10)
+                assert journal.dirty_paths("1", started) == {a}
+            finally:
+                watcher.stop()
+                watcher.join()
+            assert not journal.wait_for_scan(time.time(), timeout=1)
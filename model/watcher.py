@@ -0,0 +1,279 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os, threading, time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:     # Windows
+    fcntl = None
+    import msvcrt
+
+from model.metadata import scan_directories
+
+# Journal of paths in the resource dir that changed since the last publish, kept in the resync dir.
+#
+# A watcher (the gui's QFileSystemWatcher, or the PollingWatcher below) records created, modified and
+# deleted paths. The journal can stand in for a full scan only if it has been recording without
+# interruption since the snapshot of the last publish was written:
+#
+#   @started <pid>      a watcher started; changes before this line may have been missed
+#   @since <token>      recording covers everything since the snapshot identified by token
+#   @stopped            the watcher stopped
+#   @scanned <time>     the watcher completed a full scan of the resource dir that started at time
+#   <kind> <path>       a change, kind is one of CREATED, MODIFIED, DELETED
+#
+# Not every platform reports files that are modified in place, those are only seen by the full scans. A
+# publisher therefore only uses the journal after a full scan that completed after it started; it can ask
+# the watcher for one with request_scan, which creates a request file next to the journal.
+# The watcher (gui) and the publisher (cli, cron) may be different processes; they take an OS lock on a
+# lock file next to the journal, besides the lock that is shared by the threads of one process.
+
+DIRTY_JOURNAL = ".resyto_dirty.log"
+LOCK_SUFFIX = ".lock"
+REQUEST_SUFFIX = ".scan"
+
+CREATED = "C"
+MODIFIED = "M"
+DELETED = "D"
+
+DEFAULT_INTERVAL = 600
+
+# seconds between checks for scan requests, and a publisher waits for the requested scan
+REQUEST_INTERVAL = 1
+SCAN_TIMEOUT = 60
+
+# one lock per journal file, shared by all DirtyJournals in this process
+__journal_locks = {}
+__journal_locks_lock = threading.Lock()
+
+
+def __journal_lock__(path):
+    with __journal_locks_lock:
+        return __journal_locks.setdefault(path, threading.Lock())
+
+
+@contextmanager
+def __file_lock__(path):
+    # exclusive lock on the file path, held by one process at a time
+    with open(path, "a+b") as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def list_directory(path, filename_filter):
+    # return ({filename: (size, mtime)} of the accepted files in path, [paths of subdirectories])
+    files = {}
+    subdirs = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file() and filename_filter.accept(entry.name):
+                    stat = entry.stat()
+                    files[entry.name] = (stat.st_size, stat.st_mtime)
+    except OSError:
+        pass
+    return files, subdirs
+
+
+def snapshot_token(snapshot_path):
+    # identity of a written snapshot
+    return str(os.stat(snapshot_path).st_mtime_ns) if os.path.exists(snapshot_path) else "none"
+
+
+def __process_alive__(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+class DirtyJournal(object):
+
+    def __init__(self, journal_dir, filename=DIRTY_JOURNAL):
+        self.logger = logging.getLogger(__name__)
+        self.path = os.path.join(journal_dir, filename)
+        self.lock = __journal_lock__(os.path.abspath(self.path))
+
+    @contextmanager
+    def __locked__(self):
+        with self.lock, __file_lock__(self.path + LOCK_SUFFIX):
+            yield
+
+    def __append__(self, line):
+        with self.__locked__(), open(self.path, "a", encoding="utf-8", errors="surrogateescape") as f:
+            f.write(line + "\n")
+
+    def start(self):
+        self.__append__("@started %d" % os.getpid())
+
+    def stop(self):
+        self.__append__("@stopped")
+
+    def record(self, kind, path):
+        self.__append__("%s %s" % (kind, path))
+
+    def scanned(self, started):
+        # a full scan that started at started, seconds since epoch, completed
+        self.__append__("@scanned %f" % started)
+
+    def request_scan(self):
+        # ask the watcher for a full scan
+        with open(self.path + REQUEST_SUFFIX, "a"):
+            pass
+
+    def take_scan_request(self):
+        # True if a full scan was requested since the last call
+        try:
+            os.remove(self.path + REQUEST_SUFFIX)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def wait_for_scan(self, after, timeout=SCAN_TIMEOUT):
+        # request a full scan and wait until one completed after the time after; return whether it did
+        self.request_scan()
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            since, pid, dirty, valid, scanned = self.__read__()
+            if pid is None or not __process_alive__(pid):
+                return False
+            if scanned is not None and scanned >= after:
+                return True
+            time.sleep(REQUEST_INTERVAL / 4)
+        return False
+
+    def mark(self):
+        # position in the journal; changes recorded after it survive reset()
+        with self.__locked__():
+            return os.path.getsize(self.path) if os.path.exists(self.path) else 0
+
+    def __read__(self):
+        with self.__locked__():
+            return self.__parse__()
+
+    def __parse__(self):
+        # return (since token, watcher pid or None, dirty paths since the since line, valid, time of the last
+        # full scan by the watcher or None)
+        since = None
+        pid = None
+        valid = False
+        dirty = set()
+        scanned = None
+        if not os.path.exists(self.path):
+            return since, pid, dirty, valid, scanned
+        with open(self.path, encoding="utf-8", errors="surrogateescape") as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line.startswith("@started"):
+                    pid = int(line.split()[1])
+                    valid = False
+                    scanned = None
+                elif line.startswith("@stopped"):
+                    pid = None
+                    valid = False
+                    scanned = None
+                elif line.startswith("@scanned"):
+                    scanned = float(line.split()[1])
+                elif line.startswith("@since"):
+                    since = line.split()[1]
+                    valid = pid is not None
+                    dirty = set()
+                elif line:
+                    dirty.add(line[2:])
+        return since, pid, dirty, valid, scanned
+
+    def is_active(self):
+        since, pid, dirty, valid, scanned = self.__read__()
+        return pid is not None and __process_alive__(pid)
+
+    def dirty_paths(self, token, scanned_after=None):
+        # the set of changed paths since the snapshot identified by token, None if the journal cannot tell.
+        # scanned_after: seconds since epoch, only if a full scan of the watcher started after it
+        since, pid, dirty, valid, scanned = self.__read__()
+        if scanned_after is not None and (scanned is None or scanned < scanned_after):
+            return None
+        if valid and since == token and __process_alive__(pid):
+            return dirty
+        return None
+
+    def reset(self, token, mark=0):
+        # after a publish that wrote the snapshot identified by token. Only an active journal is kept.
+        with self.__locked__():
+            since, pid, dirty, valid, scanned = self.__parse__()
+            if pid is None or not __process_alive__(pid):
+                return
+            with open(self.path, encoding="utf-8", errors="surrogateescape") as f:
+                f.seek(mark)
+                later = [line for line in f if not line.startswith("@")]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8", errors="surrogateescape") as f:
+                f.write("@started %d\n@since %s\n" % (pid, token))
+                f.writelines(later)
+            os.replace(tmp_path, self.path)
+
+
+class PollingWatcher(threading.Thread):
+    # fallback watcher: rescans the resource dir every interval seconds and records the differences
+
+    def __init__(self, resource_dir, journal, filename_filter, interval=DEFAULT_INTERVAL):
+        super().__init__(daemon=True)
+        self.logger = logging.getLogger(__name__)
+        self.resource_dir = resource_dir
+        self.journal = journal
+        self.filename_filter = filename_filter
+        self.interval = interval
+        self.__stop_event = threading.Event()
+        self.state = None
+
+    def scan(self):
+        metadata = scan_directories([self.resource_dir], self.filename_filter)
+        return {path: (size, mtime) for path, size, mtime in zip(metadata.paths, metadata.sizes, metadata.mtimes)}
+
+    def poll(self):
+        started = time.time()
+        current = self.scan()
+        if self.state is not None:
+            for path, signature in current.items():
+                previous = self.state.get(path)
+                if previous is None:
+                    self.journal.record(CREATED, path)
+                elif previous != signature:
+                    self.journal.record(MODIFIED, path)
+            for path in self.state.keys() - current.keys():
+                self.journal.record(DELETED, path)
+            self.journal.scanned(started)
+        self.state = current
+
+    def run(self):
+        # poll every interval seconds, or sooner when a publisher requests it
+        self.journal.start()
+        self.poll()
+        next_poll = time.monotonic() + self.interval
+        while not self.__stop_event.wait(REQUEST_INTERVAL):
+            if self.journal.take_scan_request() or time.monotonic() >= next_poll:
+                self.poll()
+                next_poll = time.monotonic() + self.interval
+        self.journal.stop()
+
+    def stop(self):
+        self.__stop_event.set()
@@ -1,15 +1,29 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+# python3 rs_app.py --startup-timing prints the cost of each phase of the start up, from the imports to the
+# first window on screen, and quits.
 
 import logging, logging.config, sys
-import i18n
+from model.instrumentation import RunReport
 
-from PyQt5.QtWidgets import QApplication
-from control.rs_window import RsMainWindow
-from model.config import Configuration
+STARTUP_TIMING = "--startup-timing" in sys.argv
 
-logging.config.fileConfig('logging.conf')
+startup = RunReport("startup")
+
+with startup.span("import i18n"):
+    import i18n
+
+with startup.span("import qt"):
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+
+with startup.span("import window"):
+    from control.rs_window import RsMainWindow
+    from model.config import Configuration
+
+with startup.span("logging"):
+    logging.config.fileConfig('logging.conf')
 
 logger = logging.getLogger(__name__)
 logger.debug("Configured logging from file logging.conf")
@@ -17,25 +31,44 @@ logger.debug("Configured logging from file logging.conf")
 class RsApplication(QApplication):
 
     def __init__(self, args):
-        super().__init__(args)
+        with startup.span("application"):
+            super().__init__(args)
 
         logger.info("Starting application")
 
-        language = Configuration().settings_language()
-        i18n.set_language(language)
+        with startup.span("language"):
+            language = Configuration().settings_language()
+            i18n.set_language(language)
 
-        self.main_window = RsMainWindow()
+        with startup.span("main window"):
+            self.main_window = RsMainWindow()
 
         self.aboutToQuit.connect(self.__before_close__)
+        # runs as soon as the event loop has shown the window
+        QTimer.singleShot(0, self.__started__)
 
         sys.exit(self.exec_())
 
+    def __started__(self):
+        startup.finish()
+        logger.info("Started in %.3f s", startup.seconds)
+        if STARTUP_TIMING:
+            print_startup(startup)
+            self.quit()
+
     def __before_close__(self):
         # any final action?
         logger.info("Closing application")
         self.main_window.close()
 
 
+def print_startup(report):
+    # report: the model.instrumentation.RunReport of the start up
+    for name, stage in report.as_dict()["stages"].items():
+        print("%-14s %8.1f ms" % (name, 1000 * stage["seconds"]))
+    print("%-14s %8.1f ms" % ("first window", 1000 * report.seconds))
+
+
 if __name__ == '__main__':
     app = RsApplication(sys.argv)
-    #sys.exit(app.exec_())
\ No newline at end of file
+    #sys.exit(app.exec_())
@@ -0,0 +1,183 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+# Command line publishing, for use from cron or CI. Does not import PyQt.
+#
+#   python3 rs_cli.py resourcelist
+#   python3 rs_cli.py changelist --resource-dir /data/archive --resync-dir /var/www/rs
+#   python3 rs_cli.py publish zip stats
+#   python3 rs_cli.py resourcedump          the resources themselves in zip packages, see model.dumps
+#   python3 rs_cli.py sets                  count the files in each rule-based set
+#   python3 rs_cli.py watch                 keep a journal of changes for fast changelists, until interrupted
+#   python3 rs_cli.py changelist zip --profiles all --processes 4 --io-workers 16
+
+import argparse, logging, logging.config, os, sys
+
+from model.config import Configuration
+
+COMMANDS = ["publish", "resourcelist", "changelist", "resourcedump", "zip", "stats", "sets", "watch"]
+
+logger = logging.getLogger(__name__)
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="rs_cli", description="Publish ResourceSync documents without a gui.")
+    parser.add_argument("commands", nargs="+", choices=COMMANDS, metavar="command",
+                        help="one or more of: %s. 'publish' uses the strategy from the configuration"
+                             % ", ".join(COMMANDS))
+    parser.add_argument("--config", help="name of the configuration file in the configuration directory")
+    parser.add_argument("--resource-dir", help="directory with resources, overrides the configuration")
+    parser.add_argument("--resync-dir", help="directory for sitemaps, overrides the configuration")
+    parser.add_argument("--urlprefix", help="url prefix of the resources, overrides the configuration")
+    parser.add_argument("--paths", nargs="+",
+                        help="files and/or folders to publish; default is everything under the resource dir")
+    parser.add_argument("--progress", action="store_true", help="report progress on stderr")
+    parser.add_argument("--interval", type=int, help="seconds between rescans for the watch command")
+    parser.add_argument("--profiles", nargs="+", metavar="PROFILE",
+                        help="publish these profiles of the configuration concurrently, 'all' for every profile")
+    parser.add_argument("--processes", type=int, default=0,
+                        help="number of profiles published at the same time; default is the number of cpu's")
+    parser.add_argument("--io-workers", type=int, default=0,
+                        help="total number of files read at the same time over all profiles; "
+                             "default is the number of cpu's")
+    parser.add_argument("--log-config", default="logging.conf", help="logging configuration file")
+    return parser.parse_args(argv)
+
+
+def configure(args):
+    if args.config:
+        Configuration._set_configuration_filename(args.config)
+    config = Configuration()
+    # overrides are not persisted
+    if args.resource_dir:
+        config.set_cfg_resource_dir(os.path.abspath(args.resource_dir))
+    if args.resync_dir:
+        config.set_cfg_resync_dir(os.path.abspath(args.resync_dir))
+    if args.urlprefix:
+        config.set_cfg_urlprefix(args.urlprefix)
+    return config
+
+
+def print_progress(progress):
+    sys.stderr.write("\r%-10s %d/%d files %d%%" % (progress.stage, progress.files_scanned, progress.total_files,
+                                                   progress.percentage()))
+    sys.stderr.flush()
+
+
+def print_result(command, result):
+    print("%s: %d files, %d created, %d updated, %d unchanged, %d deleted -> %s (%d sitemaps)"
+          % (command, result.file_count, result.created_count, result.updated_count, result.unchanged_count,
+             result.deleted_count, result.path, result.sitemap_count))
+    for changes in result.set_changes:
+        print("  set %s: %d files, %d created, %d updated, %d unchanged, %d deleted"
+              % (changes.name, changes.files, changes.created, changes.updated, changes.unchanged, changes.deleted))
+
+
+def print_batch_result(result):
+    # result: a model.batch.BatchResult
+    print("profile %s: %s in %.1f s" % (result.profile, "failed" if result.error else "done", result.seconds))
+    for command, publish_result in result.results:
+        print_result(command, publish_result)
+    if result.error:
+        print("  error: %s" % result.error)
+
+
+def publish_profiles(config, args):
+    from model.batch import TASKS, publish_batch
+
+    names = config.profile_names() if args.profiles == ["all"] else args.profiles
+    unknown = [name for name in names if name not in config.profile_names()]
+    if unknown:
+        print("unknown profiles: %s" % ", ".join(unknown), file=sys.stderr)
+        return 2
+    commands = [command for command in args.commands if command not in TASKS]
+    if commands:
+        print("not for profiles: %s" % ", ".join(commands), file=sys.stderr)
+        return 2
+    try:
+        results = publish_batch([config.profile(name) for name in names], args.commands, args.processes,
+                                args.io_workers, listener=print_batch_result)
+    except ValueError as err:
+        print(err, file=sys.stderr)
+        return 2
+    failed = [result.profile for result in results if result.error]
+    print("%d profiles published, %d failed%s" % (len(results) - len(failed), len(failed),
+                                                  ": " + ", ".join(failed) if failed else ""))
+    return 1 if failed else 0
+
+
+def watch(config, interval):
+    from model.publisher import FilenameFilter
+    from model.watcher import DirtyJournal, PollingWatcher
+
+    watcher = PollingWatcher(config.cfg_resource_dir(), DirtyJournal(config.cfg_resync_dir()), FilenameFilter(),
+                             interval)
+    watcher.start()
+    print("watching %s every %d seconds, interrupt to stop" % (config.cfg_resource_dir(), interval))
+    try:
+        while watcher.is_alive():
+            watcher.join(1)
+    except KeyboardInterrupt:
+        watcher.stop()
+        watcher.join()
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    if os.path.exists(args.log_config):
+        logging.config.fileConfig(args.log_config)
+
+    config = configure(args)
+    if args.profiles:
+        return publish_profiles(config, args)
+
+    # imported here so that --help does not pay for loading the publisher client
+    from model.progress import Progress
+    from model.publisher import FilenameFilter, Publisher, iter_walk_records
+    from model.rule_sets import RuleEngine, RuleError, load_rule_sets
+
+    progress = Progress(listener=print_progress if args.progress else None)
+    try:
+        rule_sets = load_rule_sets(config.cfg_rule_sets_file())
+    except RuleError as err:
+        print("%s: %s" % (config.cfg_rule_sets_file(), err), file=sys.stderr)
+        return 2
+    publisher = Publisher(config, progress, rule_sets)
+    # without explicit paths the publisher decides, it may use the dirty journal instead of a full walk.
+    # Explicit paths are streamed, each command walks them again.
+    paths = args.paths or None
+    for command in args.commands:
+        if command == "watch":
+            watch(config, args.interval or config.cfg_watch_interval())
+            continue
+        if command == "sets":
+            for count in RuleEngine(rule_sets).count(config.cfg_resource_dir(), FilenameFilter()):
+                print("set %s: %d files, %d bytes" % (count.name, count.files, count.bytes))
+            continue
+        records = iter_walk_records(paths) if paths else None
+        if command == "publish":
+            result = publisher.publish(records)
+        elif command == "resourcelist":
+            result = publisher.publish_resource_list(records)
+        elif command == "changelist":
+            result = publisher.publish_change_list(records)
+        elif command == "resourcedump":
+            result = publisher.publish_resource_dump(records)
+        elif command == "zip":
+            result = publisher.create_zip()
+        else:
+            file_count = total_bytes = 0
+            for record in records or iter_walk_records([config.cfg_resource_dir()]):
+                file_count += 1
+                total_bytes += record.stat.st_size
+            print("stats: %d files, %d bytes in %s" % (file_count, total_bytes, config.cfg_resource_dir()))
+            continue
+
+        if args.progress:
+            sys.stderr.write("\n")
+        print_result(command, result)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
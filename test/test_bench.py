@@ -0,0 +1,51 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json, os, tempfile, unittest
+from unittest import mock
+
+from bench import generate, run
+
+
+class TestBench(unittest.TestCase):
+
+    def test_01_generate_tree(self):
+        with tempfile.TemporaryDirectory() as root:
+            paths = generate.generate_tree(root, 250, depth=2, files_per_dir=20, sizes="fixed", mean_size=100)
+            assert len(paths) == 250
+            assert all(os.path.getsize(path) == 100 for path in paths)
+            assert len(set(os.path.dirname(path) for path in paths)) == 13
+
+            created, modified, deleted = generate.apply_churn(root, 0.3, sizes="fixed", mean_size=100)
+            assert (created, modified, deleted) == (25, 25, 25)
+            assert sum(len(files) for _, _, files in os.walk(root)) == 250
+
+    def test_02_run(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            output = os.path.join(tmp, "results.json")
+            assert run.main(["--files", "200", "--depth", "1", "--workdir", tmp, "--output", output]) == 0
+            with open(output) as f:
+                report = json.load(f)
+            assert report["params"]["files"] == 200
+            assert report["results"]["changelist"]["seconds"] > 0
+            assert run.main(["--files", "200", "--depth", "1", "--workdir", tmp, "--only", "scan",
+                             "--compare", output, "--tolerance", "1000"]) == 0
+
+    def test_03_compare(self):
+        baseline = {"results": {"scan": {"seconds": 1.0}, "zip": {"seconds": 1.0}}}
+        results = {"scan": {"seconds": 1.1}, "zip": {"seconds": 2.0}}
+        assert run.compare(results, baseline, 0.25) == ["zip"]
+
+    def test_04_save_baseline(self):
+        with tempfile.TemporaryDirectory() as tmp, mock.patch.object(run, "BASELINE_DIR", os.path.join(tmp, "b")):
+            args = ["--files", "100", "--depth", "1", "--workdir", tmp, "--only", "scan"]
+            assert run.main(args + ["--save-baseline"]) == 0
+            with open(run.baseline_path(100)) as f:
+                assert json.load(f)["params"]["files"] == 100
+            assert run.main(args + ["--compare", "--tolerance", "1000"]) == 0
+
+    def test_05_example_baseline(self):
+        with open(os.path.join(os.path.dirname(run.__file__), "baseline.example.json")) as f:
+            example = json.load(f)
+        assert example["version"] == run.FORMAT_VERSION
+        assert all("seconds" in result for result in example["results"].values())
@@ -0,0 +1,55 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import os, subprocess, sys, tempfile, unittest
+import rs_cli
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_cli(home, args, rule_sets=None):
+    # run rs_cli.main(args) in a python with its own home directory and a PyQt5 that can always be imported;
+    # return the completed process, its output ends with the PyQt5 modules that were imported
+    os.makedirs(os.path.join(home, "stubs", "PyQt5"), exist_ok=True)
+    open(os.path.join(home, "stubs", "PyQt5", "__init__.py"), "w").close()
+    if rule_sets is not None:
+        os.makedirs(os.path.join(home, ".config", "rsync"), exist_ok=True)
+        with open(os.path.join(home, ".config", "rsync", "rsync_rule_sets.txt"), "w") as f:
+            f.write(rule_sets)
+    code = "import rs_cli, sys\nstatus = rs_cli.main(%r)\n" \
+           "print(sorted(name for name in sys.modules if name.startswith('PyQt5')))\nsys.exit(status)" % args
+    env = dict(os.environ, HOME=home, PYTHONPATH=os.pathsep.join([os.path.join(home, "stubs"), ROOT]))
+    return subprocess.run([sys.executable, "-c", code], cwd=home, env=env, capture_output=True, text=True)
+
+
+class TestCli(unittest.TestCase):
+
+    def test_01_no_qt(self):
+        with tempfile.TemporaryDirectory() as home:
+            resources = os.path.join(home, "resources")
+            os.makedirs(os.path.join(resources, "sub"))
+            os.makedirs(os.path.join(home, "rs"))
+            with open(os.path.join(resources, "sub", "a.txt"), "w") as f:
+                f.write("a")
+            process = run_cli(home, ["resourcelist", "sets", "--resource-dir", resources,
+                                     "--resync-dir", os.path.join(home, "rs")])
+            assert process.returncode == 0, process.stderr
+            assert process.stdout.splitlines()[-1] == "[]"
+
+    def test_02_parse_args(self):
+        args = rs_cli.parse_args(["publish", "zip", "--resync-dir", "/tmp/rs"])
+        assert args.commands == ["publish", "zip"]
+        assert args.resync_dir == "/tmp/rs"
+        assert args.paths is None
+        self.assertRaises(SystemExit, rs_cli.parse_args, ["foo"])
+
+    def test_03_parse_profiles(self):
+        args = rs_cli.parse_args(["changelist", "zip", "--profiles", "a", "b", "--processes", "2"])
+        assert args.profiles == ["a", "b"]
+        assert (args.processes, args.io_workers) == (2, 0)
+
+    def test_04_rule_error(self):
+        with tempfile.TemporaryDirectory() as home:
+            process = run_cli(home, ["sets", "--resource-dir", home], rule_sets="[a]\nfoo bar\n")
+            assert process.returncode == 2
+            assert "Line 2" in process.stderr and "Traceback" not in process.stderr
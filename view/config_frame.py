@@ -4,7 +4,8 @@
 import i18n, os, gettext
 
 from PyQt5.QtWidgets import QComboBox, QFrame, QGridLayout, QLabel, QLineEdit, QPushButton, QHBoxLayout, \
-    QVBoxLayout, QFileDialog, QSpacerItem, QButtonGroup, QRadioButton, QAbstractButton, QGroupBox
+    QVBoxLayout, QFileDialog, QSpacerItem, QButtonGroup, QRadioButton, QAbstractButton, QGroupBox, QSpinBox, \
+    QCheckBox
 from model.config import Configuration
 
 
@@ -21,6 +22,11 @@ class ConfigFrame(QFrame):
         self.le_resyncdir = QLineEdit(self.config.cfg_resync_dir())
         self.le_sourcedesc = QLineEdit(self.config.cfg_sourcedesc())
         self.le_urlprefix = QLineEdit(self.config.cfg_urlprefix())
+        self.sb_hash_workers = QSpinBox()
+        self.sb_hash_workers.setRange(0, 256)
+        self.sb_hash_workers.setValue(self.config.cfg_hash_workers())
+        self.cb_watch = QCheckBox(_("Watch the resource directory for changes"))
+        self.cb_watch.setChecked(self.config.cfg_watch_resources())
         # self.language_choice = QLabel(_("Interface Language"), self)
         self.init_ui()
 
@@ -60,6 +66,14 @@ class ConfigFrame(QFrame):
         grid1.addWidget(self.le_urlprefix, 4, 2)
         grid1.addItem(QSpacerItem(87, 21), 4, 3)
 
+        self.sb_hash_workers.setSpecialValueText(_("all cpu's"))
+        self.sb_hash_workers.setToolTip(_("Number of parallel workers used for computing checksums"))
+        grid1.addWidget(QLabel(_("Checksum workers")), 5, 1)
+        grid1.addWidget(self.sb_hash_workers, 5, 2)
+
+        self.cb_watch.setToolTip(_("Keep track of changed resources, so that a changelist only looks at those"))
+        grid1.addWidget(self.cb_watch, 6, 2)
+
         vert.addLayout(grid1)
 
         strat_vert = QVBoxLayout()
@@ -93,6 +107,8 @@ class ConfigFrame(QFrame):
         self.config.set_cfg_sourcedesc(self.le_sourcedesc.text())
         self.config.set_cfg_urlprefix(self.le_urlprefix.text())
         self.config.set_cfg_strategy(self.strat_group.checkedId())
+        self.config.set_cfg_hash_workers(self.sb_hash_workers.value())
+        self.config.set_cfg_watch_resources(self.cb_watch.isChecked())
         self.config.persist()
 
     def pb_resourcedir_clicked(self):
@@ -1,53 +1,52 @@
 #! /usr/bin/env python3
 # -*- coding: utf-8 -*-
 
-import datetime, logging
-import operator
+import datetime, logging, time
 import os
 import webbrowser
-import zipfile
+from collections import OrderedDict
 from pathlib import PurePath
 
 from PyQt5.QtCore import QAbstractTableModel, Qt
-from PyQt5.QtGui import QFont
+from PyQt5.QtGui import QFont, QFontMetrics
 from PyQt5.QtWidgets import QFrame, QPushButton, QHBoxLayout, QVBoxLayout, QLabel, QDialog, QFileSystemModel, QTreeView, QAbstractItemView, \
-    QTableView, QSplitter, QMessageBox
+    QTableView, QSplitter, QMessageBox, QProgressBar, QComboBox, QInputDialog
 #from signal import *
 from view.config_frame import Configuration
-#from blaa.ehri_client import ResourceSyncPublisherClient
-from resync_publisher.ehri_client import ResourceSyncPublisherClient
-#from resync_a.resource_list_builder import ResourceListBuilder, Resource
+from view.publish_job import PublishJob
+from view.resource_watcher import ResourceWatcher
+from model.dir_index import DirectoryIndex, SelectionRules
+from model.manual_sets import ManualSet, ManualSetError, load_manual_sets, save_manual_sets
+from model.metadata import FileMetadata, collect_record_metadata, iter_path_records, COL_PATH
+from model.publisher import Publisher, FilenameFilter, STAGE_HASHING
+from model.rule_sets import RuleError, load_rule_sets
+from model.watcher import DirtyJournal
 
 
-CHANGELIST_XML = "changelist.xml"
-RESOURCELIST_XML = "resourcelist.xml"
-RESOURCESYNC_ZIP = "resourcesync.zip"
-
-def file_details(s):
-    l = list()
-    for path in s:
-        l.append([path, os.path.basename(path), os.path.getsize(path), os.path.getmtime(path)])
-    return l
+def format_bytes(count):
+    for unit in ["B", "KB", "MB", "GB"]:
+        if count < 1024:
+            return "%.1f %s" % (count, unit)
+        count /= 1024
+    return "%.1f TB" % count
 
 
 class ExportFrame(QFrame):
 
-    def get_existing_resync_file(self, resync_file):
-        # get the existing resync_file as file URI.
-        #return 'file://'+self.config.get_cfg_resync_dir()+'/'+resync_file
-        p = PurePath(self.config.cfg_resync_dir(), resync_file)
-        return p.as_uri()
-
     def __init__(self, parent):
         super().__init__(parent)
         self.logger = logging.getLogger(__name__)
         self.config = Configuration()
-        self.filenames = []
-        self.data = ''
+        self.selection = {}     # rules of the accepted explorer selection, normalized path -> include
+        self.job = None
+        self.watcher = None
+        self.explorer = None    # created when it is first opened
+        self.total_rows = []
+        self.set_rows = []
 
         # left part of frame
         header_left = [_("Relative Path"), _("Name"), _("Size"), _("Date Modified")]
-        self.file_model = FileTableModel(self, header_left, [])
+        self.file_model = FileTableModel(self, header_left, None)
 
         self.file_view = QTableView()
         self.file_view.setModel(self.file_model)
@@ -76,7 +75,8 @@ class ExportFrame(QFrame):
         self.pb_select.clicked.connect(self.show_explorer)
 
         # right part of frame
-        header_right = [_("Set Name"), _("Files"), _("New Files"), _("Update Files"), _("Unchanged Files")]
+        header_right = [_("Set Name"), _("Files"), _("New Files"), _("Update Files"), _("Unchanged Files"),
+                        _("Deleted Files")]
         self.overview_model = OverviewTableModel(self, header_right, [])
         self.overview = QTableView()
         self.overview.setModel(self.overview_model)
@@ -91,6 +91,18 @@ class ExportFrame(QFrame):
         self.pb_zip = QPushButton(_("Create Zip"))
         self.pb_zip.clicked.connect(self.pb_zip_clicked)
 
+        self.pb_dump = QPushButton(_("Resource Dump"))
+        self.pb_dump.clicked.connect(self.pb_dump_clicked)
+
+        self.pb_cancel = QPushButton(_("Cancel"))
+        self.pb_cancel.clicked.connect(self.pb_cancel_clicked)
+        self.pb_cancel.setEnabled(False)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.lb_progress = QLabel("")
+        self.lb_progress.setFont(QFont('SansSerif', 10))
+
         self.__init_ui__()
 
     def __init_ui__(self):
@@ -105,11 +117,18 @@ class ExportFrame(QFrame):
         vbox.addWidget(splitter, 1)
         vbox.addWidget(self.lb_path)
 
+        progress_box = QHBoxLayout()
+        progress_box.addWidget(self.progress_bar, 1)
+        progress_box.addWidget(self.lb_progress)
+        vbox.addLayout(progress_box)
+
         button_box = QHBoxLayout()
         button_box.addWidget(self.pb_select)
         button_box.addStretch(1)
         button_box.addWidget(self.pb_publish)
         button_box.addWidget(self.pb_zip)
+        button_box.addWidget(self.pb_dump)
+        button_box.addWidget(self.pb_cancel)
         vbox.addLayout(button_box)
 
         self.setLayout(vbox)
@@ -132,98 +151,184 @@ class ExportFrame(QFrame):
             self.lb_path.setText("")
 
     def pb_zip_clicked(self):
-        path = os.path.join(os.path.dirname(self.config.cfg_resync_dir()), RESOURCESYNC_ZIP)
-        self.logger.debug("Creating zip file at %s", path)
-        ziph = zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
-        filename_filter = FilenameFilter()
-        src = self.config.cfg_resync_dir()
-        abs_src = os.path.abspath(src)
-        for dirname, subdirs, files in os.walk(src):
-            for filename in files:
-                if filename_filter.accept(filename):
-                    absname = os.path.abspath(os.path.join(dirname, filename))
-                    arcname = absname[len(abs_src) + 1:]
-                    self.logger.debug('zipping %s as %s' % (os.path.join(dirname, filename),
-                                            arcname))
-                    ziph.write(absname, arcname)
-
-        ziph.close()
-        self.logger.debug("Ready creating zip file at %s", path)
+        self.__start_job__(lambda progress: Publisher(self.config, progress).create_zip(), self.zip_finished)
+
+    def zip_finished(self, result):
         msgbox = QMessageBox()
-        msgbox.setText("Zip file created: \n" + path)
+        msgbox.setText("Zip file created: \n" + result.path)
         msgbox.exec_()
 
+    def __check_selection__(self):
+        # False, with a message, if nothing is selected; publishing nothing would replace the published state
+        if self.selection and len(self.file_model.metadata):
+            return True
+        QMessageBox.warning(self, _("Error"), _("No resources selected"))
+        return False
+
+    def pb_dump_clicked(self):
+        # the selected files, streamed from the rules into the packages
+        if not self.__check_selection__():
+            return
+        selection = self.selection
+        total = len(self.file_model.metadata)
+        self.__start_job__(lambda progress: Publisher(self.config, progress)
+                           .publish_resource_dump(iter_path_records(selection, FilenameFilter()), total),
+                           self.dump_finished)
+
+    def dump_finished(self, result):
+        msgbox = QMessageBox()
+        msgbox.setText(_("Resource dump created: ") + "\n" + result.path)
+        msgbox.exec_()
+
+    def pb_cancel_clicked(self):
+        if self.job:
+            self.pb_cancel.setEnabled(False)
+            self.job.cancel()
+
+    def __start_job__(self, task, on_finished):
+        # run task in a PublishJob, on_finished receives the result of the task
+        self.pb_publish.setEnabled(False)
+        self.pb_zip.setEnabled(False)
+        self.pb_dump.setEnabled(False)
+        self.pb_select.setEnabled(False)
+        self.pb_cancel.setEnabled(True)
+        self.progress_bar.setValue(0)
+        self.progress_bar.setVisible(True)
+
+        self.job = PublishJob(self, task)
+        self.job.progress_changed.connect(self.job_progress_changed)
+        self.job.job_finished.connect(on_finished)
+        self.job.job_failed.connect(self.job_failed)
+        self.job.job_cancelled.connect(lambda: self.lb_progress.setText(_("cancelled")))
+        self.job.finished.connect(self.__job_done__)
+        self.job.start()
+
+    def __job_done__(self):
+        self.job = None
+        self.pb_publish.setEnabled(True)
+        self.pb_zip.setEnabled(True)
+        self.pb_dump.setEnabled(True)
+        self.pb_select.setEnabled(True)
+        self.pb_cancel.setEnabled(False)
+        self.progress_bar.setVisible(False)
+
+    def job_progress_changed(self, state):
+        # state: a view.publish_job.ProgressState
+        self.progress_bar.setValue(state.percentage)
+        text = "%s: %d/%d, %s, %s/s" % (_(state.stage), state.files_scanned, state.total_files,
+                                         format_bytes(state.bytes_hashed), format_bytes(state.throughput))
+        if state.eta is not None:
+            text += ", " + _("ETA") + " " + str(datetime.timedelta(seconds=int(state.eta)))
+        self.lb_progress.setText(text)
+        if state.stage == STAGE_HASHING:
+            # only the total is known before the publish finishes, the label shows the files scanned so far
+            self.overview_model.setNewData([(_("total"), str(state.total_files), "", "", "", "")] + self.set_rows)
+
+    def job_failed(self, message):
+        self.lb_progress.setText("")
+        QMessageBox.warning(self, _("Error"), message)
+
     def show(self):
-        self.explorer = Explorer(self)
+        if self.watcher is None and self.config.cfg_watch_resources():
+            self.watcher = ResourceWatcher(self, self.config.cfg_resource_dir(),
+                                           DirtyJournal(self.config.cfg_resync_dir()), FilenameFilter(),
+                                           self.config.cfg_watch_interval())
+            self.watcher.start()
+
+    def stop_watching(self):
+        if self.watcher is not None:
+            self.watcher.stop()
+            self.watcher = None
 
     def show_explorer(self):
+        # the explorer, and the crawl of the resource dir by its file system model, start on first use
+        if self.explorer is None or self.explorer.resource_dir != self.config.cfg_resource_dir():
+            self.explorer = Explorer(self)
         result = self.explorer.exec_()
         if result:
-            self.filenames = self.explorer.selected_file_set()
-            self.data = ",".join(self.filenames)
-            self.file_model.setNewData(file_details(self.filenames))
+            self.selection = self.explorer.selected_rules()
+            records = iter_path_records(self.selection, FilenameFilter())
+            self.file_model.setNewData(collect_record_metadata(records))
             self.file_view.selectionModel().clear()
             self.lb_path.setText("")
 
     def pb_publish_clicked(self):
-            if self.config.cfg_strategy() == 0:
-                self.resync_resource_list()
-            else:
-                self.resync_change_list(self.filenames)
-
-    def resync_resource_list(self):
-        c = ResourceSyncPublisherClient(checksum=True)
-        args = [self.config.cfg_urlprefix(), self.config.cfg_resource_dir()]
-        c.set_mappings(args)
-        rl = c.build_resource_list(paths=self.data)
-        overview_data = [(_("total"), str(len(rl)), str(len(rl)), str(0), str(0))]
-        self.overview_model.setNewData(overview_data)
-        rl_path = os.path.join(self.config.cfg_resync_dir(), RESOURCELIST_XML)
-        rl.write(rl_path)
-        # webbrowser.open_new(PurePath(rl_path).as_uri())
-
-
-    def resync_change_list(self, filenames):
-        c = ResourceSyncPublisherClient(checksum=True)
-        args = [self.config.cfg_urlprefix(), self.config.cfg_resource_dir()]
-        c.set_mappings(args)
-        cl_path = os.path.join(self.config.cfg_resync_dir(), CHANGELIST_XML)
-        cl = c.calculate_changelist(paths=self.data, resource_sitemap=self.get_existing_resync_file(RESOURCELIST_XML),
-                                    changelist_sitemap=self.get_existing_resync_file(CHANGELIST_XML),
-                                    outfile=cl_path)
-        # the calculating should be done in resync_a, not in the GUI
-        file_count = len(filenames)
-        created_count = 0
-        updated_count = 0
-
-        for resource in cl.resources:
-            if resource.change == "created":
-                created_count += 1
-            elif resource.change == "updated":
-                updated_count += 1
-
-        # this is not the correct computation..
-        unchanged_count = file_count - created_count - updated_count
-
-        overview_data = [(_("total"), str(file_count), str(created_count), str(updated_count), str(unchanged_count))]
-        self.overview_model.setNewData(overview_data)
-
-        # webbrowser.open_new(PurePath(cl_path).as_uri())
+        # the selected files are streamed from the rules while publishing; the file table lists them already,
+        # its length is the total of the progress
+        if not self.__check_selection__():
+            return
+        selection = self.selection
+        total = len(self.file_model.metadata)
+        try:
+            rule_sets = load_rule_sets(self.config.cfg_rule_sets_file())
+        except RuleError as err:
+            QMessageBox.warning(self, _("Error"), str(err))
+            rule_sets = []
+        # files modified in place are only seen by a rescan, the journal is used after it
+        scanned_since = None
+        if self.watcher is not None:
+            scanned_since = time.time()
+            self.watcher.rescan()
+        self.__start_job__(lambda progress: Publisher(self.config, progress, rule_sets)
+                           .publish(iter_path_records(selection, FilenameFilter()), total, scanned_since),
+                           self.publish_finished)
+
+    def set_counts_changed(self, counts):
+        # counts: list of model.rule_sets.SetCount, as counted on the Rule-based Sets tab
+        self.set_rows = [(count.name, str(count.files), "", "", "", "") for count in counts]
+        self.overview_model.setNewData(self.total_rows + self.set_rows)
+
+    def publish_finished(self, result):
+        # result: a model.publisher.PublishResult
+        if result.sitemap_count > 1:
+            self.lb_progress.setText("%s: %d %s" % (os.path.basename(result.path), result.sitemap_count,
+                                                    _("sitemaps")))
+        else:
+            self.lb_progress.setText("")
+        self.total_rows = [(_("total"), str(result.file_count), str(result.created_count),
+                            str(result.updated_count), str(result.unchanged_count), str(result.deleted_count))]
+        self.set_rows = [(changes.name, str(changes.files), str(changes.created), str(changes.updated),
+                          str(changes.unchanged), str(changes.deleted)) for changes in result.set_changes]
+        self.overview_model.setNewData(self.total_rows + self.set_rows)
+        # webbrowser.open_new(PurePath(result.path).as_uri())
 
 
 class FileTableModel(QAbstractTableModel):
+    # Backed by the columns of a model.metadata.FileMetadata. Rows are handed to the view in batches
+    # (canFetchMore/fetchMore), display strings are computed on first paint and cached for a bounded
+    # number of rows.
+
+    FETCH_SIZE = 1000
+    CACHE_SIZE = 4096
+    SAMPLE_SIZE = 200
 
     def __init__(self, parent, header, data, *args):
         QAbstractTableModel.__init__(self, parent, *args)
         self.header = header
-        self.data = data
+        self.metadata = FileMetadata()
+        self.order = []                         # row -> index in metadata, a model.metadata.SortOrder
+        self.loaded = 0                         # rows handed to the view so far
+        self.display_cache = OrderedDict()      # index in metadata -> display strings
+        self.resource_dir = ""
+        if data:
+            self.setNewData(data)
 
     def rowCount(self, parent):
-        return len(self.data)
+        return 0 if parent.isValid() else self.loaded
 
     def columnCount(self, parent):
         return len(self.header)
 
+    def canFetchMore(self, parent):
+        return not parent.isValid() and self.loaded < len(self.order)
+
+    def fetchMore(self, parent):
+        count = min(self.FETCH_SIZE, len(self.order) - self.loaded)
+        if count > 0:
+            self.beginInsertRows(parent, self.loaded, self.loaded + count - 1)
+            self.loaded += count
+            self.endInsertRows()
+
     def headerData(self, col, orientation, role):
         if orientation == Qt.Horizontal and role == Qt.DisplayRole:
             return self.header[col]
@@ -235,36 +340,59 @@ class FileTableModel(QAbstractTableModel):
         if role == Qt.TextAlignmentRole and index.column() >= 2:
             return Qt.AlignRight + Qt.AlignVCenter
         # if role == Qt.ToolTipRole:
-        #     return self.data[index.row()][0] # full path
+        #     return self.full_path(index.row())
 
         if role != Qt.DisplayRole:
             return None
 
         # Qt.DisplayRole
-        d = self.data[index.row()][index.column()]
-        if index.column() == 0:
-            d = os.path.relpath(os.path.dirname(d), self.parent().config.cfg_resource_dir())
-        elif index.column() == 3:
-            d = str(datetime.datetime.fromtimestamp(d))
-        return d
+        return self.display_row(self.order[index.row()])[index.column()]
+
+    def display_row(self, i):
+        # display strings of metadata index i
+        row = self.display_cache.get(i)
+        if row is None:
+            path = self.metadata.paths[i]
+            row = (os.path.relpath(os.path.dirname(path), self.resource_dir), os.path.basename(path),
+                   str(self.metadata.sizes[i]), str(datetime.datetime.fromtimestamp(self.metadata.mtimes[i])))
+            self.display_cache[i] = row
+            if len(self.display_cache) > self.CACHE_SIZE:
+                self.display_cache.popitem(last=False)
+        else:
+            self.display_cache.move_to_end(i)
+        return row
 
     def sort(self, col, order):
         """sort table by given column number col"""
         self.layoutAboutToBeChanged.emit()
-        self.data = sorted(self.data, key=operator.itemgetter(col))
-        if order == Qt.DescendingOrder:
-            self.data.reverse()
+        self.order = self.metadata.sort_order(col, descending=(order == Qt.DescendingOrder))
         self.layoutChanged.emit()
 
-    def setNewData(self, data):
-        self.layoutAboutToBeChanged.emit()
-        self.data = sorted(data, key=operator.itemgetter(0))
-        self.layoutChanged.emit()
-        for index, item in enumerate(self.header):
-            self.parent().file_view.resizeColumnToContents(index)
+    def setNewData(self, metadata):
+        # metadata: a model.metadata.FileMetadata
+        self.beginResetModel()
+        self.metadata = metadata
+        self.resource_dir = self.parent().config.cfg_resource_dir()
+        self.order = metadata.sort_order(COL_PATH)
+        self.loaded = min(self.FETCH_SIZE, len(self.order))
+        self.display_cache.clear()
+        self.endResetModel()
+        self.resize_columns()
+
+    def resize_columns(self):
+        # size columns to the widest of a sample of rows instead of measuring every row
+        if not self.order:
+            return
+        view = self.parent().file_view
+        metrics = QFontMetrics(view.font())
+        step = max(1, len(self.order) // self.SAMPLE_SIZE)
+        sample = [self.display_row(self.order[row]) for row in range(0, len(self.order), step)]
+        for col, title in enumerate(self.header):
+            width = max(metrics.width(row[col]) for row in sample)
+            view.setColumnWidth(col, max(width, metrics.width(title)) + 20)
 
     def full_path(self, row):
-        return self.data[row][0]
+        return self.metadata.paths[self.order[row]]
 
 
 class OverviewTableModel(QAbstractTableModel):
@@ -298,19 +426,13 @@ class OverviewTableModel(QAbstractTableModel):
 
     def setNewData(self, data):
         self.layoutAboutToBeChanged.emit()
-        self.data = sorted(data, key=operator.itemgetter(0))
+        # rows are shown in the order given: the total first, then the sets
+        self.data = list(data)
         self.layoutChanged.emit()
         for index, item in enumerate(self.header):
             self.parent().file_view.resizeColumnToContents(index)
 
 
-# so much for duck typing..
-class FilenameFilter(object):
-
-    def accept(self, filename):
-        return not filename.startswith('.')
-
-
 class Explorer(QDialog):
 
     def __init__(self, parent, window_title=_("Select resources"),
@@ -321,10 +443,13 @@ class Explorer(QDialog):
         self.setSizeGripEnabled(True)
         self.setWindowTitle(window_title)
         self.subtitle = subtitle
-        self.file_set = set()
         self.config = Configuration()
-        self.__init_ui__()
+        self.resource_dir = self.config.cfg_resource_dir()
         self.filename_filter = FilenameFilter()
+        self.selection = SelectionRules()   # counted once the index job has built the directory index
+        self.index_job = None
+        self.__init_ui__()
+        self.__start_index_job__()
         #self.show()
 
     def __init_ui__(self):
@@ -332,7 +457,7 @@ class Explorer(QDialog):
         vert = QVBoxLayout(self)
         vert.setContentsMargins(0, 0, 0, 0)
 
-        resource_dir = self.config.cfg_resource_dir()
+        resource_dir = self.resource_dir
 
         p_top = QVBoxLayout()
         lb_subtitle = QLabel(self.subtitle)
@@ -341,6 +466,7 @@ class Explorer(QDialog):
 
         self.model = QFileSystemModel()
         self.model.setRootPath(resource_dir)
+        self.model.directoryLoaded.connect(self.directory_loaded)
 
         self.view = QTreeView()
         self.view.setModel(self.model)
@@ -356,7 +482,7 @@ class Explorer(QDialog):
         lb_resource = QLabel(_("resource dir") + ": " + resource_dir)
         lb_resource.setContentsMargins(10, 0, 10, 0)
 
-        self.lb_selection_count = QLabel(str(self.selected_file_count()) + " " + _("resources selected"))
+        self.lb_selection_count = QLabel()
         self.lb_selection_count.setContentsMargins(10, 0, 10, 0)
 
         p_info.addWidget(self.lb_selection_count)
@@ -369,8 +495,19 @@ class Explorer(QDialog):
 
         self.pb_deselect = QPushButton(_("Deselect all"))
         self.pb_deselect.clicked.connect(self.pb_deselect_clicked)
-        self.pb_deselect.setEnabled(self.selected_file_count() > 0)
         p_bottom.addWidget(self.pb_deselect)
+        self.__update_count__()
+
+        # manual sets: selections saved as their include/exclude rules
+        self.cb_sets = QComboBox()
+        self.pb_load_set = QPushButton(_("Load set"))
+        self.pb_load_set.clicked.connect(self.pb_load_set_clicked)
+        self.pb_save_set = QPushButton(_("Save as set..."))
+        self.pb_save_set.clicked.connect(self.pb_save_set_clicked)
+        self.__fill_sets__()
+        p_bottom.addWidget(self.cb_sets)
+        p_bottom.addWidget(self.pb_load_set)
+        p_bottom.addWidget(self.pb_save_set)
 
         p_bottom.addStretch(1)
         self.pb_ok = QPushButton(_("OK"))
@@ -393,30 +530,60 @@ class Explorer(QDialog):
         self.view.setColumnWidth(2, width/6)
         self.view.setColumnWidth(3, width/6)
 
+    def __manual_sets__(self):
+        try:
+            return load_manual_sets(self.config.cfg_manual_sets_file())
+        except ManualSetError as err:
+            self.logger.warning("Cannot read manual sets: %s", err)
+            return []
+
+    def __fill_sets__(self):
+        self.cb_sets.clear()
+        self.cb_sets.addItems([manual_set.name for manual_set in self.__manual_sets__()])
+        self.pb_load_set.setEnabled(self.cb_sets.count() > 0)
+
+    def pb_load_set_clicked(self):
+        for manual_set in self.__manual_sets__():
+            if manual_set.name == self.cb_sets.currentText():
+                self.view.selectionModel().clear()
+                self.selection.set_rules(manual_set.rules)
+                self.__update_count__()
+
+    def pb_save_set_clicked(self):
+        name, ok = QInputDialog.getText(self, _("Save as set"), _("Set Name"), text=self.cb_sets.currentText())
+        if not ok or not name.strip():
+            return
+        manual_sets = [manual_set for manual_set in self.__manual_sets__() if manual_set.name != name.strip()]
+        manual_sets.append(ManualSet(name.strip(), self.config.cfg_resource_dir(), dict(self.selection.rules)))
+        save_manual_sets(self.config.cfg_manual_sets_file(), manual_sets)
+        self.__fill_sets__()
+        self.cb_sets.setCurrentText(name.strip())
+
     def __persist__(self):
         # persist properties of the explorer
         self.config.set_explorer_width(self.width())
         self.config.set_explorer_height(self.height())
         self.config.persist()
 
-    def __compute_filenames__(self, item_selection):
+    def __start_index_job__(self):
+        # the directory index is built off the gui thread and kept up to date by directory_loaded
+        resource_dir, filename_filter = self.resource_dir, self.filename_filter
+        self.index_job = PublishJob(self, lambda progress: DirectoryIndex(resource_dir, filename_filter))
+        self.index_job.job_finished.connect(self.index_built)
+        self.index_job.job_failed.connect(
+            lambda message: self.logger.warning("Cannot index %s: %s", resource_dir, message))
+        self.index_job.start()
+
+    def index_built(self, dir_index):
+        # ignore an index built with a filename filter that was replaced in the meantime
+        if dir_index.filename_filter is self.filename_filter:
+            self.selection.set_index(dir_index)
+            self.__update_count__()
+
+    def __selected_paths__(self, item_selection):
         # item_selection: a QItemSelection
-        # return corresponding absolute filenames as a set, including filenames in underlying folders
-        s = set()
-        for index in item_selection.indexes():
-            # we have an index for each column in the model
-            if index.column() == 0:
-                path = index.model().filePath(index)
-                if os.path.isdir(path):
-                    for root, directories, filenames in os.walk(path):
-                        for filename in filenames:
-                            if self.filename_filter.accept(filename):
-                                s.add(os.path.join(root, filename))
-                elif os.path.isfile(path):
-                    s.add(path)
-                else:
-                    self.logger.warn("isUnknownThing", path)
-        return s
+        # we have an index for each column in the model
+        return [index.model().filePath(index) for index in item_selection.indexes() if index.column() == 0]
 
     def showEvent(self, QShowEvent):
         #self.pb_ok.setFocus()
@@ -425,22 +592,36 @@ class Explorer(QDialog):
     def set_filename_filter(self, filename_filter):
         # set the FilenameFilter
         self.filename_filter = filename_filter
+        self.selection.set_index(None)
+        self.__update_count__()
+        self.__start_index_job__()
 
     def selected_file_count(self):
-        return len(self.file_set)
+        # None while the directory index is being built
+        return self.selection.count()
 
-    def selected_file_set(self):
-        return frozenset(self.file_set)
+    def selected_rules(self):
+        # the rules of the selection; files are listed by whoever walks them, see model.metadata.iter_path_records
+        return dict(self.selection.rules)
 
     def selection_changed(self, selected, deselected):
         # selected, deselected: PyQt5.QtCore.QItemSelection
-        selected_filenames = self.__compute_filenames__(selected)
-        self.file_set.update(selected_filenames)
-        deselected_filenames = self.__compute_filenames__(deselected)
-        self.file_set.difference_update(deselected_filenames)
-
-        self.pb_deselect.setEnabled(self.selected_file_count() > 0)
-        self.lb_selection_count.setText(str(self.selected_file_count()) + " " + _("resources selected"))
+        for path in self.__selected_paths__(selected):
+            self.selection.include(path)
+        for path in self.__selected_paths__(deselected):
+            self.selection.exclude(path)
+        self.__update_count__()
+
+    def directory_loaded(self, path):
+        # QFileSystemModel (re)loaded the directory at path
+        if self.selection.index is not None:
+            self.selection.refresh(path)
+            self.__update_count__()
+
+    def __update_count__(self):
+        count = self.selected_file_count()
+        self.pb_deselect.setEnabled(len(self.selection.rules) > 0)
+        self.lb_selection_count.setText(("..." if count is None else str(count)) + " " + _("resources selected"))
 
     def item_expanded(self, index):
         # index: a QModelIndex
@@ -452,6 +633,8 @@ class Explorer(QDialog):
 
     def pb_deselect_clicked(self):
         self.view.selectionModel().clear()
+        self.selection.clear()
+        self.__update_count__()
 
     def hideEvent(self, QHideEvent):
         self.__persist__()
@@ -0,0 +1,103 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+
+from PyQt5.QtWidgets import QFrame, QHBoxLayout, QVBoxLayout, QLabel, QMessageBox, QPushButton, QTableView, \
+    QAbstractItemView
+from model.config import Configuration
+from model.manual_sets import ManualSetError, iter_set_files, load_manual_sets, save_manual_sets
+from model.publisher import FilenameFilter
+from view.publish_job import PublishJob
+from view.statistics_frame import RowTableModel
+
+# Lists the manual sets saved from the Explorer. Loading them only reads their rules; files are counted
+# on request by streaming through the directories each set includes.
+
+
+class ManualSetsFrame(QFrame):
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.config = Configuration()
+        self.manual_sets = []
+        self.file_counts = {}       # set name -> number of files
+        self.job = None
+
+        self.set_model = RowTableModel(self, [_("Set Name"), _("Root"), _("Rules"), _("Files")])
+        self.set_view = QTableView()
+        self.set_view.setModel(self.set_model)
+        self.set_view.setAlternatingRowColors(True)
+        self.set_view.setShowGrid(False)
+        self.set_view.verticalHeader().setVisible(False)
+        self.set_view.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.set_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+        self.lb_status = QLabel(_("Sets are saved from the Explorer of the Export tab"))
+        self.pb_remove = QPushButton(_("Remove"))
+        self.pb_remove.clicked.connect(self.pb_remove_clicked)
+        self.pb_count = QPushButton(_("Count"))
+        self.pb_count.clicked.connect(self.pb_count_clicked)
+        self.__init_ui__()
+
+    def __init_ui__(self):
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.set_view, 1)
+        button_box = QHBoxLayout()
+        button_box.addWidget(self.lb_status, 1)
+        button_box.addWidget(self.pb_remove)
+        button_box.addWidget(self.pb_count)
+        vbox.addLayout(button_box)
+        self.setLayout(vbox)
+
+    def show(self):
+        super().show()
+        try:
+            self.manual_sets = load_manual_sets(self.config.cfg_manual_sets_file())
+        except ManualSetError as err:
+            QMessageBox.warning(self, _("Error"), str(err))
+            self.manual_sets = []
+        self.__fill__()
+
+    def __fill__(self):
+        self.set_model.setNewData([(manual_set.name, manual_set.root, str(len(manual_set.rules)),
+                                    str(self.file_counts.get(manual_set.name, "")))
+                                   for manual_set in self.manual_sets])
+        self.set_view.resizeColumnsToContents()
+
+    def pb_remove_clicked(self):
+        rows = self.set_view.selectionModel().selectedRows()
+        if rows:
+            del self.manual_sets[rows[0].row()]
+            save_manual_sets(self.config.cfg_manual_sets_file(), self.manual_sets)
+            self.__fill__()
+
+    def pb_count_clicked(self):
+        if self.job:
+            return
+        manual_sets = list(self.manual_sets)
+
+        def count(progress):
+            counts = {}
+            for manual_set in manual_sets:
+                counts[manual_set.name] = 0
+                for _path in iter_set_files(manual_set, FilenameFilter()):
+                    counts[manual_set.name] += 1
+                    progress.check_cancelled()
+            return counts
+
+        self.pb_count.setEnabled(False)
+        self.job = PublishJob(self, count)
+        self.job.job_finished.connect(self.count_finished)
+        self.job.job_failed.connect(lambda message: QMessageBox.warning(self, _("Error"), message))
+        self.job.finished.connect(self.__job_done__)
+        self.job.start()
+
+    def count_finished(self, counts):
+        self.file_counts = counts
+        self.__fill__()
+
+    def __job_done__(self):
+        self.job = None
+        self.pb_count.setEnabled(True)
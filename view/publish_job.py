@@ -0,0 +1,49 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+from collections import namedtuple
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from model.progress import Progress, PublishCancelled
+
+# Runs publish and zip tasks off the Qt event loop. Progress is reported through signals, which Qt
+# delivers in the gui thread.
+
+ProgressState = namedtuple("ProgressState", ["stage", "files_scanned", "total_files", "bytes_hashed",
+                                             "throughput", "eta", "percentage"])
+
+
+class PublishJob(QThread):
+
+    progress_changed = pyqtSignal(object)   # ProgressState
+    job_finished = pyqtSignal(object)       # result of the task
+    job_failed = pyqtSignal(str)
+    job_cancelled = pyqtSignal()
+
+    def __init__(self, parent, task):
+        # task: a callable taking a model.progress.Progress
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.task = task
+        self.progress = Progress(listener=self.__progress_listener__)
+
+    def __progress_listener__(self, progress):
+        self.progress_changed.emit(ProgressState(progress.stage, progress.files_scanned, progress.total_files,
+                                                 progress.bytes_hashed, progress.throughput(), progress.eta(),
+                                                 progress.percentage()))
+
+    def cancel(self):
+        self.progress.cancel()
+
+    def run(self):
+        try:
+            result = self.task(self.progress)
+        except PublishCancelled:
+            self.logger.info("Job cancelled")
+            self.job_cancelled.emit()
+        except Exception as err:
+            self.logger.exception("Job failed")
+            self.job_failed.emit(str(err))
+        else:
+            self.job_finished.emit(result)
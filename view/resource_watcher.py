@@ -0,0 +1,105 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os, time
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QTimer
+from model.watcher import list_directory, CREATED, MODIFIED, DELETED, REQUEST_INTERVAL
+
+# Watches the resource dir and records changes in a model.watcher.DirtyJournal. Directories are watched
+# with QFileSystemWatcher (inotify on Linux); a periodic rescan of all directories catches what the
+# platform does not report, such as files modified in place. A publisher can request a rescan.
+
+
+class ResourceWatcher(QObject):
+
+    def __init__(self, parent, resource_dir, journal, filename_filter, interval):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.resource_dir = resource_dir
+        self.journal = journal
+        self.filename_filter = filename_filter
+        self.listings = {}      # directory -> {filename: (size, mtime)}
+        self.children = {}      # directory -> set of its subdirectories
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.directory_changed)
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval * 1000)
+        self.timer.timeout.connect(self.rescan)
+        self.request_timer = QTimer(self)
+        self.request_timer.setInterval(REQUEST_INTERVAL * 1000)
+        self.request_timer.timeout.connect(self.check_scan_request)
+
+    def start(self):
+        self.journal.start()
+        self.__add_directory__(self.resource_dir, record=False)
+        self.timer.start()
+        self.request_timer.start()
+        self.logger.info("Watching %d directories under %s", len(self.listings), self.resource_dir)
+
+    def stop(self):
+        self.timer.stop()
+        self.request_timer.stop()
+        directories = self.fs_watcher.directories()
+        if directories:
+            self.fs_watcher.removePaths(directories)
+        self.listings.clear()
+        self.children.clear()
+        self.journal.stop()
+
+    def __add_directory__(self, path, record=True):
+        files, subdirs = list_directory(path, self.filename_filter)
+        self.listings[path] = files
+        self.children[path] = set(subdirs)
+        self.fs_watcher.addPath(path)
+        if record:
+            for filename in files:
+                self.journal.record(CREATED, os.path.join(path, filename))
+        for subdir in subdirs:
+            self.__add_directory__(subdir, record)
+
+    def __remove_directory__(self, path):
+        for subdir in self.children.pop(path, ()):
+            self.__remove_directory__(subdir)
+        if path in self.listings:
+            for filename in self.listings.pop(path):
+                self.journal.record(DELETED, os.path.join(path, filename))
+            self.fs_watcher.removePath(path)
+
+    def directory_changed(self, path):
+        if path not in self.listings:
+            return
+        if not os.path.isdir(path):
+            self.children.get(os.path.dirname(path), set()).discard(path)
+            self.__remove_directory__(path)
+            return
+        old = self.listings[path]
+        files, subdirs = list_directory(path, self.filename_filter)
+        for filename, signature in files.items():
+            previous = old.get(filename)
+            if previous is None:
+                self.journal.record(CREATED, os.path.join(path, filename))
+            elif previous != signature:
+                self.journal.record(MODIFIED, os.path.join(path, filename))
+        for filename in old.keys() - files.keys():
+            self.journal.record(DELETED, os.path.join(path, filename))
+        self.listings[path] = files
+
+        subdirs = set(subdirs)
+        for subdir in self.children[path] - subdirs:
+            self.__remove_directory__(subdir)
+        self.children[path] = subdirs
+        for subdir in subdirs:
+            if subdir not in self.listings:
+                self.__add_directory__(subdir)
+
+    def rescan(self):
+        # a full scan, it also finds the files that were modified in place
+        started = time.time()
+        for path in list(self.listings):
+            self.directory_changed(path)
+        self.journal.scanned(started)
+
+    def check_scan_request(self):
+        if self.journal.take_scan_request():
+            self.rescan()
@@ -0,0 +1,175 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QFrame, QGridLayout, QHBoxLayout, QVBoxLayout, QLabel, QLineEdit, QListWidget, \
+    QMessageBox, QPlainTextEdit, QPushButton, QTableView
+from model.config import Configuration
+from model.publisher import FilenameFilter
+from model.rule_sets import RuleEngine, RuleError, RuleSet, format_rule, load_rule_sets, parse_rule, \
+    save_rule_sets
+from view.export_frame import format_bytes
+from view.publish_job import PublishJob
+from view.statistics_frame import RowTableModel
+
+tt_rules = _("One rule per line, a file is in the set if it matches all rules:\n"
+             "glob *.pdf\nregex ^letters/\\d{4}\nprefix letters/1900\nsize > 1M\nmodified < 30d\n"
+             "not glob *.tmp")
+
+
+class RuleSetsFrame(QFrame):
+
+    set_counts_changed = pyqtSignal(object)     # list of model.rule_sets.SetCount
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.config = Configuration()
+        self.rule_sets = []
+        self.current = -1
+        self.job = None
+
+        self.lw_sets = QListWidget()
+        self.lw_sets.currentRowChanged.connect(self.set_selected)
+        self.pb_add = QPushButton(_("Add"))
+        self.pb_add.clicked.connect(self.pb_add_clicked)
+        self.pb_remove = QPushButton(_("Remove"))
+        self.pb_remove.clicked.connect(self.pb_remove_clicked)
+
+        self.le_name = QLineEdit()
+        self.te_rules = QPlainTextEdit()
+        self.te_rules.setToolTip(tt_rules)
+        self.lb_help = QLabel(tt_rules)
+        self.lb_help.setFont(QFont('SansSerif', 10))
+
+        self.count_model = RowTableModel(self, [_("Set Name"), _("Files"), _("Size")])
+        self.count_view = QTableView()
+        self.count_view.setModel(self.count_model)
+        self.count_view.setAlternatingRowColors(True)
+        self.count_view.setShowGrid(False)
+        self.count_view.verticalHeader().setVisible(False)
+
+        self.pb_save = QPushButton(_("Save"))
+        self.pb_save.clicked.connect(self.pb_save_clicked)
+        self.pb_count = QPushButton(_("Count"))
+        self.pb_count.clicked.connect(self.pb_count_clicked)
+        self.lb_status = QLabel("")
+        self.__init_ui__()
+
+    def __init_ui__(self):
+        grid = QGridLayout()
+        grid.addWidget(self.lw_sets, 1, 1, 3, 1)
+        grid.addWidget(QLabel(_("Set Name")), 1, 2)
+        grid.addWidget(self.le_name, 1, 3)
+        grid.addWidget(QLabel(_("Rules")), 2, 2)
+        grid.addWidget(self.te_rules, 2, 3)
+        grid.addWidget(self.lb_help, 3, 3)
+
+        set_buttons = QHBoxLayout()
+        set_buttons.addWidget(self.pb_add)
+        set_buttons.addWidget(self.pb_remove)
+        grid.addLayout(set_buttons, 4, 1)
+
+        vbox = QVBoxLayout()
+        vbox.addLayout(grid, 1)
+        vbox.addWidget(self.count_view, 1)
+
+        button_box = QHBoxLayout()
+        button_box.addWidget(self.lb_status, 1)
+        button_box.addWidget(self.pb_count)
+        button_box.addWidget(self.pb_save)
+        vbox.addLayout(button_box)
+        self.setLayout(vbox)
+
+    def show(self):
+        super().show()
+        try:
+            self.rule_sets = load_rule_sets(self.config.cfg_rule_sets_file())
+        except RuleError as err:
+            QMessageBox.warning(self, _("Error"), str(err))
+            self.rule_sets = []
+        self.current = -1
+        self.__fill_list__()
+
+    def __fill_list__(self, row=0):
+        self.lw_sets.blockSignals(True)
+        self.lw_sets.clear()
+        self.lw_sets.addItems([rule_set.name for rule_set in self.rule_sets])
+        self.lw_sets.blockSignals(False)
+        self.current = -1
+        self.lw_sets.setCurrentRow(min(row, len(self.rule_sets) - 1))
+        if not self.rule_sets:
+            self.le_name.setText("")
+            self.te_rules.setPlainText("")
+
+    def __apply_edits__(self):
+        # take over the name and rules of the set being edited, False if the rules are not valid
+        if self.current < 0 or self.current >= len(self.rule_sets):
+            return True
+        rules = []
+        for line in self.te_rules.toPlainText().splitlines():
+            if line.strip():
+                try:
+                    rules.append(parse_rule(line.strip()))
+                except RuleError as err:
+                    QMessageBox.warning(self, _("Error"), str(err))
+                    return False
+        name = self.le_name.text().strip() or self.rule_sets[self.current].name
+        self.rule_sets[self.current] = RuleSet(name, rules)
+        self.lw_sets.item(self.current).setText(name)
+        return True
+
+    def set_selected(self, row):
+        if not self.__apply_edits__():
+            self.lw_sets.blockSignals(True)
+            self.lw_sets.setCurrentRow(self.current)
+            self.lw_sets.blockSignals(False)
+            return
+        self.current = row
+        if 0 <= row < len(self.rule_sets):
+            self.le_name.setText(self.rule_sets[row].name)
+            self.te_rules.setPlainText("\n".join(format_rule(rule) for rule in self.rule_sets[row].rules))
+
+    def pb_add_clicked(self):
+        if self.__apply_edits__():
+            self.rule_sets.append(RuleSet(_("New set %d") % (len(self.rule_sets) + 1), []))
+            self.__fill_list__(len(self.rule_sets) - 1)
+
+    def pb_remove_clicked(self):
+        if 0 <= self.current < len(self.rule_sets):
+            row = self.current
+            del self.rule_sets[row]
+            self.current = -1
+            self.__fill_list__(row)
+
+    def pb_save_clicked(self):
+        if self.__apply_edits__():
+            save_rule_sets(self.config.cfg_rule_sets_file(), self.rule_sets)
+            self.lb_status.setText(_("Saved"))
+
+    def pb_count_clicked(self):
+        if not self.__apply_edits__() or self.job:
+            return
+        engine = RuleEngine(self.rule_sets)
+        resource_dir = self.config.cfg_resource_dir()
+        self.pb_count.setEnabled(False)
+        self.lb_status.setText(_("Counting..."))
+        self.job = PublishJob(self, lambda progress: engine.count(resource_dir, FilenameFilter()))
+        self.job.job_finished.connect(self.count_finished)
+        self.job.job_failed.connect(lambda message: QMessageBox.warning(self, _("Error"), message))
+        self.job.finished.connect(self.__job_done__)
+        self.job.start()
+
+    def count_finished(self, counts):
+        # counts: list of model.rule_sets.SetCount
+        self.count_model.setNewData([(count.name, str(count.files), format_bytes(count.bytes)) for count in counts])
+        self.count_view.resizeColumnsToContents()
+        self.set_counts_changed.emit(counts)
+
+    def __job_done__(self):
+        self.job = None
+        self.pb_count.setEnabled(True)
+        self.lb_status.setText("")
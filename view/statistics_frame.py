@@ -0,0 +1,167 @@
+#! /usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging, os
+
+from PyQt5.QtCore import QAbstractTableModel, Qt
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QFrame, QLabel, QVBoxLayout, QTableView, QSplitter
+from model.config import Configuration
+from model.instrumentation import read_history
+from model.snapshot import SNAPSHOT_FILE
+from model.statistics import ResourceStatistics, load_statistics
+from model.watcher import snapshot_token
+from view.export_frame import format_bytes
+from view.publish_job import PublishJob
+
+# Shows the aggregates the publisher keeps in the resync dir; the resource dir itself is not read.
+# Aggregates that do not belong to the current snapshot are rebuilt from it in a PublishJob.
+
+MAX_RUNS = 100
+
+
+class StatisticsFrame(QFrame):
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.logger = logging.getLogger(__name__)
+        self.config = Configuration()
+        self.job = None
+
+        self.lb_summary = QLabel("")
+        self.lb_summary.setFont(QFont('SansSerif', 10))
+
+        self.directory_model = RowTableModel(self, [_("Directory"), _("Files"), _("Size")])
+        self.size_model = RowTableModel(self, [_("Size up to"), _("Files"), _("Size")])
+        self.age_model = RowTableModel(self, [_("Modified within"), _("Files")])
+        self.run_model = RowTableModel(self, [_("Published"), _("Document"), _("Files"), _("New Files"),
+                                              _("Update Files"), _("Deleted Files"), _("Change Rate"),
+                                              _("Seconds")])
+        self.views = [self.__table_view__(model) for model in
+                      (self.directory_model, self.size_model, self.age_model, self.run_model)]
+        self.__init_ui__()
+
+    def __table_view__(self, model):
+        view = QTableView()
+        view.setModel(model)
+        view.setAlternatingRowColors(True)
+        view.setShowGrid(False)
+        view.verticalHeader().setDefaultSectionSize(22)
+        view.verticalHeader().setVisible(False)
+        return view
+
+    def __init_ui__(self):
+        vbox = QVBoxLayout()
+        vbox.addWidget(self.lb_summary)
+
+        histograms = QSplitter(Qt.Vertical)
+        histograms.addWidget(self.views[1])
+        histograms.addWidget(self.views[2])
+
+        top = QSplitter()
+        top.addWidget(self.views[0])
+        top.addWidget(histograms)
+
+        splitter = QSplitter(Qt.Vertical)
+        splitter.addWidget(top)
+        splitter.addWidget(self.views[3])
+        vbox.addWidget(splitter, 1)
+        self.setLayout(vbox)
+
+    def show(self):
+        super().show()
+        self.refresh()
+
+    def refresh(self):
+        resync_dir = self.config.cfg_resync_dir()
+        self.__refresh_statistics__(resync_dir)
+        runs = [run for run in read_history(resync_dir) if run["task"] in ("resourcelist", "changelist")]
+        self.run_model.setNewData([self.__run_row__(run) for run in reversed(runs[-MAX_RUNS:])])
+        for view in self.views:
+            view.resizeColumnsToContents()
+
+    def __refresh_statistics__(self, resync_dir):
+        if self.job:
+            return      # shown when the job finishes
+        resource_dir = self.config.cfg_resource_dir()
+        snapshot_path = os.path.join(resync_dir, SNAPSHOT_FILE)
+        if not os.path.exists(snapshot_path):
+            self.lb_summary.setText(_("Nothing published yet"))
+            self.__show_statistics__(None)
+            return
+        token = snapshot_token(snapshot_path)
+        statistics = ResourceStatistics.load(resync_dir, resource_dir)
+        if statistics is not None and statistics.token == token:
+            self.__show_statistics__(statistics)
+            return
+
+        self.lb_summary.setText(_("Reading the snapshot..."))
+        self.job = PublishJob(self, lambda progress: load_statistics(resync_dir, resource_dir, snapshot_path, token))
+        self.job.job_finished.connect(self.__show_statistics__)
+        self.job.job_failed.connect(lambda message: self.lb_summary.setText(_("Cannot read statistics: %s") % message))
+        self.job.finished.connect(lambda: self.__job_done__(resync_dir))
+        self.job.start()
+
+    def __job_done__(self, resync_dir):
+        self.job = None
+        if resync_dir != self.config.cfg_resync_dir():
+            self.__refresh_statistics__(self.config.cfg_resync_dir())     # changed while the job ran
+        for view in self.views:
+            view.resizeColumnsToContents()
+
+    def __show_statistics__(self, statistics):
+        if statistics is None:
+            for model in (self.directory_model, self.size_model, self.age_model):
+                model.setNewData([])
+        else:
+            self.lb_summary.setText(_("%d files, %s, in %d directories") % (statistics.files,
+                                    format_bytes(statistics.bytes), len(statistics.directories)))
+            self.directory_model.setNewData(
+                [(rel_dir or ".", str(files), format_bytes(size)) for rel_dir, files, size in
+                 statistics.directory_rows()])
+            self.size_model.setNewData(
+                [(format_bytes(bound) if bound else _("larger"), str(files), format_bytes(size))
+                 for bound, files, size in statistics.size_rows()])
+            self.age_model.setNewData(
+                [(_("%d days") % bound if bound else _("longer ago"), str(files))
+                 for bound, files in statistics.age_rows()])
+
+    def __run_row__(self, run):
+        counters = run["counters"]
+        files = counters.get("files", 0)
+        changed = counters.get("created", 0) + counters.get("updated", 0) + counters.get("deleted", 0)
+        return (run["started"].replace("T", " "), run["task"], str(files), str(counters.get("created", 0)),
+                str(counters.get("updated", 0)), str(counters.get("deleted", 0)),
+                "%.1f %%" % (100.0 * changed / files) if files else "", "%.1f" % run["seconds"])
+
+
+class RowTableModel(QAbstractTableModel):
+    # rows of display strings, the first column left aligned
+
+    def __init__(self, parent, header, *args):
+        QAbstractTableModel.__init__(self, parent, *args)
+        self.header = header
+        self.rows = []
+
+    def rowCount(self, parent):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent):
+        return len(self.header)
+
+    def headerData(self, col, orientation, role):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.header[col]
+        return None
+
+    def data(self, index, role):
+        if role == Qt.TextAlignmentRole and index.column() >= 1:
+            return Qt.AlignRight + Qt.AlignVCenter
+        if role != Qt.DisplayRole:
+            return None
+        return self.rows[index.row()][index.column()]
+
+    def setNewData(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()